@@ -0,0 +1,125 @@
+"""
+Compare the binary product cache encoding with pickle.
+
+    python benchmarks/bench_codec.py [--number 100000] [--redis-url redis://localhost:6379/15 --keys 10000]
+
+Compares a product entry pickled by django_redis' PickleSerializer as it was
+stored before (serializer data in a ReturnDict plus its soft expiry) with the
+entry apps.product.codec.CacheSerializer stores (the rendered response body,
+its ETag and last modification). Prints the encoded size, the time to encode
+and decode it, and the time from the bytes Redis returns to a response body,
+which for pickle includes rendering the JSON. With --redis-url, `--keys` entries are
+written in each format and the memory Redis reports for them is compared;
+the keys are deleted afterwards.
+"""
+
+import argparse
+import sys
+import time
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+from django.conf import settings  # noqa: E402
+
+settings.configure()
+
+from django_redis.serializers.pickle import PickleSerializer  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.utils.serializer_helpers import ReturnDict  # noqa: E402
+
+from apps.product.codec import CacheSerializer  # noqa: E402
+
+SERIALIZERS = {'pickle': PickleSerializer({}), 'binary': CacheSerializer({})}
+
+NAMES = {
+    'short name': "Echo Dot (5th Gen)",
+    'typical name': (
+        "OtterBox iPhone 15 Pro MAX (Only) Commuter Series Case - CRISP DENIM (Blue), "
+        "slim & tough, pocket-friendly, with port protection"
+    ),
+    'max length name': (
+        "Amazon Basics Lightweight Super Soft Easy Care Microfiber Bed Sheet Set with 14-Inch Deep Pockets, "
+        "Queen, Bright White, Solid - Includes Flat Sheet, Fitted Sheet and Two Pillowcases, Wrinkle "
+        "Resistant, Machine Washable, Hypoallergenic"
+    )[:255],
+}
+
+
+def render_body(data):
+    return JSONRenderer().render({"status": "success", "data": data})
+
+
+def product_entry(format_name, name, n=0):
+    data = ReturnDict({
+        'product_id': f'B0{n:08d}',
+        'name': name,
+        'price': '49.99',
+        'rating': '4.7 out of 5 stars',
+        'average_score': 1234.0,
+    }, serializer=None)
+    if format_name == 'pickle':
+        return {'data': data, 'soft_expires': time.time() + 3600}
+    body = render_body(data)
+    return {'body': body, 'etag': '"0123456789abcdef"', 'last_modified': time.time(), 'soft_expires': time.time() + 3600}
+
+
+def to_body(serializer, encoded):
+    entry = serializer.loads(encoded)
+    return entry['body'] if 'body' in entry else render_body(entry['data'])
+
+
+def per_op(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number
+
+
+def compare_encodings(number):
+    print(f"{'entry':<16} {'format':<7} {'bytes':>6} {'encode us':>10} {'decode us':>10} {'to body us':>11}")
+    for label, name in NAMES.items():
+        for format_name, serializer in SERIALIZERS.items():
+            entry = product_entry(format_name, name)
+            encoded = serializer.dumps(entry)
+            assert serializer.loads(encoded) == entry, f"{format_name} does not round-trip"
+            encode = per_op(lambda: serializer.dumps(entry), number)
+            decode = per_op(lambda: serializer.loads(encoded), number)
+            body = per_op(lambda: to_body(serializer, encoded), number)
+            print(f"{label:<16} {format_name:<7} {len(encoded):>6} {encode * 1e6:>10.2f} {decode * 1e6:>10.2f} "
+                  f"{body * 1e6:>11.2f}")
+
+
+def compare_redis_memory(url, keys):
+    import redis
+
+    client = redis.Redis.from_url(url)
+    print(f"\n{keys} entries with the typical name in Redis at {url}")
+    print(f"{'format':<7} {'used_memory MiB':>16} {'MEMORY USAGE/key':>17}")
+    for format_name, serializer in SERIALIZERS.items():
+        prefix = f'bench_codec:{format_name}:'
+        before = client.info('memory')['used_memory']
+        pipeline = client.pipeline(transaction=False)
+        for n in range(keys):
+            pipeline.set(f'{prefix}{n}', serializer.dumps(product_entry(format_name, NAMES['typical name'], n)))
+        pipeline.execute()
+        grown = client.info('memory')['used_memory'] - before
+        sample = [client.memory_usage(f'{prefix}{n}') for n in range(0, keys, max(1, keys // 100))]
+        print(f"{format_name:<7} {grown / 2**20:>16.2f} {sum(sample) / len(sample):>17.0f}")
+        for start in range(0, keys, 1000):
+            client.delete(*[f'{prefix}{n}' for n in range(start, min(keys, start + 1000))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=100000, help="encodes and decodes per timing")
+    parser.add_argument('--redis-url')
+    parser.add_argument('--keys', type=int, default=10000)
+    args = parser.parse_args()
+
+    compare_encodings(args.number)
+    if args.redis_url:
+        compare_redis_memory(args.redis_url, args.keys)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark database hits with a connection per request against persistent connections.
+
+    python benchmarks/bench_db_connections.py [--requests 500] [--concurrency 8]
+        [--conn-max-age 0 --conn-max-age 60 ...] [--keepdb]
+
+Each --conn-max-age (default: 0, a connection per request, and 60) is run
+as the db_hit scenario of bench_scenarios.py: every request is for a
+different product that is stored but not cached. Requests go through
+Django's WSGI handler, which closes or keeps the connection at the end of
+each request the way a WSGI server would (the test client never closes
+it). Prints throughput, p50/p95/p99 latency, the connections opened
+(db_connections_opened_total) and the mean time spent opening them.
+
+Point POSTGRES_HOST at pgbouncer (docker compose --profile pgbouncer) to
+measure connections to the pooler instead. Uses the settings in
+src/config/.env; the database is a test database that is created and
+dropped (kept with --keepdb), cache entries are written under the `bench`
+key prefix and deleted afterwards.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from bench_scenarios import asins, store_products  # noqa: E402
+from apps.product import timing  # noqa: E402
+from config.db.base import connections_opened_total  # noqa: E402
+
+
+def request(application, product_id):
+    environ = {'PATH_INFO': '/api/v1/product/', 'QUERY_STRING': urlencode({'product_id': product_id})}
+    setup_testing_defaults(environ)
+    status = []
+    response = application(environ, lambda code, headers, exc_info=None: status.append(int(code[:3])))
+    try:
+        b''.join(response)
+    finally:
+        # Sends request_finished, where Django closes a connection older than CONN_MAX_AGE
+        response.close()
+    return status[0]
+
+
+def run(application, product_ids, concurrency):
+    """
+    Request every product_id with `concurrency` threads; returns (latencies, statuses, seconds).
+    """
+    queue = iter(product_ids)
+    queue_lock = threading.Lock()
+    latencies = []
+    statuses = set()
+    results_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with queue_lock:
+                product_id = next(queue, None)
+            if product_id is None:
+                break
+            start = time.perf_counter()
+            status = request(application, product_id)
+            elapsed = time.perf_counter() - start
+            with results_lock:
+                latencies.append(elapsed)
+                statuses.add(status)
+        connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return sorted(latencies), statuses, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500, help="requests per setting")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--conn-max-age', type=int, action='append', help="default: 0 and 60")
+    parser.add_argument('--keepdb', action='store_true')
+    args = parser.parse_args()
+
+    settings.DEBUG = False
+    settings.CACHES['default']['KEY_PREFIX'] = 'bench'
+    application = get_wsgi_application()
+
+    database = connection.creation.create_test_db(verbosity=0, keepdb=args.keepdb)
+    print(f"{args.requests} requests per setting, concurrency {args.concurrency}, database {database} "
+          f"on {settings.DATABASES['default']['HOST']}\n")
+    print(f"{'CONN_MAX_AGE':>12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'connections':>12} {'connect ms':>11}  statuses")
+    try:
+        for offset, conn_max_age in enumerate(args.conn_max_age or [0, 60]):
+            connection.close()
+            # Read by each thread's connection when it opens
+            settings.DATABASES['default']['CONN_MAX_AGE'] = conn_max_age
+            product_ids = asins('BP', args.requests, offset * args.requests)
+            store_products(product_ids)
+
+            opened = connections_opened_total.value(alias='default')
+            connect_before = timing.stage_duration_seconds.sum(stage='db_connect')
+            latencies, statuses, seconds = run(application, product_ids, args.concurrency)
+            opened = connections_opened_total.value(alias='default') - opened
+            connect = timing.stage_duration_seconds.sum(stage='db_connect') - connect_before
+
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            print(
+                f"{conn_max_age:>12} {len(latencies) / seconds:>8.1f} "
+                f"{quantiles[49] * 1000:>8.1f} {quantiles[94] * 1000:>8.1f} {quantiles[98] * 1000:>8.1f} "
+                f"{opened:>12} {connect / len(latencies) * 1000:>11.2f}  {sorted(statuses)}"
+            )
+    finally:
+        cache.delete_pattern('*')
+        connection.close()
+        if not args.keepdb:
+            connection.creation.destroy_test_db(database, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
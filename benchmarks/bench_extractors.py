@@ -0,0 +1,134 @@
+"""
+Compare parse time and peak memory of the product extractors.
+
+    python benchmarks/bench_extractors.py [page.html ...] [--repeat 20] [--inflate-kb 2000]
+
+Without page arguments the saved fixture page in tests/fixtures is used. Real
+Amazon pages are several megabytes, mostly inline scripts and widgets, so
+--inflate-kb pads each page with that kind of markup up to the given size.
+Every extractor is checked to return exactly what the BeautifulSoup reference
+returns before it is timed.
+"""
+
+import argparse
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+from apps.product.parsers import EXTRACTORS, get_extractor  # noqa: E402
+
+FIXTURES = ROOT / 'tests' / 'fixtures'
+
+FILLER = '''
+<div class="a-carousel-card" role="listitem" aria-setsize="50">
+  <div class="a-section a-spacing-none p13n-asin" data-asin="B0{n:08d}" data-p13n-asin-metadata="{{&quot;ref&quot;:&quot;pd_sbs_sccl_1_{n}&quot;}}">
+    <a class="a-link-normal" href="/dp/B0{n:08d}/ref=pd_sbs_sccl_1_{n}"><img alt="" src="https://images-na.ssl-images-amazon.com/images/I/{n}.jpg" height="160" width="160"></a>
+    <span class="a-size-small a-color-base">Related product {n} with a long marketing title for the carousel</span>
+    <i class="a-icon a-icon-star-small a-star-small-4-5"><span class="a-icon-alt">4.5 out of 5 stars</span></i>
+    <span class="a-size-small">{n}</span><span class="a-price"><span class="a-offscreen">$19.99</span></span>
+  </div>
+</div>
+<script type="text/javascript">P.when("A").execute(function(A){{A.state("p13n-{n}", {{"asin":"B0{n:08d}","rank":{n}}});}});</script>
+'''
+
+
+def inflate(page, size_kb):
+    filler = []
+    size = len(page)
+    n = 0
+    while size < size_kb * 1024:
+        chunk = FILLER.format(n=n)
+        filler.append(chunk)
+        size += len(chunk)
+        n += 1
+    return page.replace('</body>', ''.join(filler) + '</body>')
+
+
+def time_extractor(name, pages, repeat):
+    extractor = get_extractor(name)
+    timings = []
+    for _ in range(repeat):
+        for page in pages:
+            start = time.perf_counter()
+            extractor.extract(page, 'B0CHX5ZQ9X')
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process in bytes.
+    """
+    try:
+        # VmHWM starts over in a freshly exec'd process, ru_maxrss is inherited from the parent
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+
+
+def measure_memory(name, pages, result):
+    """
+    Runs in a fresh process: peak RSS growth covers libxml2's C allocations,
+    which tracemalloc does not see.
+    """
+    extractor = get_extractor(name)
+    baseline = peak_rss()
+    tracemalloc.start()
+    for page in pages:
+        extractor.extract(page, 'B0CHX5ZQ9X')
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result.put((python_peak, peak_rss() - baseline))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', type=Path)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--inflate-kb', type=int, default=2000, help="pad pages to this size, 0 to disable")
+    args = parser.parse_args()
+
+    paths = args.pages or sorted(FIXTURES.glob('product_page*.html'))
+    pages = [path.read_text(encoding='utf-8') for path in paths]
+    if args.inflate_kb:
+        pages = [inflate(page, args.inflate_kb) for page in pages]
+    print(f"{len(pages)} page(s), {sum(map(len, pages)) / len(pages) / 1024:.0f} KiB on average, {args.repeat} rounds\n")
+
+    reference = [get_extractor('soup').extract(page, 'B0CHX5ZQ9X') for page in pages]
+    for name in EXTRACTORS:
+        results = [get_extractor(name).extract(page, 'B0CHX5ZQ9X') for page in pages]
+        if results != reference:
+            sys.exit(f"{name} extractor disagrees with soup: {results} != {reference}")
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'extractor':<10} {'median ms':>10} {'p95 ms':>10} {'speedup':>8} {'py peak MiB':>12} {'rss peak MiB':>13}")
+    soup_median = None
+    for name in EXTRACTORS:
+        timings = sorted(time_extractor(name, pages, args.repeat))
+        median = statistics.median(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        soup_median = soup_median or median
+
+        queue = context.Queue()
+        process = context.Process(target=measure_memory, args=(name, pages, queue))
+        process.start()
+        python_peak, rss_growth = queue.get()
+        process.join()
+
+        print(f"{name:<10} {median * 1000:>10.2f} {p95 * 1000:>10.2f} {soup_median / median:>7.1f}x "
+              f"{python_peak / 2**20:>12.1f} {rss_growth / 2**20:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
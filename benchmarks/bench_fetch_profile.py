@@ -0,0 +1,101 @@
+"""
+Compare Selenium fetch profiles on the local fixture site.
+
+    python benchmarks/bench_fetch_profile.py [--pages 20] [--selenium-url http://localhost:4444/wd/hub]
+        [--fixture-host host.docker.internal] [--images 40] [--image-kb 60] [--asset-delay 0.05]
+
+Starts benchmarks/fixture_server.py and loads its product page with a Remote
+Chrome session per profile, through SeleniumFetcher.load as the scraper does.
+For each profile the per-page latency and the bytes the browser downloaded
+are printed, and every page is checked to parse complete. --fixture-host is
+the address the browser (e.g. the selenium container) reaches this machine at.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+from django.conf import settings  # noqa: E402
+
+settings.configure(
+    SELENIUM_PAGE_LOAD_STRATEGY='normal',
+    SELENIUM_CONTENT_WAIT_TIMEOUT=10,
+    SELENIUM_EXTRA_BLOCKED_URLS=[],
+    PRODUCT_EXTRACTOR='lxml',
+)
+
+from fixture_server import FixtureServer  # noqa: E402
+from apps.product.captcha import StubSolver  # noqa: E402
+from apps.product.fetchers import SeleniumFetcher  # noqa: E402
+from apps.product.parsers import is_complete, parse_html  # noqa: E402
+from apps.product.webdriver_pool import create_webdriver  # noqa: E402
+
+# (name, page load strategy, block resources)
+PROFILES = [
+    ('normal', 'normal', False),
+    ('normal+block', 'normal', True),
+    ('eager+block', 'eager', True),
+    ('none+block', 'none', True),
+]
+
+
+def run_profile(server, url, strategy, block, pages):
+    settings.SELENIUM_PAGE_LOAD_STRATEGY = strategy
+    fetcher = SeleniumFetcher(solver=StubSolver())
+    driver = create_webdriver(page_load_strategy=strategy, block_resources=block)
+    try:
+        # One untimed load so the session is warm
+        fetcher.load(driver, url)
+        timings = []
+        server.reset()
+        for n in range(pages):
+            driver.get('about:blank')
+            start = time.perf_counter()
+            fetcher.load(driver, f'{url}?n={n}')
+            timings.append(time.perf_counter() - start)
+            if not is_complete(parse_html(driver.page_source, 'B0CHX5ZQ9X')):
+                sys.exit(f"Page loaded with the {strategy} strategy is missing product fields")
+        # Requests the browser was still making when the page counted as loaded
+        time.sleep(1)
+        return sorted(timings), sum(server.bytes.values()) / pages, sum(server.requests.values()) / pages
+    finally:
+        driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--selenium-url', default='http://localhost:4444/wd/hub')
+    parser.add_argument('--fixture-host', default='host.docker.internal')
+    parser.add_argument('--images', type=int, default=40)
+    parser.add_argument('--image-kb', type=int, default=60)
+    parser.add_argument('--asset-delay', type=float, default=0.05)
+    args = parser.parse_args()
+
+    selenium_url = urlsplit(args.selenium_url)
+    os.environ['SELENIUM_HOST'] = selenium_url.hostname
+    os.environ['SELENIUM_PORT'] = str(selenium_url.port or 4444)
+
+    server = FixtureServer(images=args.images, image_kb=args.image_kb, asset_delay=args.asset_delay).start()
+    url = f'http://{args.fixture_host}:{server.port}/dp/B0CHX5ZQ9X'
+    print(f"{args.pages} pages per profile from {url}\n")
+    print(f"{'profile':<14} {'median ms':>10} {'p95 ms':>10} {'KiB/page':>10} {'requests/page':>14}")
+    try:
+        for name, strategy, block in PROFILES:
+            timings, page_bytes, page_requests = run_profile(server, url, strategy, block, args.pages)
+            p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+            print(f"{name:<14} {statistics.median(timings) * 1000:>10.0f} {p95 * 1000:>10.0f} "
+                  f"{page_bytes / 1024:>10.0f} {page_requests:>14.1f}")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
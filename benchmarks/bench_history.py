@@ -0,0 +1,125 @@
+"""
+Benchmark range queries over the price and rating history.
+
+    python benchmarks/bench_history.py [--products 1000] [--observations 2000]
+        [--queries 200] [--range-days 30] [--keepdb]
+
+Fills a test database with --products products of --observations
+observations each, interleaved in time the way scrapes append them (the
+defaults make two million rows), then times apps.product.history.series for
+random products: a downsampled range of --range-days, and the same range in
+raw hourly buckets. Prints p50/p95/p99 latency and the plan of one query, to
+check that it is an index only scan of observation_product_time.
+
+Uses the settings in src/config/.env; the database is a test database that is
+created and dropped (kept, with its rows, with --keepdb).
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from apps.product import history  # noqa: E402
+from apps.product.models import Product, ProductObservation  # noqa: E402
+
+END = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def fill(products, observations):
+    """
+    Write the products and their observations, one every 15 minutes up to
+    END, in time order across products as they would have been scraped.
+    """
+    if Product.objects.count() >= products:
+        return
+    Product.objects.bulk_create([
+        Product(product_id=f'BH{n:08d}', name=f'Product {n}', price='10.00', rating='1', average_score=4.0)
+        for n in range(products)
+    ])
+    table = connection.ops.quote_name(ProductObservation._meta.db_table)
+    product_table = connection.ops.quote_name(Product._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {table} (product_id, observed_at, price, rating_count, average_score)
+            SELECT product.id,
+                %(end)s - (step * interval '15 minutes'),
+                round((10 + random() * 90)::numeric, 2),
+                100 + step,
+                round((3 + random() * 2)::numeric, 1)
+            FROM generate_series(%(steps)s, 1, -1) AS step, {product_table} AS product
+        """, {'end': END, 'steps': observations})
+        cursor.execute(f"VACUUM ANALYZE {table}")
+
+
+def time_queries(product_ids, since, until, bucket, queries):
+    latencies = []
+    for _ in range(queries):
+        product = Product(pk=random.choice(product_ids))
+        start = time.perf_counter()
+        points = history.series(product, since, until, bucket)
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies), len(points)
+
+
+def explain(product_id, since, until, bucket):
+    sql = history.SERIES_SQL.format(table=connection.ops.quote_name(ProductObservation._meta.db_table))
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, {
+            'product': product_id, 'since': since, 'until': until, 'bucket': bucket,
+        })
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--observations', type=int, default=2000, help="per product")
+    parser.add_argument('--queries', type=int, default=200, help="per range")
+    parser.add_argument('--range-days', type=int, default=30)
+    parser.add_argument('--keepdb', action='store_true')
+    args = parser.parse_args()
+
+    database = connection.creation.create_test_db(verbosity=0, keepdb=args.keepdb)
+    try:
+        started = time.perf_counter()
+        fill(args.products, args.observations)
+        rows = ProductObservation.objects.count()
+        print(f"{rows} observations of {args.products} products in {database} "
+              f"(filled in {time.perf_counter() - started:.1f}s)\n")
+
+        product_ids = list(Product.objects.values_list('pk', flat=True))
+        since = END - timedelta(days=args.range_days)
+        ranges = {
+            'downsampled': timedelta(days=args.range_days) / 100,
+            'hourly': timedelta(hours=1),
+        }
+        print(f"{'range':<12} {'points':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for label, bucket in ranges.items():
+            latencies, points = time_queries(product_ids, since, END, bucket, args.queries)
+            quantiles = statistics.quantiles(latencies, n=100)
+            print(f"{label:<12} {points:>7} {quantiles[49] * 1000:>8.2f} {quantiles[94] * 1000:>8.2f} "
+                  f"{quantiles[98] * 1000:>8.2f}")
+        print('\n' + explain(product_ids[0], since, END, ranges['downsampled']))
+    finally:
+        connection.close()
+        if not args.keepdb:
+            connection.creation.destroy_test_db(database, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark deep pages of the product list: keyset pagination against OFFSET.
+
+    python benchmarks/bench_listing.py [--products 3000000] [--page-size 50]
+        [--depth 0 --depth 100000 ...] [--repeat 20] [--keepdb]
+
+Fills a test database with --products products, then, for each --depth,
+times the page that starts that many rows in, ordered by price:
+
+    keyset   GET /api/v1/products/?ordering=price with the cursor of the row
+             before it, through the view (filtering, pagination, serialization)
+    offset   the same rows with ORDER BY price, id OFFSET depth, the query
+             page-number pagination would run
+
+and a name search (`?name=`) through the trigram index. Prints the median
+and worst time of --repeat runs.
+
+Uses the settings in src/config/.env; the database is a test database that is
+created and dropped (kept, with its rows, with --keepdb).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+
+from apps.product.api.v1.pagination import KeysetPagination  # noqa: E402
+from apps.product.api.v1.views import ProductListAPIView  # noqa: E402
+from apps.product.models import Product  # noqa: E402
+
+WORDS = ['Cable', 'Case', 'Charger', 'Headphones', 'Keyboard', 'Lamp', 'Mouse', 'Sheet Set', 'Speaker', 'Watch']
+
+
+def fill(products):
+    """
+    Write the products with a few thousand distinct prices, so ties are common.
+    """
+    if Product.objects.count() >= products:
+        return
+    table = connection.ops.quote_name(Product._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {table} (created_at, last_updated, product_id, name, price, rating, rating_count, average_score)
+            SELECT now(), now(), 'BL' || lpad(n::text, 8, '0'),
+                (%(words)s)[1 + n %% %(word_count)s] || ' ' || md5(n::text),
+                (1 + (n * 7919) %% 5000) / 10.0,
+                (n %% 10000)::text,
+                n %% 10000,
+                round((1 + random() * 4)::numeric, 1)
+            FROM generate_series(1, %(products)s) AS n
+        """, {'words': WORDS, 'word_count': len(WORDS), 'products': products})
+        cursor.execute(f"VACUUM ANALYZE {table}")
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), max(times)
+
+
+def keyset_page(params):
+    request = RequestFactory().get('/api/v1/products/', params)
+    response = ProductListAPIView.as_view()(request)
+    assert response.status_code == 200, response.data
+    return response.data['data']['results']
+
+
+def cursor_at(depth):
+    """
+    The cursor a client would hold after reading `depth` rows by price.
+    """
+    if not depth:
+        return None
+    last = Product.objects.order_by('price', 'id').values_list('price', 'id')[depth - 1]
+    return KeysetPagination().encode_cursor(['price', *last])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=3_000_000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--depth', type=int, action='append', help="default: 0, 10k, 100k, 1M and the last page")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--keepdb', action='store_true')
+    args = parser.parse_args()
+
+    settings.DEBUG = False
+    database = connection.creation.create_test_db(verbosity=0, keepdb=args.keepdb)
+    try:
+        started = time.perf_counter()
+        fill(args.products)
+        count = Product.objects.count()
+        print(f"{count} products in {database} (filled in {time.perf_counter() - started:.1f}s)\n")
+
+        depths = args.depth or [0, 10_000, 100_000, 1_000_000, count - args.page_size]
+        print(f"{'depth':>10} {'keyset ms':>10} {'worst':>8} {'offset ms':>10} {'worst':>8}")
+        for depth in sorted(depth for depth in depths if 0 <= depth < count):
+            params = {'ordering': 'price', 'page_size': args.page_size}
+            cursor = cursor_at(depth)
+            if cursor:
+                params['cursor'] = cursor
+            offset_rows = Product.objects.order_by('price', 'id')[depth:depth + args.page_size]
+            assert [product['product_id'] for product in keyset_page(params)] == [
+                product.product_id for product in offset_rows
+            ], f"keyset and offset pages differ at {depth}"
+
+            keyset = timed(lambda: keyset_page(params), args.repeat)
+            offset = timed(lambda: list(offset_rows.all()), args.repeat)
+            print(f"{depth:>10} {keyset[0] * 1000:>10.2f} {keyset[1] * 1000:>8.2f} "
+                  f"{offset[0] * 1000:>10.2f} {offset[1] * 1000:>8.2f}")
+
+        print(f"\n{'name search':<24} {'ms':>8} {'worst':>8}")
+        for text in ('sheet set', 'keyboard 1a', 'no such product'):
+            search = timed(lambda: keyset_page({'name': text, 'page_size': args.page_size}), args.repeat)
+            print(f"{text:<24} {search[0] * 1000:>8.2f} {search[1] * 1000:>8.2f}")
+    finally:
+        connection.close()
+        if not args.keepdb:
+            connection.creation.destroy_test_db(database, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
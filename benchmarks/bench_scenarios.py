@@ -0,0 +1,240 @@
+"""
+Benchmark the product endpoint end to end, one lookup path at a time.
+
+    python benchmarks/bench_scenarios.py [--scenario cache_hit --scenario scrape_miss ...]
+        [--requests 500] [--concurrency 8] [--page-delay 0.2] [--keepdb]
+
+Requests go through Django's URL routing, middleware and ProductDetailAPIView
+with a test client per thread. Product pages come from
+benchmarks/fixture_server.py instead of Amazon, over the HTTP tier only (no
+Selenium, no outbound throttle). Scenarios:
+
+    cache_hit     the products are cached
+    db_hit        every request is for a different product that is stored but not cached
+    scrape_miss   every request scrapes a new product
+    captcha_miss  as scrape_miss, each page is behind a CAPTCHA solved over HTTP
+
+For each scenario the throughput, p50/p95/p99 latency and status codes are
+printed, with the mean time per request spent in each stage: cache (the
+product_cache calls), db (SQL), fetch (HTTP fetches, CAPTCHA included) and
+parse. The rest of a request (routing, filtering, serialization, locks) is
+`other`.
+
+Uses the settings in src/config/.env. The database is a test database that is
+created and dropped (kept with --keepdb); cache entries are written under the
+`bench` key prefix and deleted afterwards, point REDIS_URL at a scratch
+database to keep the popularity counters clean as well.
+"""
+
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from fixture_server import FixtureServer  # noqa: E402
+from apps.product import fetchers, product_cache  # noqa: E402
+from apps.product.captcha import CachingSolver, StubSolver  # noqa: E402
+from apps.product.models import Product  # noqa: E402
+from apps.product.parsers import parse_html  # noqa: E402
+
+SCENARIOS = ['cache_hit', 'db_hit', 'scrape_miss', 'captcha_miss']
+STAGES = ['cache', 'db', 'fetch', 'parse']
+CAPTCHA_PREFIX = 'BC'
+CAPTCHA_ANSWER = 'BENCHY'
+# product_cache functions the lookup path calls
+CACHE_CALLS = ['get', 'get_rendered', 'set', 'get_negative', 'set_negative', 'claim_refresh']
+
+
+class StageTimer:
+    """
+    Total time spent in each stage, across threads. A stage entered again
+    from inside itself is only counted once.
+    """
+
+    def __init__(self):
+        self.totals = Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def reset(self):
+        with self._lock:
+            self.totals.clear()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.totals[stage] += seconds
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            depth = getattr(self._local, stage, 0)
+            setattr(self._local, stage, depth + 1)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                setattr(self._local, stage, depth)
+                if not depth:
+                    self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def db(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - start)
+
+
+def asins(prefix, count, offset=0):
+    return [f'{prefix}{n:0{10 - len(prefix)}d}' for n in range(offset, offset + count)]
+
+
+def store_products(product_ids):
+    """
+    Write product_ids to the database (not the cache) as the scraper would have.
+    """
+    product_data = parse_html(Path(ROOT / 'tests' / 'fixtures' / 'product_page.html').read_text(), 'B0CHX5ZQ9X')
+    Product.objects.bulk_create([
+        Product(product_id=product_id, **{key: value for key, value in product_data.items() if key != 'product_id'})
+        for product_id in product_ids
+    ], ignore_conflicts=True)
+
+
+def prepare(scenario, count, products):
+    """
+    Return the ASINs to request for a scenario, in order.
+    """
+    if scenario == 'cache_hit':
+        product_ids = asins('BH', products)
+        store_products(product_ids)
+        client = Client()
+        for product_id in product_ids:
+            client.get('/api/v1/product/', {'product_id': product_id})
+        return list(itertools.islice(itertools.cycle(product_ids), count))
+    if scenario == 'db_hit':
+        product_ids = asins('BD', count)
+        store_products(product_ids)
+        return product_ids
+
+    product_ids = asins(CAPTCHA_PREFIX if scenario == 'captcha_miss' else 'BS', count)
+    # Left over in a kept database, they would be hits
+    Product.objects.filter(product_id__in=product_ids).delete()
+    return product_ids
+
+
+def run_scenario(product_ids, concurrency, stages):
+    """
+    Request every product_id with `concurrency` threads; returns (latencies, statuses, seconds).
+    """
+    queue = iter(product_ids)
+    queue_lock = threading.Lock()
+    latencies = []
+    statuses = Counter()
+    results_lock = threading.Lock()
+
+    def worker():
+        client = Client()
+        with connection.execute_wrapper(stages.db):
+            while True:
+                with queue_lock:
+                    product_id = next(queue, None)
+                if product_id is None:
+                    break
+                start = time.perf_counter()
+                response = client.get('/api/v1/product/', {'product_id': product_id})
+                elapsed = time.perf_counter() - start
+                with results_lock:
+                    latencies.append(elapsed)
+                    statuses[response.status_code] += 1
+        connection.close()
+
+    stages.reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return sorted(latencies), statuses, time.perf_counter() - start
+
+
+def install_timers(stages, fetcher):
+    for name in CACHE_CALLS:
+        setattr(product_cache, name, stages.wrap('cache', getattr(product_cache, name)))
+    http = fetcher.tiers[0]
+    http.fetch = stages.wrap('fetch', http.fetch)
+    fetcher.parse = stages.wrap('parse', fetcher.parse)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help="default: all")
+    parser.add_argument('--requests', type=int, default=500, help="requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--products', type=int, default=50, help="distinct products in cache_hit")
+    parser.add_argument('--page-delay', type=float, default=0.2, help="fixture server time to first byte")
+    parser.add_argument('--keepdb', action='store_true')
+    args = parser.parse_args()
+
+    settings.DEBUG = False
+    settings.CACHES['default']['KEY_PREFIX'] = 'bench'
+    server = FixtureServer(
+        host='127.0.0.1', page_delay=args.page_delay, asset_delay=0,
+        captcha_prefix=CAPTCHA_PREFIX, captcha_answer=CAPTCHA_ANSWER,
+    ).start()
+    settings.AMAZON_BASE_URL = server.url
+
+    stages = StageTimer()
+    fetchers._fetcher = fetchers.TieredFetcher([
+        fetchers.HttpFetcher(
+            pool_size=args.concurrency,
+            solver=CachingSolver(StubSolver(default=CAPTCHA_ANSWER)),
+        ),
+    ])
+    install_timers(stages, fetchers._fetcher)
+
+    database = connection.creation.create_test_db(verbosity=0, keepdb=args.keepdb)
+    print(f"{args.requests} requests per scenario, concurrency {args.concurrency}, database {database}\n")
+    print(f"{'scenario':<13} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          + ''.join(f"{stage + ' ms':>9}" for stage in STAGES + ['other']) + "  statuses")
+    try:
+        for scenario in args.scenario or SCENARIOS:
+            product_ids = prepare(scenario, args.requests, args.products)
+            latencies, statuses, seconds = run_scenario(product_ids, args.concurrency, stages)
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            per_request = {stage: stages.totals[stage] / len(latencies) for stage in STAGES}
+            per_request['other'] = max(0, statistics.mean(latencies) - sum(per_request.values()))
+            print(
+                f"{scenario:<13} {len(latencies) / seconds:>8.1f} "
+                f"{quantiles[49] * 1000:>8.1f} {quantiles[94] * 1000:>8.1f} {quantiles[98] * 1000:>8.1f} "
+                + ''.join(f"{per_request[stage] * 1000:>9.1f}" for stage in STAGES + ['other'])
+                + f"  {dict(statuses)}"
+            )
+    finally:
+        server.stop()
+        cache.delete_pattern('*')
+        for alias in connections:
+            connections[alias].close()
+        if not args.keepdb:
+            connection.creation.destroy_test_db(database, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Load test the application under each way of serving it: runserver against gunicorn.
+
+    python benchmarks/bench_servers.py [--server runserver --server gthread ...]
+        [--workers 4] [--threads 4] [--concurrency 50] [--duration 20]
+        [--path /api/v1/product/ ...] [--asin B0CHX5ZQ9X ...] [--port 8010]
+
+Starts each server in turn from src/ on --port, warms the cache with one
+request per ASIN, runs benchmarks/load_test.py against every --path and
+stops the server. Servers:
+
+    runserver   manage.py runserver, one process with a thread per request
+    sync        gunicorn with --workers sync workers (config/gunicorn.conf.py)
+    gthread     gunicorn with --workers workers of --threads threads
+    uvicorn     gunicorn with --workers uvicorn workers, serving config.asgi
+
+Everything but the bind address, worker class, workers and threads comes
+from config/gunicorn.conf.py and src/config/.env, so the database, Redis
+and Selenium have to be reachable from here. Add
+`--path /api/v1/product/async/` to include the async view, and a static
+file path (after collectstatic) to include WhiteNoise, which uvicorn
+workers leave to a reverse proxy (404 here). Sync workers close
+the connection after every response, which load_test.py counts as a
+conn_error before reconnecting.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from load_test import percentile, run
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVERS = ['runserver', 'sync', 'gthread', 'uvicorn']
+
+
+def command(server, port):
+    if server == 'runserver':
+        return [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}']
+    return [sys.executable, '-m', 'gunicorn', '-c', 'config/gunicorn.conf.py']
+
+
+def start(server, port, workers, threads):
+    env = dict(
+        os.environ,
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        GUNICORN_WORKER_CLASS=server,
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_THREADS=str(threads),
+        GUNICORN_RELOAD='False',
+    )
+    process = subprocess.Popen(
+        command(server, port), cwd=ROOT / 'src', env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{server} exited with {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{server} didn't start listening on {port}")
+
+
+def warm(url, asins):
+    for asin in asins:
+        try:
+            urlopen(f"{url}/api/v1/product/?{urlencode({'product_id': asin})}", timeout=120).read()
+        except HTTPError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', action='append', dest='servers', choices=SERVERS, help="default: all")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--path', action='append', dest='paths')
+    parser.add_argument('--asin', action='append', dest='asins')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--port', type=int, default=8010)
+    args = parser.parse_args()
+
+    paths = args.paths or ['/api/v1/product/']
+    asins = args.asins or ['B0CHX5ZQ9X']
+    url = f'http://127.0.0.1:{args.port}'
+    print(f"{args.workers} workers, {args.threads} threads, {args.concurrency} connections, "
+          f"{args.duration:.0f}s per path\n")
+    print(f"{'server':<10} {'path':<28} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for server in args.servers or SERVERS:
+        process = start(server, args.port, args.workers, args.threads)
+        try:
+            warm(url, asins)
+            for path in paths:
+                latencies, statuses, elapsed = asyncio.run(run(url, path, asins, args.concurrency, args.duration))
+                latencies.sort()
+                if not latencies:
+                    print(f"{server:<10} {path:<28} no successful requests {dict(statuses)}")
+                    continue
+                print(f"{server:<10} {path:<28} {len(latencies) / elapsed:>8.0f} "
+                      f"{statistics.median(latencies) * 1000:>8.1f} {percentile(latencies, 0.95) * 1000:>8.1f} "
+                      f"{percentile(latencies, 0.99) * 1000:>8.1f}  {dict(statuses)}")
+        finally:
+            process.terminate()
+            process.wait(timeout=60)
+
+
+if __name__ == '__main__':
+    main()
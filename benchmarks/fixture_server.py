@@ -0,0 +1,214 @@
+"""
+Local stand-in for Amazon's product pages, for benchmarks that drive a browser
+or the fetchers without touching amazon.com.
+
+    python benchmarks/fixture_server.py [--port 8800] [--images 40] [--image-kb 60] [--asset-delay 0.05]
+        [--page-delay 0] [--captcha-prefix BC] [--captcha-answer BENCHY]
+
+/dp/<asin> serves the saved fixture page with the weight of a real one added:
+a stylesheet with web fonts, `--images` product images of `--image-kb` each,
+a video, tracking beacons, all served after `--asset-delay` seconds as if
+from a CDN. The server counts requests and bytes per kind of resource.
+
+ASINs starting with `--captcha-prefix` get the saved CAPTCHA page first.
+Submitting `--captcha-answer` through its form redirects to the product
+page; every such ASIN is challenged again, cookies don't let a client past.
+"""
+
+import argparse
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+PRODUCT_PAGE = (ROOT / 'tests' / 'fixtures' / 'product_page.html').read_text(encoding='utf-8')
+CAPTCHA_PAGE = (ROOT / 'tests' / 'fixtures' / 'captcha_page.html').read_text(encoding='utf-8')
+CAPTCHA_IMAGE_URL = 'https://images-na.ssl-images-amazon.com/captcha/bfhuzdtn/Captcha_distxpnpgp.jpg'
+
+FONTS = 3
+
+HEAD = '<link rel="stylesheet" href="/assets/site.css">\n'
+
+BODY = '''
+<div id="imageBlock">{images}</div>
+<div id="fontSamples">{fonts}</div>
+<video src="/assets/demo.mp4" autoplay muted preload="auto"></video>
+<img src="/uedata/beacon?asin={asin}" width="1" height="1">
+<img src="/rd/uedata?ld&asin={asin}" width="1" height="1">
+<script src="/assets/widgets.js"></script>
+'''
+
+CSS = ''.join(
+    f"@font-face {{ font-family: f{n}; src: url(/assets/font-{n}.woff2) format('woff2'); }}\n"
+    f".font-{n} {{ font-family: f{n}, sans-serif; }}\n"
+    for n in range(FONTS)
+)
+
+CONTENT_TYPES = {
+    '.css': 'text/css', '.js': 'application/javascript', '.jpg': 'image/jpeg',
+    '.woff2': 'font/woff2', '.mp4': 'video/mp4',
+}
+
+
+def product_page(asin, images):
+    body = BODY.format(
+        asin=asin,
+        images=''.join(f'<img src="/assets/img-{asin}-{n}.jpg" width="300" height="300">' for n in range(images)),
+        fonts=''.join(f'<span class="font-{n}">Aa</span>' for n in range(FONTS)),
+    )
+    return PRODUCT_PAGE.replace('</head>', HEAD + '</head>').replace('</body>', body + '</body>')
+
+
+def captcha_page(asin, base_url):
+    return (
+        CAPTCHA_PAGE
+        .replace('value="/dp/B0CHX5ZQ9X"', f'value="/dp/{asin}"')
+        .replace(CAPTCHA_IMAGE_URL, f'{base_url}/captcha/Captcha_distxpnpgp.jpg')
+    )
+
+
+def resource_kind(path):
+    if path.startswith('/dp/'):
+        return 'document'
+    if path.startswith(('/errors/validateCaptcha', '/captcha/')):
+        return 'captcha'
+    if 'uedata' in path:
+        return 'tracking'
+    return {'.css': 'css', '.js': 'script', '.jpg': 'image', '.woff2': 'font', '.mp4': 'media'}.get(
+        Path(path).suffix, 'other',
+    )
+
+
+class FixtureServer:
+    """
+    The fixture site on a background thread. `requests` and `bytes` count
+    by resource kind; `reset()` clears them between runs. `page_delay` is the
+    time to first byte of product and CAPTCHA pages.
+    """
+
+    def __init__(self, host='0.0.0.0', port=0, images=40, image_kb=60, asset_delay=0.05, page_delay=0,
+                 captcha_prefix=None, captcha_answer='BENCHY'):
+        self.images = images
+        self.image_kb = image_kb
+        self.asset_delay = asset_delay
+        self.page_delay = page_delay
+        self.captcha_prefix = captcha_prefix
+        self.captcha_answer = captcha_answer
+        self.requests = Counter()
+        self.bytes = Counter()
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name='fixture-server', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.bytes.clear()
+
+    def record(self, path, size):
+        kind = resource_kind(path)
+        with self._lock:
+            self.requests[kind] += 1
+            self.bytes[kind] += size
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def body(self, target, base_url):
+        """
+        Return (status, headers, body) for a request target.
+        """
+        url = urlsplit(target)
+        path, query = url.path, parse_qs(url.query)
+        html = 'text/html; charset=utf-8'
+
+        match = re.match(r'^/dp/(\w+)', path)
+        if match:
+            asin = match.group(1)
+            if self.captcha_prefix and asin.startswith(self.captcha_prefix) and 'captcha' not in query:
+                return 200, {'Content-Type': html}, captcha_page(asin, base_url).encode()
+            return 200, {'Content-Type': html}, product_page(asin, self.images).encode()
+        if path == '/errors/validateCaptcha':
+            return_to = query.get('amzn-r', ['/'])[0]
+            if query.get('field-keywords', [''])[0] != self.captcha_answer:
+                return 200, {'Content-Type': html}, captcha_page(return_to.rsplit('/', 1)[-1], base_url).encode()
+            return 302, {'Location': f'{return_to}?captcha=passed', 'Content-Type': 'text/plain'}, b''
+        if path.startswith('/captcha/'):
+            return 200, {'Content-Type': 'image/jpeg'}, b'fixture captcha image'
+        if path == '/assets/site.css':
+            return 200, {'Content-Type': 'text/css'}, CSS.encode()
+        if path == '/assets/widgets.js':
+            return 200, {'Content-Type': 'application/javascript'}, b'window.widgets = true;\n' * 2000
+        if 'uedata' in path:
+            return 204, {'Content-Type': 'text/plain'}, b''
+        suffix = Path(path).suffix
+        if suffix in CONTENT_TYPES:
+            size = {'.jpg': self.image_kb, '.woff2': 40, '.mp4': 2000}.get(suffix, 10) * 1024
+            return 200, {'Content-Type': CONTENT_TYPES[suffix]}, b'\0' * size
+        return 404, {'Content-Type': 'text/plain'}, b'not found'
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                status, headers, body = server.body(self.path, f"http://{self.headers.get('Host', 'localhost')}")
+                delay = server.page_delay if resource_kind(self.path) in ('document', 'captcha') else server.asset_delay
+                if delay:
+                    time.sleep(delay)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                self.wfile.write(body)
+                server.record(self.path, len(body))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--images', type=int, default=40)
+    parser.add_argument('--image-kb', type=int, default=60)
+    parser.add_argument('--asset-delay', type=float, default=0.05)
+    parser.add_argument('--page-delay', type=float, default=0)
+    parser.add_argument('--captcha-prefix')
+    parser.add_argument('--captcha-answer', default='BENCHY')
+    args = parser.parse_args()
+
+    server = FixtureServer(
+        args.host, args.port, args.images, args.image_kb, args.asset_delay, args.page_delay,
+        args.captcha_prefix, args.captcha_answer,
+    )
+    print(f"Serving product fixtures on http://{args.host}:{server.port}/dp/<asin>")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
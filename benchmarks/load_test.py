@@ -0,0 +1,101 @@
+"""
+Closed-loop HTTP load test of the product endpoints.
+
+    python benchmarks/load_test.py http://localhost:8000 [--concurrency 200] [--duration 30]
+        [--path /api/v1/product/ --path /api/v1/product/async/] [--asin B0CHX5ZQ9X ...]
+
+Every path is loaded in turn by `concurrency` keep-alive connections, each
+sending its next request as soon as the previous response arrived, and the
+throughput, latency percentiles and status codes are printed per path. Run
+the server under ASGI (e.g. `uvicorn config.asgi:application`) to compare the
+sync view, which holds a thread per request, against the async one. Warm the
+cache with the ASINs first to measure the lookup path rather than Selenium.
+"""
+
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+from collections import Counter
+from urllib.parse import urlencode, urlsplit
+
+
+async def request(reader, writer, host, target):
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("server closed the connection")
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def client(url, path, asins, deadline, latencies, statuses):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            target = f"{path}?{urlencode({'product_id': next(asins)})}"
+            start = time.perf_counter()
+            try:
+                code = await request(reader, writer, parts.netloc, target)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                statuses['conn_error'] += 1
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            latencies.append(time.perf_counter() - start)
+            statuses[code] += 1
+    finally:
+        writer.close()
+
+
+async def run(url, path, asins, concurrency, duration):
+    latencies, statuses = [], Counter()
+    asins = itertools.cycle(asins)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(url, path, asins, start + duration, latencies, statuses) for _ in range(concurrency)
+    ))
+    return latencies, statuses, time.perf_counter() - start
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url')
+    parser.add_argument('--path', action='append', dest='paths')
+    parser.add_argument('--asin', action='append', dest='asins')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=30)
+    args = parser.parse_args()
+
+    paths = args.paths or ['/api/v1/product/', '/api/v1/product/async/']
+    asins = args.asins or ['B0CHX5ZQ9X']
+    print(f"{args.concurrency} connections, {args.duration:.0f}s per path\n")
+    print(f"{'path':<28} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for path in paths:
+        latencies, statuses, elapsed = asyncio.run(run(args.url, path, asins, args.concurrency, args.duration))
+        latencies.sort()
+        if not latencies:
+            print(f"{path:<28} no successful requests {dict(statuses)}")
+            continue
+        print(f"{path:<28} {len(latencies) / elapsed:>8.0f} {statistics.median(latencies) * 1000:>8.1f} "
+              f"{percentile(latencies, 0.95) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f}  {dict(statuses)}")
+
+
+if __name__ == '__main__':
+    main()
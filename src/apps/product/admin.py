@@ -1,22 +1,52 @@
 from django.contrib import admin
+from django.urls import reverse
+from django.utils.html import format_html
+
 from .models import Product
 
+
+class RatingCountFilter(admin.SimpleListFilter):
+    """
+    Filter products by ranges of rating_count, an indexed range scan each,
+    instead of listing every distinct count.
+    """
+    title = 'number of ratings'
+    parameter_name = 'ratings'
+    RANGES = {
+        '0-9': (0, 9),
+        '10-99': (10, 99),
+        '100-999': (100, 999),
+        '1000-9999': (1000, 9999),
+        '10000+': (10000, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, key) for key in self.RANGES]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.RANGES:
+            return queryset
+        low, high = self.RANGES[self.value()]
+        queryset = queryset.filter(rating_count__gte=low)
+        return queryset if high is None else queryset.filter(rating_count__lte=high)
+
+
 class ProductAdmin(admin.ModelAdmin):
     """
     Admin configuration for the Product model.
     """
-    list_display = ('product_id', 'name', 'price', 'rating', 'average_score', 'created_at', 'last_updated', 'edit_button')
+    list_display = ('product_id', 'name', 'price', 'rating_count', 'average_score', 'created_at', 'last_updated', 'edit_button')
     search_fields = ('product_id', 'name')
-    list_filter = ('rating', 'average_score')
+    list_filter = (RatingCountFilter, 'average_score')
     ordering = ('-created_at',)
 
     def edit_button(self, obj):
         """
         Generate an edit button for each row in the list view.
         """
-        url = reverse('admin:app_product_change', args=[obj.pk])
+        url = reverse('admin:product_product_change', args=[obj.pk])
         return format_html('<a href="{}">Edit</a>', url)
-    
+
     edit_button.short_description = 'Edit'
-    
+
 admin.site.register(Product, ProductAdmin)
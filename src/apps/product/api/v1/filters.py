@@ -13,17 +13,43 @@ def validate_asin(value):
     
     if not pattern.match(value):
         raise ValidationError("Invalid product_id")
+
+# Every ASIN is exactly 10 characters
+ASIN_VALIDATORS = [
+    MaxLengthValidator(10),
+    MinLengthValidator(10),
+    validate_asin
+]
+
+def validate_product_id(value):
+    """
+    Run the same checks as ProductFilter on a single product_id.
+    """
+    for validator in ASIN_VALIDATORS:
+        validator(value)
    
 class ProductFilter(filters.FilterSet):
     product_id = filters.CharFilter(
         field_name="product_id", 
         required=True, 
-        validators=[
-            MaxLengthValidator(10), 
-            MinLengthValidator(10),
-            validate_asin
-        ]
+        validators=ASIN_VALIDATORS
     )
     class Meta:
         model = Product
-        fields = []
\ No newline at end of file
+        fields = []
+
+class ProductListFilter(filters.FilterSet):
+    """
+    Filters of the product list: a price range, a minimum average score, a
+    minimum number of ratings and text in the name, each served by an index
+    (see Product.Meta).
+    """
+    min_price = filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = filters.NumberFilter(field_name='price', lookup_expr='lte')
+    min_score = filters.NumberFilter(field_name='average_score', lookup_expr='gte')
+    min_ratings = filters.NumberFilter(field_name='rating_count', lookup_expr='gte')
+    name = filters.CharFilter(field_name='name', lookup_expr='icontains')
+
+    class Meta:
+        model = Product
+        fields = []
@@ -0,0 +1,112 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F, Field, Func, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.utils.urls import replace_query_param
+
+
+class Row(Func):
+    """
+    A row value, `(a, b)`, for comparing several columns at once.
+    """
+    template = '(%(expressions)s)'
+    output_field = Field()
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over the `ordering` field and the primary key.
+
+    The next page is read with a row comparison against the last row of the
+    current one, e.g. `WHERE (price, id) > (9.99, 1234) ORDER BY price, id`,
+    which an index on (price, id) answers by seeking to that row, so a deep
+    page costs what the first one does; OFFSET reads and discards every row
+    before the page. The primary key breaks ties, so pages never skip or
+    repeat rows that share a value.
+
+    The view lists the fields it can be ordered by in `ordering_fields` and
+    its default in `ordering`; ordering by a nullable field leaves out the
+    rows where it is null. Cursors are opaque to clients: the ordering
+    and the last row's key, base64-encoded. Only next links are given.
+    """
+    page_size = settings.PRODUCT_LIST_PAGE_SIZE
+    max_page_size = settings.PRODUCT_LIST_MAX_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        ordering = self.get_ordering(request, view)
+        field = ordering.lstrip('-')
+        descending = ordering.startswith('-')
+        pk = queryset.model._meta.pk.name
+        key = [pk] if field == pk else [field, pk]
+        if queryset.model._meta.get_field(field).null:
+            # A row comparison with NULL is never true, rows without a value can't be paged through in this order
+            queryset = queryset.filter(**{f'{field}__isnull': False})
+
+        queryset = queryset.order_by(*[f"{'-' if descending else ''}{name}" for name in key])
+        cursor = self.decode_cursor(request, ordering, queryset.model, key)
+        if cursor is not None:
+            columns = Row(*[F(name) for name in key])
+            values = Row(*[Value(value, output_field=queryset.model._meta.get_field(name))
+                           for name, value in zip(key, cursor)])
+            queryset = queryset.filter((LessThan if descending else GreaterThan)(columns, values))
+
+        # One extra row tells whether there is a next page
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_cursor = None
+        if len(rows) > page_size:
+            last = page[-1]
+            self.next_cursor = [ordering, *[getattr(last, name) for name in key]]
+        return page
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, request, view):
+        ordering = request.query_params.get(self.ordering_param, view.ordering)
+        if ordering.lstrip('-') not in view.ordering_fields:
+            choices = ', '.join(f"{field}, -{field}" for field in view.ordering_fields)
+            raise ValidationError({self.ordering_param: f"Must be one of {choices}."})
+        return ordering
+
+    def decode_cursor(self, request, ordering, model, key):
+        """
+        The key values of the row to continue after, or None on the first page.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor_ordering, *values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            # A cursor only continues the ordering it was made for
+            if cursor_ordering != ordering or len(values) != len(key):
+                raise ValueError(cursor_ordering)
+            return [model._meta.get_field(name).to_python(value) for name, value in zip(key, values)]
+        except (TypeError, ValueError, binascii.Error, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        # Decimals as strings, to come back exact
+        return base64.urlsafe_b64encode(json.dumps(cursor, default=str).encode()).decode()
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.next_cursor)
+        )
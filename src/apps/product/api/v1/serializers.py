@@ -1,8 +1,50 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 
 from apps.product.models import Product
+from .filters import ASIN_VALIDATORS
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ['product_id', 'name', 'price', 'rating', 'average_score']
+        fields = ['product_id', 'name', 'price', 'rating', 'rating_count', 'average_score']
+
+
+class ProductBatchSerializer(serializers.Serializer):
+    """
+    Input of the batch lookup. Each product_id is validated on its own by the
+    view, so one bad ASIN doesn't fail the whole batch.
+    """
+    product_ids = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=settings.PRODUCT_BATCH_MAX_SIZE,
+    )
+
+
+class ProductHistoryQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the history endpoint. until defaults to now, since
+    to PRODUCT_HISTORY_DEFAULT_RANGE before it, and bucket to the range split
+    into PRODUCT_HISTORY_MAX_POINTS, which is also the most buckets a
+    smaller bucket may split it into.
+    """
+    product_id = serializers.CharField(validators=ASIN_VALIDATORS)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    bucket = serializers.DurationField(required=False, min_value=timedelta(seconds=1))
+
+    def validate(self, attrs):
+        until = attrs.setdefault('until', timezone.now())
+        since = attrs.setdefault('since', until - timedelta(seconds=settings.PRODUCT_HISTORY_DEFAULT_RANGE))
+        if since >= until:
+            raise serializers.ValidationError({'since': "Must be before until."})
+        max_points = settings.PRODUCT_HISTORY_MAX_POINTS
+        bucket = attrs.setdefault('bucket', timedelta(seconds=math.ceil((until - since).total_seconds() / max_points)))
+        if (until - since) / bucket > max_points:
+            raise serializers.ValidationError({'bucket': f"Splits the range into more than {max_points} buckets."})
+        return attrs
@@ -1,10 +1,18 @@
 from django.urls import path
 
-from .views import ProductDetailAPIView
+from .views import (
+    ProductDetailAPIView, ProductAsyncView, ProductBatchAPIView, ProductHistoryAPIView, ProductListAPIView,
+    ScrapeJobAPIView,
+)
 
 
 app_name = 'product'
 
 urlpatterns = [
+    path('products/', ProductListAPIView.as_view(), name='product-list'),
     path('product/', ProductDetailAPIView.as_view(), name='product-detail'),
+    path('product/async/', ProductAsyncView.as_view(), name='product-detail-async'),
+    path('product/batch/', ProductBatchAPIView.as_view(), name='product-batch'),
+    path('product/history/', ProductHistoryAPIView.as_view(), name='product-history'),
+    path('product/jobs/<str:job_id>/', ScrapeJobAPIView.as_view(), name='scrape-job'),
 ]
@@ -6,43 +6,139 @@ AmazonCaptcha
 """
 
 
-import os
 import logging
-from django.core.cache import cache  # Import cache for caching functionality
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views import View
 
 # Import necessary modules from Django REST framework and other libraries
 from rest_framework import generics, status
 from rest_framework.response import Response  # Import Response for creating HTTP responses
+from rest_framework.views import APIView
 from django_filters import rest_framework as filters
 
 # Import necessary models and serializers from the application
 from apps.product.models import Product
-from .serializers import ProductSerializer
-from .filters import ProductFilter
-
-# Import necessary modules for web scraping
-import requests  # Import requests for making HTTP requests
-from bs4 import BeautifulSoup  # Import BeautifulSoup for parsing HTML
-from selenium import webdriver  
-from selenium.webdriver.chrome.options import Options  # Import Options for configuring Chrome options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from amazoncaptcha import AmazonCaptcha  # Import AmazonCaptcha for solving Amazon captchas
-
-# logging settings store in file
-log_file = 'scraper.log'
-logging.basicConfig(level=logging.INFO, filename=log_file, filemode='a',
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+from apps.product import history, jobs, popularity
+from apps.product.jobs import ScrapeJobQueue
+from apps.product import product_cache
+from apps.product.lookup import ProductLookup, ProductLookupError, lookups_total, negative_result
+from apps.product.timing import span
+from .serializers import ProductSerializer, ProductBatchSerializer, ProductHistoryQuerySerializer
+from .filters import ProductFilter, ProductListFilter, validate_product_id
+from .pagination import KeysetPagination
+
 logger = logging.getLogger(__name__)
 
-class ProductDetailAPIView(generics.RetrieveAPIView):
+
+def renders_json(request):
+    """
+    False for the browsable API, which can't be answered with a cached JSON body.
+    """
+    return 'format' not in request.GET and 'text/html' not in request.headers.get('Accept', '')
+
+
+def rendered_response(request, entry, status_code=status.HTTP_200_OK):
+    """
+    Respond with the body of a product_cache entry and its validators
+    (ETag, Last-Modified), or 304 Not Modified when the client's copy is
+    current.
+
+    Shared caches may serve it fresh until its soft TTL runs out, then stale
+    while they revalidate for the rest of its hard TTL, as the server itself
+    does while a background refresh is under way.
+    """
+    response = HttpResponse(entry['body'], status=status_code, content_type='application/json')
+    response['ETag'] = entry['etag']
+    # HTTP dates have no fraction of a second, If-Modified-Since neither
+    last_modified = int(entry['last_modified'])
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=max(0, int(entry['soft_expires'] - time.time())),
+        stale_while_revalidate=settings.PRODUCT_CACHE_HARD_TTL - settings.PRODUCT_CACHE_SOFT_TTL,
+    )
+    patch_vary_headers(response, ['Accept'])
+    return get_conditional_response(request, etag=entry['etag'], last_modified=last_modified, response=response)
+
+
+class StandardResponseMixin:
+    """
+    The success/error response envelopes shared by the API views.
+    """
+
+    def success_response(self, data, status_code):
+        """
+        Create a standardized success response.
+        """
+        return Response({
+            "status": "success",
+            "data": data
+        }, status=status_code)
+
+    def error_response(self, message, status_code, headers=None):
+        """
+        Create a standardized error response.
+        """
+        return Response({
+            "status": "error",
+            "message": message
+        }, status=status_code, headers=headers)
+
+
+class ProductLookupMixin(StandardResponseMixin, ProductLookup):
+    """
+    Product lookup for API views.
+    """
+
+
+class ProductDetailAPIView(ProductLookupMixin, generics.RetrieveAPIView):
     # Set the queryset and serializer class for the view
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     # filter_backends = (filters.DjangoFilterBackend,) setted in settings.py in rest framwork settings section 
     filterset_class = ProductFilter
 
+    def dispatch(self, request, *args, **kwargs):
+        response = self.cached_response(request)
+        if response is not None:
+            return response
+        return super().dispatch(request, *args, **kwargs)
+
+    def cached_response(self, request):
+        """
+        Answer a cache hit with the response body cached with the product,
+        skipping filtering, content negotiation and rendering. Returns None
+        to take the full path: not a JSON GET, an invalid product_id (the
+        filter reports why), or not cached.
+        """
+        if request.method not in ('GET', 'HEAD') or not renders_json(request):
+            return None
+        product_id = request.GET.get('product_id', '')
+        try:
+            validate_product_id(product_id)
+        except ValidationError:
+            return None
+
+        with span('cache'):
+            entry, result = product_cache.get_rendered(product_id)
+        if entry is None:
+            return None
+        popularity.hit(product_id)
+        lookups_total.inc(source='cache')
+        if result == product_cache.STALE:
+            self.refresh_in_background(product_id)
+        return rendered_response(request, entry)
+
     def get(self, request, *args, **kwargs):
         """
         Handles GET requests to retrieve product details.
@@ -52,160 +148,273 @@ class ProductDetailAPIView(generics.RetrieveAPIView):
         
         # Get the product_id from query parameters
         product_id = request.query_params.get('product_id')
-      
-        # Check if product exists in cache
-        product_data = self.check_cache(product_id)
-        if product_data:
-            return self.success_response(product_data, status.HTTP_200_OK)
 
-        # Check if product exists in the database
-        product_data = self.check_database(product_id)
-        
-        if product_data:
-            return self.success_response(product_data, status.HTTP_200_OK)
+        try:
+            if self.wants_async(request):
+                return self.lookup_async(product_id)
+            product_data, status_code = self.lookup_product(product_id)
+        except ProductLookupError as e:
+            return self.error_response(e.message, e.status_code, headers=e.headers)
+        return self.product_response(product_id, product_data, status_code)
 
-        # Scrape product details from Amazon
-        product_data = self.scrape_amazon_product(product_id)
-        
-        if product_data:
-            
-            # Check if all items except product_id are None
-            if all(value is None for key, value in product_data.items() if key != 'product_id'):
-                return self.error_response("Product data is incomplete", status.HTTP_400_BAD_REQUEST)
-            
-            # Save the product to the database
-            product = Product(**product_data)
-            product.save()
-            serializer = ProductSerializer(product)
-            cache.set(f"product_{product_id}", serializer.data, timeout=60*60*12)  # Cache for 12 hours
-            return self.success_response(serializer.data, status.HTTP_201_CREATED)
-        else:
-            return self.error_response("Product not found", status.HTTP_404_NOT_FOUND)
+    def product_response(self, product_id, product_data, status_code):
+        """
+        Respond with a product the lookup found. A JSON response is made
+        from the entry the lookup cached, so it gets the same ETag and
+        caching headers as a cache hit.
+        """
+        if renders_json(self.request):
+            with span('cache'):
+                entry, _ = product_cache.get_rendered(product_id, count=False)
+            if entry is not None:
+                return rendered_response(self.request, entry, status_code)
+        return self.success_response(product_data, status_code)
 
-    def check_cache(self, product_id):
+    def wants_async(self, request):
         """
-        Check if the product exists in the cache.
+        Scrape in the background if configured so, or if the client sent `Prefer: respond-async`.
         """
-        cache_key = f"product_{product_id}"
-        return cache.get(cache_key)
+        return settings.PRODUCT_ASYNC_SCRAPE or 'respond-async' in request.headers.get('Prefer', '')
 
-    def check_database(self, product_id):
+    def lookup_async(self, product_id):
         """
-        Check if the product exists in the database.
+        Answer from cache or database, otherwise queue a scrape job and answer 202 with its id.
         """
-        try:
-            product = Product.objects.get(product_id=product_id)
-            serializer = ProductSerializer(product)
-            cache.set(f"product_{product_id}", serializer.data, timeout=60*60*12)  # Cache for 15 minutes
-            return serializer.data
-        except Product.DoesNotExist:
-            return None
+        popularity.hit(product_id)
+        product_data = self.check_cache(product_id)
+        if not product_data:
+            self.check_negative_cache(product_id)
+            product_data = self.check_database(product_id)
+        if product_data:
+            return self.product_response(product_id, product_data, status.HTTP_200_OK)
 
-    
-    def create_webdriver(self):
-        selenium_host = os.getenv('SELENIUM_HOST', 'selenium')
-        selenium_port = os.getenv('SELENIUM_PORT', '4444')
-        selenium_url = f'http://{selenium_host}:{selenium_port}/wd/hub'
-
-        options = Options()
-        options.headless = True  # Run Chrome in headless mode
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--disable-gpu')
-
-        driver = webdriver.Remote(
-            command_executor=selenium_url,
-            options=options
-        )
-        return driver
+        job_id, _ = ScrapeJobQueue().enqueue(product_id)
+        status_url = self.request.build_absolute_uri(reverse('product:scrape-job', args=[job_id]))
+        return Response({
+            "status": "pending",
+            "job_id": job_id,
+            "status_url": status_url
+        }, status=status.HTTP_202_ACCEPTED, headers={'Location': status_url})
 
 
-    def scrape_amazon_product(self, product_id):
-        url = f"https://www.amazon.com/dp/{product_id}"
-        driver = self.create_webdriver()
-        
+class ProductAsyncView(View):
+    """
+    Async twin of ProductDetailAPIView for ASGI servers.
+
+    Cache and database lookups are awaited on the event loop, so a worker can
+    hold many lookups in flight; only a scrape runs in a thread. DRF views are
+    synchronous, hence a plain Django view with the same query parameter and
+    response envelopes.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        filterset = ProductFilter(request.GET, queryset=Product.objects.none())
+        if not filterset.is_valid():
+            return JsonResponse(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        product_id = filterset.form.cleaned_data['product_id']
+
         try:
-            logger.info(f"Fetching URL: {url}")
-            driver.get(url)
-            page_source = driver.page_source
-            captcha_form = '<form method="get" action="/errors/validateCaptcha"'
-            # logger.info(driver.page_source[:200])
-            if captcha_form in page_source or 'validatecaptcha' in page_source.lower() or 'captcha' in page_source.lower():
-                logger.info("CAPTCHA detected. Solving CAPTCHA...")
-                link = driver.find_element(By.XPATH, "//div[@class='a-row a-text-center']//img").get_attribute("src")
-                captcha = AmazonCaptcha.fromlink(link)
-                captcha_value = captcha.solve()
-                logger.info(captcha_value)
-                captcha_input = driver.find_element(By.ID, "captchacharacters")
-                captcha_input.send_keys(captcha_value)
-
-                button = driver.find_element(By.CLASS_NAME, 'a-button-text')
-                button.click()
-                
-                # Wait for the page to load after clicking
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.ID, "productTitle"))
-                )
-
-
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            product_data = self.parse_soup(soup, product_id)
-        finally:
-            driver.quit()
-        logger.info(product_data)
-        return product_data
-
-    def parse_soup(self, soup, product_id):
-        # Get the product title
-        title_tag = soup.find('span', id='productTitle')
-        if not title_tag:
-            logger.error("No title_tag. Failed to fetch product page after CAPTCHA.")
-            
-        name = title_tag.get_text(strip=True) if title_tag else None
-        
-        # Get the product price
-        price_tag = soup.find('input', id='twister-plus-price-data-price')
-        if not price_tag:
-            logger.error("No price_tag. Failed to fetch product page after CAPTCHA.")
-            
-        price = price_tag['value'] if price_tag and 'value' in price_tag.attrs else None
-
-        # Get the product rating
-        rating_tag = soup.find('span', id='acrCustomerReviewText', class_='a-size-base')
-        if not rating_tag:
-            logger.error("No rating_tag. Failed to fetch product page after CAPTCHA.")
-            
-        rating = rating_tag.get_text(strip=True).split()[0] if rating_tag else None
-
-        # Get the product average score
-        average_score_tag = soup.find('span', id='acrPopover', class_='reviewCountTextLinkedHistogram noUnderline')
-        if not average_score_tag:
-            logger.error("No average_score_tag. Failed to fetch product page after CAPTCHA.")
-            
-        average_score = average_score_tag['title'].split()[0] if average_score_tag and 'title' in average_score_tag.attrs else None
-        
-        return {
+            product_data, status_code = await ProductLookup().alookup_product(product_id)
+        except ProductLookupError as e:
+            return JsonResponse({"status": "error", "message": e.message}, status=e.status_code, headers=e.headers)
+
+        with span('cache'):
+            entry, _ = await product_cache.aget_rendered(product_id, count=False)
+        if entry is not None:
+            return rendered_response(request, entry, status_code)
+        return JsonResponse({"status": "success", "data": product_data}, status=status_code)
+
+
+class ScrapeJobAPIView(StandardResponseMixin, APIView):
+    """
+    Poll a scrape job queued by the product view.
+
+    Answers 202 while the job is queued or running, then the same response
+    the synchronous product lookup would have given.
+    """
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = ScrapeJobQueue().get(job_id)
+        if job is None:
+            return self.error_response("Job not found", status.HTTP_404_NOT_FOUND)
+
+        if job['state'] == jobs.DONE:
+            return self.success_response(job['result'], job['status_code'])
+        if job['state'] == jobs.FAILED:
+            return self.error_response(job['result'], job['status_code'])
+        return Response({
+            "status": "pending",
+            "job_id": job_id,
+            "state": job['state']
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class ProductListAPIView(StandardResponseMixin, generics.ListAPIView):
+    """
+    List and search the stored products; this never scrapes.
+
+    Filter with min_price, max_price, min_score, min_ratings and name (text
+    in the name), order with ?ordering= price, average_score, rating_count or
+    id, descending with a leading '-' (default -id, newest first). Pages are keyset paginated:
+    follow `next` to read on.
+    """
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
+    filterset_class = ProductListFilter
+    pagination_class = KeysetPagination
+    ordering_fields = ('price', 'average_score', 'rating_count', 'id')
+    ordering = '-id'
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        with span('db'):
+            page = self.paginate_queryset(queryset)
+        return self.success_response({
+            "next": self.paginator.get_next_link(),
+            "results": self.get_serializer(page, many=True).data,
+        }, status.HTTP_200_OK)
+
+
+class ProductHistoryAPIView(StandardResponseMixin, APIView):
+    """
+    A stored product's price and rating history, downsampled on the database.
+
+    Answers one point per bucket with observations between since and until:
+    the min, max and last price, rating count and average score (see
+    history.series). Products are only observed once stored, this never
+    scrapes.
+    """
+
+    def get(self, request, *args, **kwargs):
+        query = ProductHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        product_id, since, until, bucket = (
+            query.validated_data[name] for name in ('product_id', 'since', 'until', 'bucket')
+        )
+
+        with span('db'):
+            product = Product.objects.filter(product_id=product_id).only('pk').first()
+            if product is None:
+                return self.error_response("Product not found", status.HTTP_404_NOT_FOUND)
+            points = history.series(product, since, until, bucket)
+        return self.success_response({
             "product_id": product_id,
-            "name": name,
-            "price": price,
-            "rating": rating,
-            "average_score": average_score
-        }
-        
-    def success_response(self, data, status_code):
+            "since": since,
+            "until": until,
+            "bucket": bucket.total_seconds(),
+            "points": points,
+        }, status.HTTP_200_OK)
+
+
+class ProductBatchAPIView(ProductLookupMixin, generics.GenericAPIView):
+    """
+    Look up many products in one request.
+
+    Products are resolved with one cache round-trip (get_many), one more for
+    the negative cache, then one database query for the cache misses, then
+    concurrent scrapes for whatever is still missing. Every requested product_id gets its own success or error
+    entry, so a batch can partially succeed.
+    """
+    serializer_class = ProductBatchSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # Keep the requested order, drop duplicates
+        product_ids = list(dict.fromkeys(serializer.validated_data['product_ids']))
+
+        results = {}
+        valid_ids = []
+        for product_id in product_ids:
+            try:
+                validate_product_id(product_id)
+                valid_ids.append(product_id)
+            except ValidationError as e:
+                results[product_id] = self.error_result(e.messages[0], status.HTTP_400_BAD_REQUEST)
+
+        popularity.hit(*valid_ids)
+        found = self.check_cache_many(valid_ids)
+        missing = [product_id for product_id in valid_ids if product_id not in found]
+        for product_id, reason in self.check_negative_cache_many(missing).items():
+            results[product_id] = self.lookup_error_result(negative_result(reason, cached=True))
+        missing = [product_id for product_id in missing if product_id not in results]
+        found.update(self.check_database_many(missing))
+        for product_id, product_data in found.items():
+            results[product_id] = self.success_result(product_data, status.HTTP_200_OK)
+
+        missing = [product_id for product_id in missing if product_id not in found]
+        results.update(self.scrape_many(missing))
+
+        return self.success_response({product_id: results[product_id] for product_id in product_ids}, status.HTTP_200_OK)
+
+    def check_cache_many(self, product_ids):
         """
-        Create a standardized success response.
+        Fetch all cached products in a single round-trip.
         """
-        return Response({
-            "status": "success",
-            "data": data
-        }, status=status_code)
+        if not product_ids:
+            return {}
+        found = {}
+        for product_id, (product_data, result) in product_cache.get_many(product_ids).items():
+            if result == product_cache.STALE:
+                self.refresh_in_background(product_id)
+            found[product_id] = product_data
+        return found
 
-    def error_response(self, message, status_code):
+    def check_negative_cache_many(self, product_ids):
         """
-        Create a standardized error response.
+        Find the products recently found not worth scraping, in a single round-trip.
         """
-        return Response({
-            "status": "error",
-            "message": message
-        }, status=status_code)
+        if not product_ids:
+            return {}
+        return product_cache.get_negative_many(product_ids)
+
+    def check_database_many(self, product_ids):
+        """
+        Fetch all stored products in one query and cache them in one round-trip.
+        """
+        if not product_ids:
+            return {}
+        products = {
+            product.product_id: (ProductSerializer(product).data, product.last_updated)
+            for product in Product.objects.filter(product_id__in=product_ids)
+        }
+        product_cache.set_many(products)
+        return {product_id: data for product_id, (data, _) in products.items()}
+
+    def scrape_many(self, product_ids):
+        """
+        Scrape the remaining products concurrently, bounded by PRODUCT_BATCH_SCRAPE_WORKERS.
+        """
+        if not product_ids:
+            return {}
+        workers = min(settings.PRODUCT_BATCH_SCRAPE_WORKERS, len(product_ids))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(self.scrape_result, product_ids)
+            return dict(zip(product_ids, results))
+
+    def scrape_result(self, product_id):
+        try:
+            product_data, status_code = self.scrape_product(product_id)
+            return self.success_result(product_data, status_code)
+        except ProductLookupError as e:
+            return self.lookup_error_result(e)
+        except Exception:
+            logger.exception(f"Scraping {product_id} failed")
+            return self.error_result("Failed to fetch product", status.HTTP_502_BAD_GATEWAY)
+        finally:
+            # Each worker thread opens its own database connection
+            connection.close()
+
+    def success_result(self, data, status_code):
+        return {"status": "success", "code": status_code, "data": data}
+
+    def error_result(self, message, status_code):
+        return {"status": "error", "code": status_code, "message": message}
+
+    def lookup_error_result(self, error):
+        result = self.error_result(error.message, error.status_code)
+        if error.reason is not None:
+            result["reason"] = error.reason
+            result["negative_cache"] = "hit" if error.cached else "miss"
+        return result
@@ -0,0 +1,244 @@
+"""
+Solving Amazon's CAPTCHA, and keeping the cookies that avoid the next one.
+
+Solvers are pluggable (CAPTCHA_SOLVER):
+
+    amazoncaptcha  local OCR with the amazoncaptcha package
+    2captcha       the 2Captcha service, needs TWOCAPTCHA_API_KEY
+    stub           fixed answers, for tests and local development
+
+Amazon reuses a finite set of CAPTCHA images, so solutions are cached by the
+SHA-256 of the image and a repeat costs a cache lookup. A solution Amazon
+rejects is dropped from the cache.
+
+Once a session gets past a CAPTCHA its cookies mark it as trusted for a
+while. They are stored in the cache and applied to the other pooled drivers
+and to the HTTP session, so one solve serves every worker.
+"""
+
+import base64
+import hashlib
+import io
+import logging
+import threading
+import time
+
+import lxml.html
+import requests
+from amazoncaptcha import AmazonCaptcha
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.product.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+captcha_solves_total = Counter(
+    'captcha_solves_total',
+    "CAPTCHA solutions by solver and result (cached, solved, unsolved, rejected)",
+    ['solver', 'result'],
+)
+
+CAPTCHA_IMAGE_XPATH = "//div[@class='a-row a-text-center']//img"
+
+
+def image_hash(image):
+    return hashlib.sha256(image).hexdigest()
+
+
+def solution_key(image):
+    return f"captcha_solution:{image_hash(image)}"
+
+
+def download_image(url, timeout=10):
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+
+def captcha_form(page_source):
+    """
+    Return (action, hidden_fields, image_url) of a CAPTCHA page, or None if it has no CAPTCHA form.
+    """
+    try:
+        root = lxml.html.document_fromstring(page_source.encode('utf-8'))
+    except lxml.etree.ParserError:
+        return None
+    forms = root.xpath('//form[contains(@action, "validateCaptcha")]')
+    images = root.xpath(CAPTCHA_IMAGE_XPATH)
+    if not forms or not images:
+        return None
+    hidden_fields = {
+        field.get('name'): field.get('value', '')
+        for field in forms[0].xpath('.//input[@type="hidden"]') if field.get('name')
+    }
+    return forms[0].get('action'), hidden_fields, images[0].get('src')
+
+
+class CaptchaSolver:
+    """
+    Base class for CAPTCHA solvers.
+    """
+    name = None
+
+    def solve(self, image):
+        """
+        Return the text in the CAPTCHA image (bytes), or None if it can't be read.
+        """
+        raise NotImplementedError
+
+    def reject(self, image):
+        """
+        Amazon did not accept the solution given for image.
+        """
+
+
+class AmazonCaptchaSolver(CaptchaSolver):
+    name = 'amazoncaptcha'
+
+    def solve(self, image):
+        solution = AmazonCaptcha(io.BytesIO(image)).solve()
+        return None if solution == 'Not solved' else solution
+
+
+class TwoCaptchaSolver(CaptchaSolver):
+    name = '2captcha'
+
+    def __init__(self, api_key=None):
+        # Optional dependency, only needed when this solver is configured
+        from twocaptcha import TwoCaptcha
+
+        self.client = TwoCaptcha(api_key or settings.TWOCAPTCHA_API_KEY)
+
+    def solve(self, image):
+        try:
+            return self.client.normal(base64.b64encode(image).decode())['code']
+        except Exception as e:
+            logger.warning(f"2Captcha could not solve the CAPTCHA: {e}")
+            return None
+
+
+class StubSolver(CaptchaSolver):
+    """
+    Answers from a {image_hash: solution} dict, or `default`.
+    """
+    name = 'stub'
+
+    def __init__(self, answers=None, default=None):
+        self.answers = answers or {}
+        self.default = default
+        self.calls = 0
+
+    def solve(self, image):
+        self.calls += 1
+        return self.answers.get(image_hash(image), self.default)
+
+
+class CachingSolver(CaptchaSolver):
+    """
+    Caches another solver's solutions by image hash.
+    """
+
+    def __init__(self, solver, timeout=None):
+        self.solver = solver
+        self.name = solver.name
+        self.timeout = settings.CAPTCHA_SOLUTION_TTL if timeout is None else timeout
+
+    def solve(self, image):
+        solution = cache.get(solution_key(image))
+        if solution is not None:
+            captcha_solves_total.inc(solver=self.name, result='cached')
+            return solution
+
+        solution = self.solver.solve(image)
+        if solution is None:
+            captcha_solves_total.inc(solver=self.name, result='unsolved')
+            return None
+        captcha_solves_total.inc(solver=self.name, result='solved')
+        cache.set(solution_key(image), solution, timeout=self.timeout)
+        return solution
+
+    def reject(self, image):
+        captcha_solves_total.inc(solver=self.name, result='rejected')
+        cache.delete(solution_key(image))
+        self.solver.reject(image)
+
+
+SOLVERS = {solver.name: solver for solver in (AmazonCaptchaSolver, TwoCaptchaSolver, StubSolver)}
+
+_solver = None
+_solver_lock = threading.Lock()
+
+
+def get_captcha_solver():
+    """
+    Return the process-wide solver selected by CAPTCHA_SOLVER, with caching.
+    """
+    global _solver
+    if _solver is None:
+        with _solver_lock:
+            if _solver is None:
+                try:
+                    solver = SOLVERS[settings.CAPTCHA_SOLVER]()
+                except KeyError:
+                    raise ValueError(f"Unknown CAPTCHA solver {settings.CAPTCHA_SOLVER!r}, expected one of {sorted(SOLVERS)}")
+                _solver = CachingSolver(solver)
+    return _solver
+
+
+class SessionCookies:
+    """
+    Amazon cookies of the last session that got past a CAPTCHA, shared by
+    all workers through the cache.
+
+    Each driver and HTTP session remembers the version it was given, so the
+    cookies are only applied again after another session saved newer ones.
+    """
+    key = 'amazon_session_cookies'
+
+    def load(self):
+        return cache.get(self.key)
+
+    def save(self, cookies):
+        """
+        Store cookies (dicts as returned by WebDriver.get_cookies) and return their version.
+        """
+        version = time.time()
+        cookies = [
+            {field: cookie[field] for field in ('name', 'value', 'domain', 'path', 'secure') if field in cookie}
+            for cookie in cookies
+        ]
+        cache.set(self.key, {'version': version, 'cookies': cookies}, timeout=settings.AMAZON_COOKIES_TTL)
+        return version
+
+    def save_from_session(self, session):
+        session.amazon_cookies_version = self.save([
+            {'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain, 'path': cookie.path, 'secure': cookie.secure}
+            for cookie in session.cookies
+        ])
+
+    def apply_to_driver(self, driver):
+        """
+        Add the shared cookies to a driver that is on an Amazon page. Returns
+        True if it was given cookies it didn't have yet.
+        """
+        stored = self.load()
+        if not stored or getattr(driver, 'amazon_cookies_version', None) == stored['version']:
+            return False
+        for cookie in stored['cookies']:
+            try:
+                driver.add_cookie(cookie)
+            except Exception as e:
+                logger.warning(f"Could not set cookie {cookie['name']}: {e}")
+        driver.amazon_cookies_version = stored['version']
+        return True
+
+    def apply_to_session(self, session):
+        stored = self.load()
+        if not stored or getattr(session, 'amazon_cookies_version', None) == stored['version']:
+            return False
+        for cookie in stored['cookies']:
+            session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
+        session.amazon_cookies_version = stored['version']
+        return True
+
@@ -0,0 +1,101 @@
+"""
+Compact binary encoding of product cache entries.
+
+A product entry is packed into a versioned envelope instead of pickled: no
+field names, no class references, just the values.
+
+    version 3: version (B) | flags (B) | soft_expires (d) | last_modified (d) | etag length (B) | etag | body
+
+The body is the rendered response (see product_cache.render_body),
+zlib-compressed when the COMPRESSED flag is set: when it is at least
+COMPRESS_MIN_SIZE bytes long and compression makes it smaller. The product
+data itself is not stored, it is parsed back from the body when needed.
+
+CacheSerializer plugs this into django_redis (OPTIONS['SERIALIZER']). Values
+that aren't product entries (negative cache reasons, cookies, job results)
+are pickled as before; pickles (protocol 2 and up) start with 0x80, which is
+never an envelope version, so entries written by either format are read
+back correctly. An envelope of a version this code doesn't know decodes to
+None, a cache miss.
+"""
+
+import pickle
+import struct
+import zlib
+
+from django_redis.serializers.base import BaseSerializer
+
+VERSION = 3
+
+COMPRESSED = 0x01
+
+COMPRESS_MIN_SIZE = 512
+
+HEADER = struct.Struct('!BBddB')
+
+ENTRY_KEYS = {'body', 'etag', 'last_modified', 'soft_expires'}
+
+
+def is_product_entry(value):
+    """
+    True if value is a product entry this format can hold; its 'data' is dropped.
+    """
+    return (
+        type(value) is dict
+        and value.keys() - {'data'} == ENTRY_KEYS
+        and type(value['body']) is bytes
+        and type(value['etag']) is str and len(value['etag']) < 256
+        and type(value['last_modified']) in (int, float)
+        and type(value['soft_expires']) in (int, float)
+    )
+
+
+def encode_entry(entry):
+    """
+    Pack a product entry (see is_product_entry) into an envelope.
+    """
+    body = entry['body']
+    flags = 0
+    if len(body) >= COMPRESS_MIN_SIZE:
+        compressed = zlib.compress(body)
+        if len(compressed) < len(body):
+            body, flags = compressed, COMPRESSED
+    etag = entry['etag'].encode()
+    return HEADER.pack(VERSION, flags, entry['soft_expires'], entry['last_modified'], len(etag)) + etag + body
+
+
+def decode_entry(value):
+    """
+    Unpack an envelope; returns None if it was written by an unknown version.
+    """
+    if value[0] != VERSION:
+        return None
+    _, flags, soft_expires, last_modified, etag_length = HEADER.unpack_from(value)
+    offset = HEADER.size
+    body = value[offset + etag_length:]
+    return {
+        'body': zlib.decompress(body) if flags & COMPRESSED else body,
+        'etag': value[offset:offset + etag_length].decode(),
+        'last_modified': last_modified,
+        'soft_expires': soft_expires,
+    }
+
+
+class CacheSerializer(BaseSerializer):
+    """
+    django_redis serializer: product entries in the binary format, anything else pickled.
+    """
+
+    def __init__(self, options):
+        self.protocol = int(options.get('PICKLE_VERSION', pickle.DEFAULT_PROTOCOL))
+        super().__init__(options=options)
+
+    def dumps(self, value):
+        if is_product_entry(value):
+            return encode_entry(value)
+        return pickle.dumps(value, self.protocol)
+
+    def loads(self, value):
+        if value[:1] == b'\x80':
+            return pickle.loads(value)
+        return decode_entry(value)
@@ -0,0 +1,346 @@
+"""
+Tiered fetching of Amazon product pages.
+
+Most product pages come back complete from a plain HTTP GET, which is far
+cheaper than driving a headless Chrome. The HTTP tier is tried first; a
+CAPTCHA page, a transport error or a page missing product fields escalates
+the fetch to the Selenium tier, which can solve the CAPTCHA.
+"""
+
+import logging
+import re
+import threading
+from urllib.parse import urljoin
+
+import requests  # Import requests for making HTTP requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from apps.product.captcha import (
+    CAPTCHA_IMAGE_XPATH, SessionCookies, captcha_form, download_image, get_captcha_solver,
+)
+from apps.product.metrics import Counter
+from apps.product.parsers import parse_html, is_complete
+from apps.product.throttling import ThrottleTimeout, get_outbound_throttle
+from apps.product.timing import span
+from apps.product.webdriver_pool import get_driver_pool
+
+logger = logging.getLogger(__name__)
+
+fetches_total = Counter(
+    'product_fetches_total',
+    "Product page fetches by tier and outcome",
+    ['tier', 'outcome'],
+)
+captchas_total = Counter(
+    'product_fetch_captchas_total',
+    "CAPTCHA pages Amazon answered with, by tier",
+    ['tier'],
+)
+escalations_total = Counter(
+    'product_fetch_escalations_total',
+    "Fetches escalated from the HTTP tier to Selenium, by reason",
+    ['reason'],
+)
+
+
+def product_url(product_id):
+    return f"{settings.AMAZON_BASE_URL}/dp/{product_id}"
+
+
+# The challenge page's form posts to /errors/validateCaptcha, its text field is #captchacharacters.
+# A product page can say "captcha" anywhere (scripts, class names, reviews) without being one.
+CAPTCHA_PAGE_PATTERN = re.compile(
+    r"""<form[^>]*\saction=["'][^"']*/errors/validateCaptcha|\sid=["']captchacharacters["']""",
+    re.IGNORECASE,
+)
+
+
+def is_captcha_page(page_source):
+    return CAPTCHA_PAGE_PATTERN.search(page_source) is not None
+
+
+class ProductNotFound(Exception):
+    """
+    Amazon answered that the product page does not exist.
+    """
+
+
+class CaptchaFailed(Exception):
+    """
+    Amazon still showed its CAPTCHA after we submitted a solution.
+    """
+
+
+class HttpFetcher:
+    """
+    Fetch product pages with a pooled keep-alive requests.Session.
+
+    With a solver, a CAPTCHA page is solved over HTTP too, before the fetch
+    would be escalated to Selenium.
+    """
+    tier = 'http'
+
+    def __init__(self, pool_size=10, timeout=10, user_agent=None, solver=None, cookies=None, throttle=None):
+        self.timeout = timeout
+        self.solver = solver
+        self.cookies = cookies
+        self.throttle = throttle
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Encoding': 'gzip, deflate',
+            'Accept-Language': 'en-US,en;q=0.9',
+        })
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+
+    def fetch(self, product_id):
+        url = product_url(product_id)
+        if self.cookies is not None:
+            self.cookies.apply_to_session(self.session)
+        logger.info(f"Fetching URL over HTTP: {url}")
+        response = self.session.get(url, timeout=self.timeout)
+        if response.status_code == 404:
+            raise ProductNotFound(product_id)
+        response.raise_for_status()
+
+        if is_captcha_page(response.text):
+            captchas_total.inc(tier=self.tier)
+            if self.throttle is not None:
+                self.throttle.captcha()
+            if self.solver is not None:
+                response = self.solve_captcha(response) or response
+        return response.text
+
+    @span('captcha')
+    def solve_captcha(self, response):
+        """
+        Submit the CAPTCHA form in `response`. Returns the page Amazon answered
+        with if it let us through, else None.
+        """
+        form = captcha_form(response.text)
+        if form is None:
+            return None
+        action, fields, image_url = form
+
+        image = self.session.get(image_url, timeout=self.timeout).content
+        solution = self.solver.solve(image)
+        if not solution:
+            return None
+
+        params = {**fields, 'field-keywords': solution}
+        solved = self.session.get(urljoin(response.url, action), params=params, timeout=self.timeout)
+        if not solved.ok or is_captcha_page(solved.text):
+            self.solver.reject(image)
+            return None
+        logger.info("CAPTCHA solved over HTTP")
+        if self.cookies is not None:
+            self.cookies.save_from_session(self.session)
+        return solved
+
+
+class SeleniumFetcher:
+    """
+    Fetch product pages with a pooled WebDriver, solving Amazon's CAPTCHA if shown.
+
+    Before solving, the driver is given the cookies another session saved
+    after its own solve, which is often enough to get the page.
+    """
+    tier = 'selenium'
+
+    def __init__(self, solver=None, cookies=None, throttle=None):
+        self.solver = solver or get_captcha_solver()
+        self.cookies = cookies
+        self.throttle = throttle
+
+    def fetch(self, product_id):
+        url = product_url(product_id)
+
+        # Borrow a warm session from the pool instead of starting one per request
+        with get_driver_pool().driver() as driver:
+            logger.info(f"Fetching URL: {url}")
+            self.load(driver, url)
+            if is_captcha_page(driver.page_source) and self.cookies is not None and self.cookies.apply_to_driver(driver):
+                logger.info("CAPTCHA detected, retrying with the shared session cookies")
+                self.load(driver, url)
+            if is_captcha_page(driver.page_source):
+                logger.info("CAPTCHA detected. Solving CAPTCHA...")
+                captchas_total.inc(tier=self.tier)
+                if self.throttle is not None:
+                    self.throttle.captcha()
+                self.solve_captcha(driver, product_id)
+            return driver.page_source
+
+    @span('navigation')
+    def load(self, driver, url):
+        """
+        Open url. With the eager and none page load strategies driver.get
+        returns before the page is complete, so wait until the product title
+        or the CAPTCHA form is there, or the page finished loading without
+        either (not a product page, the parser decides).
+        """
+        driver.get(url)
+        if settings.SELENIUM_PAGE_LOAD_STRATEGY == 'normal':
+            return
+        try:
+            WebDriverWait(driver, settings.SELENIUM_CONTENT_WAIT_TIMEOUT).until(EC.any_of(
+                EC.presence_of_element_located((By.ID, "productTitle")),
+                EC.presence_of_element_located((By.ID, "captchacharacters")),
+                lambda driver: driver.execute_script("return document.readyState") == 'complete',
+            ))
+        except TimeoutException:
+            logger.warning(f"Neither a product nor a CAPTCHA on {url} after {settings.SELENIUM_CONTENT_WAIT_TIMEOUT}s")
+
+    @span('captcha')
+    def solve_captcha(self, driver, product_id):
+        link = driver.find_element(By.XPATH, CAPTCHA_IMAGE_XPATH).get_attribute("src")
+        image = download_image(link)
+        captcha_value = self.solver.solve(image)
+        logger.info(captcha_value)
+        if not captcha_value:
+            raise CaptchaFailed(product_id)
+        captcha_input = driver.find_element(By.ID, "captchacharacters")
+        captcha_input.send_keys(captcha_value)
+
+        button = driver.find_element(By.CLASS_NAME, 'a-button-text')
+        button.click()
+
+        # Wait for the page to load after clicking
+        try:
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.ID, "productTitle"))
+            )
+        except TimeoutException:
+            if is_captcha_page(driver.page_source):
+                self.solver.reject(image)
+                raise CaptchaFailed(product_id)
+            raise
+
+        if self.cookies is not None:
+            driver.amazon_cookies_version = self.cookies.save(driver.get_cookies())
+
+
+class TieredFetcher:
+    """
+    Try each fetcher in order and return the first complete product.
+
+    The last tier's result is returned as is, complete or not. With a
+    throttle, every tier's fetch holds an outbound slot, and CAPTCHAs and
+    complete pages are reported to it.
+    """
+
+    def __init__(self, tiers, parse=parse_html, throttle=None):
+        self.tiers = tiers
+        self.parse = parse
+        self.throttle = throttle
+
+    def fetch_product(self, product_id):
+        """
+        Return the parsed product fields, or None if the product does not exist.
+        Raises CaptchaFailed if the last tier could not get past the CAPTCHA,
+        ThrottleTimeout if no outbound slot was free in time.
+        """
+        for tier in self.tiers[:-1]:
+            try:
+                page_source = self._fetch(tier, product_id)
+            except ProductNotFound:
+                fetches_total.inc(tier=tier.tier, outcome='not_found')
+                return None
+            except requests.RequestException as e:
+                logger.warning(f"{tier.tier} fetch of {product_id} failed: {e}")
+                self._escalate(tier, 'error')
+                continue
+
+            if is_captcha_page(page_source):
+                self._escalate(tier, 'captcha')
+                continue
+
+            with span('parse'):
+                product_data = self.parse(page_source, product_id)
+            if not is_complete(product_data):
+                self._escalate(tier, 'incomplete')
+                continue
+
+            fetches_total.inc(tier=tier.tier, outcome='ok')
+            self._success()
+            return product_data
+
+        last = self.tiers[-1]
+        try:
+            page_source = self._fetch(last, product_id)
+            with span('parse'):
+                product_data = self.parse(page_source, product_id)
+        except ProductNotFound:
+            fetches_total.inc(tier=last.tier, outcome='not_found')
+            return None
+        except CaptchaFailed:
+            fetches_total.inc(tier=last.tier, outcome='captcha_failed')
+            raise
+        except ThrottleTimeout:
+            raise
+        except Exception:
+            fetches_total.inc(tier=last.tier, outcome='error')
+            raise
+        if is_complete(product_data):
+            fetches_total.inc(tier=last.tier, outcome='ok')
+            self._success()
+        else:
+            fetches_total.inc(tier=last.tier, outcome='incomplete')
+        return product_data
+
+    def _fetch(self, tier, product_id):
+        if self.throttle is None:
+            with span(f'fetch_{tier.tier}'):
+                return tier.fetch(product_id)
+        try:
+            with self.throttle.slot(), span(f'fetch_{tier.tier}'):
+                return tier.fetch(product_id)
+        except ThrottleTimeout:
+            fetches_total.inc(tier=tier.tier, outcome='throttled')
+            raise
+
+    def _success(self):
+        if self.throttle is not None:
+            self.throttle.success()
+
+    def _escalate(self, tier, reason):
+        fetches_total.inc(tier=tier.tier, outcome=reason)
+        escalations_total.inc(reason=reason)
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """
+    Return the process-wide fetcher configured from settings.
+    """
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                throttle = get_outbound_throttle()
+                solver = get_captcha_solver()
+                cookies = SessionCookies()
+                tiers = []
+                if settings.SCRAPE_HTTP_TIER:
+                    tiers.append(HttpFetcher(
+                        pool_size=settings.HTTP_FETCH_POOL_SIZE,
+                        timeout=settings.HTTP_FETCH_TIMEOUT,
+                        user_agent=settings.HTTP_FETCH_USER_AGENT,
+                        solver=solver if settings.HTTP_SOLVE_CAPTCHA else None,
+                        cookies=cookies,
+                        throttle=throttle,
+                    ))
+                tiers.append(SeleniumFetcher(solver=solver, cookies=cookies, throttle=throttle))
+                _fetcher = TieredFetcher(tiers, throttle=throttle)
+    return _fetcher
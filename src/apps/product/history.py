@@ -0,0 +1,104 @@
+"""
+Price and rating history of products.
+
+record() appends a ProductObservation for every stored product whose values
+changed since its latest observation, so the history grows with the changes
+rather than with the scrapes. series() reads a product's history back
+downsampled into fixed buckets, in one query over the
+(product, observed_at) index.
+"""
+
+from django.db import connection
+
+from apps.product.metrics import Counter
+from apps.product.models import Product, ProductObservation
+
+OBSERVED_FIELDS = ('price', 'rating_count', 'average_score')
+
+observations_total = Counter(
+    'product_observations_total',
+    "Products recorded in the price and rating history, by whether their values changed",
+    ['result'],
+)
+
+
+def _values(instance):
+    # Product fields set from scraped data can still hold the scraped strings
+    return tuple(Product._meta.get_field(field).to_python(getattr(instance, field)) for field in OBSERVED_FIELDS)
+
+
+def record(products):
+    """
+    Append an observation, at its last_updated, for each of the saved
+    products whose values differ from its latest observation or that has
+    none yet. Returns the observations written.
+    """
+    if not products:
+        return []
+    latest = {
+        observation.product_id: _values(observation)
+        for observation in ProductObservation.objects
+        .filter(product__in=[product.pk for product in products])
+        .order_by('product', '-observed_at')
+        .distinct('product')
+    }
+    observations = [
+        ProductObservation(
+            product=product,
+            observed_at=product.last_updated,
+            **dict(zip(OBSERVED_FIELDS, _values(product))),
+        )
+        for product in products
+        if latest.get(product.pk) != _values(product)
+    ]
+    ProductObservation.objects.bulk_create(observations)
+    observations_total.inc(len(observations), result='changed')
+    observations_total.inc(len(products) - len(observations), result='unchanged')
+    return observations
+
+
+SERIES_SQL = """
+SELECT
+    date_bin(%(bucket)s, greatest(observed_at, %(since)s), %(since)s) AS bucket,
+    count(*),
+    min(price), max(price), (array_agg(price ORDER BY observed_at DESC))[1],
+    min(rating_count), max(rating_count), (array_agg(rating_count ORDER BY observed_at DESC))[1],
+    min(average_score), max(average_score), (array_agg(average_score ORDER BY observed_at DESC))[1]
+FROM {table}
+WHERE product_id = %(product)s
+    AND observed_at < %(until)s
+    AND observed_at >= coalesce((
+        -- The observation in effect at `since` opens the first bucket
+        SELECT observed_at FROM {table}
+        WHERE product_id = %(product)s AND observed_at <= %(since)s
+        ORDER BY observed_at DESC LIMIT 1
+    ), %(since)s)
+GROUP BY 1
+ORDER BY 1
+"""
+
+
+def series(product, since, until, bucket):
+    """
+    A product's history between since and until in buckets of `bucket`
+    (a timedelta) starting at since: min, max and last price, rating count
+    and average score and the number of observations of each bucket that
+    has any. A bucket without observations kept the values its predecessor
+    ended with. Rating values are null while the product had no reviews.
+    """
+    sql = SERIES_SQL.format(table=connection.ops.quote_name(ProductObservation._meta.db_table))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'product': product.pk, 'since': since, 'until': until, 'bucket': bucket})
+        rows = cursor.fetchall()
+    return [
+        {
+            'time': start,
+            'observations': count,
+            # As ProductSerializer renders prices
+            'price': {'min': str(price_min), 'max': str(price_max), 'last': str(price_last)},
+            'rating_count': {'min': count_min, 'max': count_max, 'last': count_last},
+            'average_score': {'min': score_min, 'max': score_max, 'last': score_last},
+        }
+        for (start, count, price_min, price_max, price_last, count_min, count_max, count_last,
+             score_min, score_max, score_last) in rows
+    ]
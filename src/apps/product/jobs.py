@@ -0,0 +1,130 @@
+"""
+Redis-backed queue of scrape jobs.
+
+Instead of blocking a request thread for the whole Selenium navigation, the
+view can enqueue a scrape job and answer 202 with the job id; workers started
+with `manage.py run_scrape_workers` run the jobs and clients poll the job
+status endpoint for the result.
+
+Layout in Redis:
+    scrape_jobs:queue            list of job ids waiting for a worker
+    scrape_job:<job_id>          hash with product_id, state, status_code, result
+    scrape_job_for:<product_id>  id of the unfinished job for a product (dedup)
+"""
+
+import json
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = 'scrape_jobs:queue'
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+# Mark a job running only if its hash still exists, so a job that expired
+# while queued isn't recreated without a TTL. Returns its product_id or nil.
+CLAIM_JOB_SCRIPT = """
+local product_id = redis.call('HGET', KEYS[1], 'product_id')
+if not product_id then
+    return false
+end
+redis.call('HSET', KEYS[1], 'state', ARGV[1], 'started_at', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return product_id
+"""
+
+
+def job_key(job_id):
+    return f"scrape_job:{job_id}"
+
+
+def product_job_key(product_id):
+    return f"scrape_job_for:{product_id}"
+
+
+class ScrapeJobQueue:
+
+    def __init__(self, connection=None):
+        self.connection = connection or get_redis_connection('default')
+        self._claim = self.connection.register_script(CLAIM_JOB_SCRIPT)
+
+    def enqueue(self, product_id):
+        """
+        Queue a scrape of product_id unless one is already queued or running.
+        Returns (job_id, created).
+        """
+        while True:
+            job_id = uuid.uuid4().hex
+            if self.connection.set(product_job_key(product_id), job_id, nx=True, ex=settings.SCRAPE_JOB_TIMEOUT):
+                pipeline = self.connection.pipeline()
+                pipeline.hset(job_key(job_id), mapping={
+                    'product_id': product_id,
+                    'state': QUEUED,
+                    'created_at': time.time(),
+                })
+                pipeline.expire(job_key(job_id), settings.SCRAPE_JOB_TIMEOUT)
+                pipeline.lpush(QUEUE_KEY, job_id)
+                pipeline.execute()
+                return job_id, True
+
+            existing = self.connection.get(product_job_key(product_id))
+            if existing is not None:
+                return existing.decode(), False
+            # The existing job finished between SET and GET, try again
+
+    def get(self, job_id):
+        """
+        Return the job as a dict, or None if it is unknown or expired.
+        """
+        job = self.connection.hgetall(job_key(job_id))
+        if not job:
+            return None
+        job = {key.decode(): value.decode() for key, value in job.items()}
+        job['job_id'] = job_id
+        if 'status_code' in job:
+            job['status_code'] = int(job['status_code'])
+        if 'result' in job:
+            job['result'] = json.loads(job['result'])
+        return job
+
+    def pop(self, timeout=1):
+        """
+        Block up to timeout seconds for the next job; returns (job_id, product_id) or None.
+        """
+        item = self.connection.brpop(QUEUE_KEY, timeout=timeout)
+        if item is None:
+            return None
+        job_id = item[1].decode()
+        product_id = self._claim(keys=[job_key(job_id)], args=[RUNNING, time.time(), settings.SCRAPE_JOB_TIMEOUT])
+        if product_id is None:
+            logger.warning(f"Scrape job {job_id} expired before a worker picked it up")
+            return None
+        return job_id, product_id.decode()
+
+    def complete(self, job_id, product_id, data, status_code):
+        self._finish(job_id, product_id, DONE, status_code, data)
+
+    def fail(self, job_id, product_id, message, status_code):
+        self._finish(job_id, product_id, FAILED, status_code, message)
+
+    def _finish(self, job_id, product_id, state, status_code, result):
+        pipeline = self.connection.pipeline()
+        pipeline.hset(job_key(job_id), mapping={
+            'state': state,
+            'status_code': status_code,
+            'result': json.dumps(result),
+            'finished_at': time.time(),
+        })
+        pipeline.expire(job_key(job_id), settings.SCRAPE_JOB_RESULT_TTL)
+        # Later misses may enqueue a fresh scrape of this product
+        pipeline.delete(product_job_key(product_id))
+        pipeline.execute()
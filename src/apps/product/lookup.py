@@ -0,0 +1,334 @@
+"""
+Product lookup: cache, then database, then scraping Amazon.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from rest_framework import status
+
+from apps.product import history, popularity, product_cache
+from apps.product.metrics import Counter
+from apps.product.models import Product
+from apps.product.parsers import is_complete
+from apps.product.timing import span
+from apps.product.api.v1.serializers import ProductSerializer
+
+# Import necessary modules for web scraping
+from apps.product.fetchers import CaptchaFailed, get_fetcher
+from apps.product.throttling import ThrottleTimeout
+from apps.product.webdriver_pool import DriverPoolTimeout
+from apps.product.singleflight import SingleFlight, SingleFlightTimeout
+
+# logging settings store in file
+log_file = 'scraper.log'
+logging.basicConfig(level=logging.INFO, filename=log_file, filemode='a',
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Coalesces concurrent scrapes of the same product_id
+scrape_flight = SingleFlight('scrape')
+
+lookups_total = Counter(
+    'product_lookups_total',
+    "Product lookups by where the answer came from (cache, negative_cache, database, scrape)",
+    ['source'],
+)
+scrape_failures_total = Counter(
+    'product_scrape_failures_total',
+    "Scrapes that did not store a product, by reason (not_found, incomplete, captcha_failed, busy, error)",
+    ['reason'],
+)
+cache_refreshes_total = Counter(
+    'product_cache_refreshes_total',
+    "Background refreshes of stale product cache entries by outcome",
+    ['outcome'],
+)
+
+# Scrapes started by the async lookup, by (event loop, product_id)
+_async_scrapes = {}
+
+_refresh_executor = None
+_refresh_executor_lock = threading.Lock()
+
+
+def get_refresh_executor():
+    """
+    Threads that re-scrape stale products in the background.
+    """
+    global _refresh_executor
+    if _refresh_executor is None:
+        with _refresh_executor_lock:
+            if _refresh_executor is None:
+                _refresh_executor = ThreadPoolExecutor(
+                    max_workers=settings.PRODUCT_CACHE_REFRESH_WORKERS,
+                    thread_name_prefix='product-refresh',
+                )
+    return _refresh_executor
+
+
+class ProductLookupError(Exception):
+    """
+    A product lookup that should be answered with an error response.
+
+    reason is set for failures that are negatively cached, and cached tells
+    whether this one was answered from the negative cache.
+    """
+    def __init__(self, message, status_code, reason=None, cached=False):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.reason = reason
+        self.cached = cached
+
+    @property
+    def headers(self):
+        if self.reason is None:
+            return {}
+        return {'X-Product-Error': self.reason, 'X-Negative-Cache': 'hit' if self.cached else 'miss'}
+
+
+# Responses for scrapes that found nothing usable, by negative cache reason
+NEGATIVE_RESULTS = {
+    product_cache.NOT_FOUND: ("Product not found", status.HTTP_404_NOT_FOUND),
+    product_cache.INCOMPLETE: ("Product data is incomplete", status.HTTP_400_BAD_REQUEST),
+    product_cache.CAPTCHA_FAILED: ("Could not get past Amazon's CAPTCHA, try again later", status.HTTP_503_SERVICE_UNAVAILABLE),
+}
+
+
+def negative_result(reason, cached=False):
+    message, status_code = NEGATIVE_RESULTS[reason]
+    return ProductLookupError(message, status_code, reason=reason, cached=cached)
+
+
+class ProductLookup:
+    """
+    Resolve products from cache, then database, then by scraping Amazon.
+
+    Used by the API views and by the scrape job workers.
+    """
+
+    def lookup_product(self, product_id):
+        """
+        Returns (product_data, status_code) or raises ProductLookupError.
+        """
+        popularity.hit(product_id)
+
+        # Check if product exists in cache
+        product_data = self.check_cache(product_id)
+        if product_data:
+            lookups_total.inc(source='cache')
+            return product_data, status.HTTP_200_OK
+
+        # Don't scrape a product that recently turned out to be missing
+        self.check_negative_cache(product_id)
+
+        # Check if product exists in the database
+        product_data = self.check_database(product_id)
+        if product_data:
+            lookups_total.inc(source='database')
+            return product_data, status.HTTP_200_OK
+
+        lookups_total.inc(source='scrape')
+        return self.scrape_product(product_id)
+
+    def scrape_product(self, product_id):
+        """
+        Scrape product details from Amazon, once per product_id across concurrent requests.
+        """
+        try:
+            with span('scrape'):
+                return scrape_flight.do(product_id, lambda: self.fetch_product(product_id))
+        except SingleFlightTimeout:
+            raise ProductLookupError("Product is being fetched, try again later", status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def fetch_product(self, product_id):
+        """
+        Scrape a product that was not found in cache or database, save and cache it.
+        Returns (product_data, status_code) or raises ProductLookupError.
+        """
+        # A concurrent request in another worker may have scraped it while we waited for the lock,
+        # and found it missing or stored it
+        self.check_negative_cache(product_id)
+        product_data = self.check_database(product_id)
+        if product_data:
+            return product_data, status.HTTP_200_OK
+
+        try:
+            return self.scrape_and_store(product_id), status.HTTP_201_CREATED
+        except ProductLookupError as e:
+            if e.reason is not None:
+                product_cache.set_negative(product_id, e.reason)
+            raise
+
+    def scrape_and_store(self, product_id):
+        """
+        Scrape a product, save it to the database and cache it.
+        Returns the product data or raises ProductLookupError.
+        """
+        try:
+            product_data = self.scrape_amazon_product(product_id)
+        except (DriverPoolTimeout, ThrottleTimeout):
+            scrape_failures_total.inc(reason='busy')
+            raise ProductLookupError("Scraper is busy, try again later", status.HTTP_503_SERVICE_UNAVAILABLE)
+        except CaptchaFailed:
+            scrape_failures_total.inc(reason=product_cache.CAPTCHA_FAILED)
+            raise negative_result(product_cache.CAPTCHA_FAILED)
+        except Exception:
+            scrape_failures_total.inc(reason='error')
+            raise
+
+        if not product_data:
+            scrape_failures_total.inc(reason=product_cache.NOT_FOUND)
+            raise negative_result(product_cache.NOT_FOUND)
+
+        # Without a name or price it can't be stored; missing ratings are stored as null
+        if not is_complete(product_data):
+            scrape_failures_total.inc(reason=product_cache.INCOMPLETE)
+            raise negative_result(product_cache.INCOMPLETE)
+
+        # Save the product to the database, updating the row if another worker got there first
+        with span('db'):
+            product, _ = Product.objects.update_or_create(
+                product_id=product_id,
+                defaults={key: value for key, value in product_data.items() if key != 'product_id'}
+            )
+            history.record([product])
+        serializer = ProductSerializer(product)
+        with span('cache'):
+            product_cache.set(product_id, serializer.data, product.last_updated)
+        return serializer.data
+
+    def refresh_in_background(self, product_id):
+        """
+        Re-scrape a product whose cache entry went stale, at most once at a time across workers.
+        """
+        if product_cache.claim_refresh(product_id):
+            get_refresh_executor().submit(self.refresh_product, product_id)
+
+    def refresh_product(self, product_id):
+        try:
+            self.scrape_and_store(product_id)
+            cache_refreshes_total.inc(outcome='ok')
+        except ProductLookupError as e:
+            logger.warning(f"Refreshing {product_id} failed: {e.message}")
+            cache_refreshes_total.inc(outcome='failed')
+        except Exception:
+            logger.exception(f"Refreshing {product_id} failed")
+            cache_refreshes_total.inc(outcome='failed')
+        finally:
+            # Each refresh thread opens its own database connection
+            connection.close()
+
+    def check_cache(self, product_id):
+        """
+        Check if the product exists in the cache. A stale entry is returned
+        as is and refreshed in the background.
+        """
+        with span('cache'):
+            product_data, result = product_cache.get(product_id)
+        if result == product_cache.STALE:
+            self.refresh_in_background(product_id)
+        return product_data
+
+    def check_negative_cache(self, product_id):
+        """
+        Raise the cached error if product_id was recently found not worth scraping.
+        """
+        with span('cache'):
+            reason = product_cache.get_negative(product_id)
+        if reason is not None:
+            lookups_total.inc(source='negative_cache')
+            raise negative_result(reason, cached=True)
+
+    def check_database(self, product_id):
+        """
+        Check if the product exists in the database.
+        """
+        try:
+            with span('db'):
+                product = Product.objects.get(product_id=product_id)
+        except Product.DoesNotExist:
+            return None
+        serializer = ProductSerializer(product)
+        with span('cache'):
+            product_cache.set(product_id, serializer.data, product.last_updated)
+        return serializer.data
+
+    async def alookup_product(self, product_id):
+        """
+        Async lookup_product() for ASGI views: cache and database are awaited
+        and only a scrape occupies a thread.
+        """
+        popularity.hit(product_id)
+
+        product_data = await self.acheck_cache(product_id)
+        if product_data:
+            lookups_total.inc(source='cache')
+            return product_data, status.HTTP_200_OK
+
+        with span('cache'):
+            reason = await product_cache.aget_negative(product_id)
+        if reason is not None:
+            lookups_total.inc(source='negative_cache')
+            raise negative_result(reason, cached=True)
+
+        product_data = await self.acheck_database(product_id)
+        if product_data:
+            lookups_total.inc(source='database')
+            return product_data, status.HTTP_200_OK
+
+        lookups_total.inc(source='scrape')
+        return await self.ascrape_product(product_id)
+
+    async def ascrape_product(self, product_id):
+        """
+        Run scrape_product() in a worker thread. Concurrent lookups of the same
+        product_id in this event loop await the same scrape.
+        """
+        key = (asyncio.get_running_loop(), product_id)
+        task = _async_scrapes.get(key)
+        if task is None:
+            task = asyncio.ensure_future(sync_to_async(self.scrape_product_in_thread, thread_sensitive=False)(product_id))
+            _async_scrapes[key] = task
+            task.add_done_callback(lambda _: _async_scrapes.pop(key, None))
+        # One client disconnecting must not cancel the scrape the others are waiting for
+        return await asyncio.shield(task)
+
+    def scrape_product_in_thread(self, product_id):
+        try:
+            return self.scrape_product(product_id)
+        finally:
+            # Threads of the default executor open their own database connection
+            connection.close()
+
+    async def acheck_cache(self, product_id):
+        with span('cache'):
+            product_data, result = await product_cache.aget(product_id)
+        if result == product_cache.STALE and await product_cache.aclaim_refresh(product_id):
+            get_refresh_executor().submit(self.refresh_product, product_id)
+        return product_data
+
+    async def acheck_database(self, product_id):
+        try:
+            with span('db'):
+                product = await Product.objects.aget(product_id=product_id)
+        except Product.DoesNotExist:
+            return None
+        serializer = ProductSerializer(product)
+        with span('cache'):
+            await product_cache.aset(product_id, serializer.data, product.last_updated)
+        return serializer.data
+
+    def scrape_amazon_product(self, product_id):
+        """
+        Scrape product details from Amazon, over plain HTTP first and with Selenium as fallback.
+        """
+        product_data = get_fetcher().fetch_product(product_id)
+        logger.info(product_data)
+        return product_data
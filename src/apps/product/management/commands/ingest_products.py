@@ -0,0 +1,215 @@
+import csv
+import logging
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.product import history, product_cache
+from apps.product.api.v1.filters import validate_product_id
+from apps.product.api.v1.serializers import ProductSerializer
+from apps.product.fetchers import CaptchaFailed, get_fetcher
+from apps.product.models import Product
+from apps.product.parsers import PRODUCT_FIELDS, is_complete
+from apps.product.throttling import ThrottleTimeout
+from apps.product.webdriver_pool import DriverPoolTimeout
+
+logger = logging.getLogger(__name__)
+
+# Failures that a rerun would hit again; these ASINs are checkpointed like stored ones
+PERMANENT_FAILURES = (product_cache.NOT_FOUND, product_cache.INCOMPLETE)
+
+
+class Command(BaseCommand):
+    help = "Scrape a list of ASINs and upsert them into the database and the cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="File with an ASIN per line (the first column of a CSV), or - for stdin")
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.SCRAPE_WORKERS,
+            help="Number of products fetched at the same time",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help="Products written to the database and cache per round-trip",
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help="File recording finished ASINs, which a rerun skips (default: <source>.done)",
+        )
+        parser.add_argument(
+            '--progress-every', type=float, default=10,
+            help="Seconds between progress lines",
+        )
+
+    def handle(self, *args, **options):
+        source = options['source']
+        checkpoint_path = options['checkpoint'] or (None if source == '-' else f'{source}.done')
+        self.batch_size = options['batch_size']
+        self.progress_every = options['progress_every']
+
+        done = self.read_checkpoint(checkpoint_path)
+        if done:
+            self.stdout.write(f"Resuming, skipping {len(done)} ASINs listed in {checkpoint_path}")
+
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stopping.set())
+
+        self.fetcher = get_fetcher()
+        self.stats = Counter()
+        self.batch = {}
+        self.finished = []
+        self.started = self.last_progress = time.monotonic()
+
+        checkpoint = open(checkpoint_path, 'a') if checkpoint_path else None
+        try:
+            with self.open_source(source) as lines:
+                self.ingest(self.read_asins(lines, done), options['concurrency'], checkpoint)
+        finally:
+            if checkpoint:
+                checkpoint.close()
+
+        self.report_progress()
+        if self.stopping.is_set():
+            self.stdout.write("Interrupted, rerun the same command to resume")
+
+    def ingest(self, product_ids, concurrency, checkpoint):
+        """
+        Fetch product_ids with at most `concurrency` in flight and store them in batches.
+        """
+        pending = {}
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ingest') as executor:
+            for product_id in product_ids:
+                if self.stopping.is_set():
+                    break
+                # Keep the input streaming instead of queueing the whole file
+                if len(pending) >= concurrency * 2:
+                    self.collect(pending, checkpoint)
+                pending[executor.submit(self.scrape, product_id)] = product_id
+            while pending:
+                self.collect(pending, checkpoint)
+        self.flush(checkpoint)
+
+    def collect(self, pending, checkpoint):
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            product_id = pending.pop(future)
+            product_data, reason = future.result()
+            if reason is None:
+                self.batch[product_id] = product_data
+            else:
+                self.fail(product_id, reason)
+
+        if len(self.batch) >= self.batch_size:
+            self.flush(checkpoint)
+        if time.monotonic() - self.last_progress >= self.progress_every:
+            self.report_progress()
+
+    def scrape(self, product_id):
+        """
+        Returns (product_data, None), or (None, reason) if the product can't be stored.
+        """
+        try:
+            product_data = self.fetcher.fetch_product(product_id)
+        except CaptchaFailed:
+            return None, product_cache.CAPTCHA_FAILED
+        except (DriverPoolTimeout, ThrottleTimeout):
+            return None, 'busy'
+        except Exception:
+            logger.exception(f"Fetching {product_id} failed")
+            return None, 'error'
+        if not product_data:
+            return None, product_cache.NOT_FOUND
+        if not is_complete(product_data):
+            return None, product_cache.INCOMPLETE
+        return product_data, None
+
+    def fail(self, product_id, reason):
+        self.stats[reason] += 1
+        self.stderr.write(f"{product_id}: {reason}")
+        if reason in PERMANENT_FAILURES:
+            product_cache.set_negative(product_id, reason)
+            self.finished.append(product_id)
+
+    def flush(self, checkpoint):
+        """
+        Upsert the batch in one statement, record its history, cache it in one pipeline, then checkpoint.
+        """
+        if self.batch:
+            Product.objects.bulk_create(
+                [
+                    Product(product_id=product_id, **{field: product_data[field] for field in PRODUCT_FIELDS})
+                    for product_id, product_data in self.batch.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['product_id'],
+                update_fields=[*PRODUCT_FIELDS, 'last_updated'],
+            )
+            products = list(Product.objects.filter(product_id__in=list(self.batch)))
+            history.record(products)
+            product_cache.set_many({
+                product.product_id: (ProductSerializer(product).data, product.last_updated) for product in products
+            }, invalidate=True)
+            product_cache.delete_negative_many(list(self.batch))
+            self.stats['stored'] += len(self.batch)
+            self.finished.extend(self.batch)
+            self.batch = {}
+
+        # Only what is in the database (or known to be missing) counts as done
+        if checkpoint and self.finished:
+            checkpoint.write(''.join(f'{product_id}\n' for product_id in self.finished))
+            checkpoint.flush()
+        self.finished = []
+
+    def report_progress(self):
+        self.last_progress = time.monotonic()
+        processed = sum(self.stats.values())
+        failed = {reason: count for reason, count in self.stats.items() if reason != 'stored'}
+        rate = processed / max(self.last_progress - self.started, 1e-9)
+        self.stdout.write(
+            f"{processed} processed, {self.stats['stored']} stored, {sum(failed.values())} failed {failed}, {rate:.1f}/s"
+        )
+
+    def open_source(self, source):
+        if source == '-':
+            return open(sys.stdin.fileno(), closefd=False)
+        try:
+            return open(source, newline='')
+        except OSError as e:
+            raise CommandError(f"Can't read {source}: {e}")
+
+    def read_asins(self, lines, done):
+        """
+        Yield each valid, not yet finished ASIN of the input once.
+        """
+        seen = set(done)
+        for row in csv.reader(lines):
+            if not row:
+                continue
+            product_id = row[0].strip()
+            try:
+                validate_product_id(product_id)
+            except ValidationError:
+                # Header rows and junk
+                if product_id:
+                    self.stats['invalid'] += 1
+                continue
+            if product_id not in seen:
+                seen.add(product_id)
+                yield product_id
+
+    def read_checkpoint(self, path):
+        if path is None:
+            return set()
+        try:
+            with open(path) as checkpoint:
+                return {line.strip() for line in checkpoint if line.strip()}
+        except FileNotFoundError:
+            return set()
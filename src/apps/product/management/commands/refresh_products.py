@@ -0,0 +1,193 @@
+import logging
+import signal
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.product import history, popularity, product_cache
+from apps.product.api.v1.serializers import ProductSerializer
+from apps.product.fetchers import get_fetcher
+from apps.product.models import Product
+from apps.product.parsers import PRODUCT_FIELDS, is_complete
+
+logger = logging.getLogger(__name__)
+
+
+def budget_key(minute):
+    return f"product_refresh_budget:{minute}"
+
+
+def backoff_key(product_id):
+    return f"product_refresh_backoff:{product_id}"
+
+
+def back_off(product_ids):
+    """
+    Leave product_ids out of the refresh for PRODUCT_REFRESH_BACKOFF seconds
+    after a failed scrape, so products that keep failing don't stay the
+    stalest and take the budget every round.
+    """
+    if product_ids:
+        cache.set_many({backoff_key(product_id): 1 for product_id in product_ids}, timeout=settings.PRODUCT_REFRESH_BACKOFF)
+
+
+def backing_off(product_ids):
+    """
+    Return the product_ids whose last refresh failed recently.
+    """
+    keys = {backoff_key(product_id): product_id for product_id in product_ids}
+    return {keys[key] for key in cache.get_many(list(keys))}
+
+
+def claim_budget(count, budget):
+    """
+    Take up to `count` scrapes from this minute's budget, shared by every
+    scheduler process. Returns how many were granted.
+    """
+    key = budget_key(int(time.time() // 60))
+    cache.add(key, 0, timeout=120)
+    used = cache.incr(key, count)
+    return max(0, min(count, budget - (used - count)))
+
+
+class Command(BaseCommand):
+    help = "Periodically re-scrape products, the stalest and most requested first"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget', type=int, default=settings.PRODUCT_REFRESH_BUDGET,
+            help="Scrapes per minute, across all running schedulers",
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=settings.PRODUCT_REFRESH_MIN_AGE,
+            help="Only refresh products scraped longer ago than this many seconds",
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.SCRAPE_WORKERS,
+            help="Number of products scraped at the same time",
+        )
+        parser.add_argument('--once', action='store_true', help="Run a single round and exit")
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stopping.set())
+
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            try:
+                self.refresh_round(options['budget'], options['min_age'], options['concurrency'])
+            except Exception:
+                logger.exception("Product refresh round failed")
+            if options['once']:
+                break
+            # One round per minute, matching the budget
+            self.stopping.wait(max(0, 60 - (time.monotonic() - started)))
+
+    def refresh_round(self, budget, min_age, concurrency):
+        candidates = self.pick(budget, min_age)
+        # Skip products a stale cache hit is already refreshing, and only charge the budget for the rest
+        claimed = []
+        for product in candidates:
+            if len(claimed) == budget:
+                break
+            if product_cache.claim_refresh(product.product_id):
+                claimed.append(product)
+        granted = claim_budget(len(claimed), budget) if claimed else 0
+        for product in claimed[granted:]:
+            product_cache.release_refresh(product.product_id)
+        products = claimed[:granted]
+        if not products:
+            self.stdout.write(f"Nothing to refresh ({len(candidates)} candidates, {granted} allowed by the budget)")
+            return
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='product-refresh') as executor:
+            scraped = list(executor.map(self.scrape, [product.product_id for product in products]))
+        stats = self.store(products, scraped)
+        self.stdout.write(
+            f"Refreshed {len(products)} products in {time.monotonic() - started:.1f}s: {dict(stats)}"
+        )
+
+    def pick(self, budget, min_age):
+        """
+        Return the products older than min_age, by age times popularity, leaving
+        out those whose refresh failed recently.
+        """
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=min_age)
+        stale = Product.objects.filter(last_updated__lt=cutoff)
+
+        try:
+            hits = dict(popularity.tracker.top(budget * 10))
+        except NotImplementedError:
+            hits = {}
+        # The oldest products, plus the popular ones that are stale
+        candidates = {product.product_id: product for product in stale.order_by('last_updated')[:budget * 4]}
+        if hits:
+            candidates.update((product.product_id, product) for product in stale.filter(product_id__in=list(hits)))
+
+        for product_id in backing_off(candidates):
+            del candidates[product_id]
+
+        def priority(product):
+            age = (now - product.last_updated).total_seconds() / min_age
+            return age * (1 + hits.get(product.product_id, 0))
+
+        return sorted(candidates.values(), key=priority, reverse=True)
+
+    def scrape(self, product_id):
+        try:
+            return get_fetcher().fetch_product(product_id)
+        except Exception as e:
+            logger.warning(f"Refreshing {product_id} failed: {e}")
+            return None
+
+    def store(self, products, scraped):
+        """
+        Write only the products whose fields changed; unchanged ones just get a new last_updated.
+        """
+        now = timezone.now()
+        stats = Counter()
+        changed, unchanged, failed = [], [], []
+        for product, product_data in zip(products, scraped):
+            if not is_complete(product_data):
+                failed.append(product.product_id)
+                continue
+            try:
+                values = {field: Product._meta.get_field(field).to_python(product_data[field]) for field in PRODUCT_FIELDS}
+            except ValidationError:
+                logger.warning(f"Refreshing {product.product_id} returned invalid data: {product_data}")
+                failed.append(product.product_id)
+                continue
+            if any(getattr(product, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(product, field, value)
+                changed.append(product)
+            else:
+                unchanged.append(product)
+            product.last_updated = now
+
+        if changed:
+            Product.objects.bulk_update(changed, [*PRODUCT_FIELDS, 'last_updated'])
+        if unchanged:
+            Product.objects.filter(pk__in=[product.pk for product in unchanged]).update(last_updated=now)
+        back_off(failed)
+        stats.update(changed=len(changed), unchanged=len(unchanged), failed=len(failed))
+
+        refreshed = changed + unchanged
+        history.record(refreshed)
+        if refreshed:
+            product_cache.set_many(
+                {product.product_id: (ProductSerializer(product).data, now) for product in refreshed},
+                invalidate=True,
+            )
+        return stats
@@ -0,0 +1,68 @@
+import logging
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.product.jobs import ScrapeJobQueue
+from apps.product.lookup import ProductLookup, ProductLookupError
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Run a pool of workers that process queued product scrape jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.SCRAPE_WORKERS,
+            help="Number of jobs processed at the same time",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stopping.set())
+
+        workers = [
+            threading.Thread(target=self.work, name=f'scrape-worker-{n}', daemon=True)
+            for n in range(options['concurrency'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} scrape workers")
+
+        while not self.stopping.wait(1):
+            pass
+        self.stdout.write("Stopping, waiting for running jobs to finish")
+        for worker in workers:
+            worker.join()
+
+    def work(self):
+        queue = ScrapeJobQueue()
+        lookup = ProductLookup()
+        while not self.stopping.is_set():
+            try:
+                job = queue.pop(timeout=1)
+            except Exception:
+                logger.exception("Failed to read the scrape job queue")
+                self.stopping.wait(5)
+                continue
+            if job is None:
+                continue
+
+            job_id, product_id = job
+            logger.info(f"Running scrape job {job_id} for {product_id}")
+            try:
+                product_data, status_code = lookup.scrape_product(product_id)
+                queue.complete(job_id, product_id, product_data, status_code)
+            except ProductLookupError as e:
+                queue.fail(job_id, product_id, e.message, e.status_code)
+            except Exception:
+                logger.exception(f"Scrape job {job_id} for {product_id} failed")
+                queue.fail(job_id, product_id, "Failed to fetch product", 502)
+            finally:
+                # Don't hold a database connection open between jobs
+                connection.close()
@@ -0,0 +1,146 @@
+"""
+Minimal in-process metrics, rendered in the Prometheus text format on /metrics.
+
+Values live in the memory of the worker process that recorded them, so each
+worker is scraped (or aggregated) separately.
+"""
+
+import threading
+
+from django.http import HttpResponse
+
+REGISTRY = []
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labelnames)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, e.g. number of fetches per tier.
+    """
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that can go up and down, e.g. current concurrency limit.
+    """
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """
+    Observations counted in cumulative buckets, e.g. time spent in a stage.
+    """
+    type = 'histogram'
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][i] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def value(self, **labels):
+        """
+        Number of observations with these labels.
+        """
+        state = self._values.get(self._key(labels))
+        return state['count'] if state else 0
+
+    def sum(self, **labels):
+        """
+        Sum of the observations with these labels.
+        """
+        state = self._values.get(self._key(labels))
+        return state['sum'] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, dict(state, buckets=list(state['buckets']))) for key, state in self._values.items()]
+        for key, state in items:
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, state['buckets']):
+                yield f"{self.name}_bucket", {**labels, 'le': str(bound)}, count
+            yield f"{self.name}_bucket", {**labels, 'le': '+Inf'}, state['count']
+            yield f"{self.name}_sum", labels, state['sum']
+            yield f"{self.name}_count", labels, state['count']
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + pairs + '}'
+
+
+def render():
+    """
+    Render every registered metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Expose the metrics of this worker process for Prometheus to scrape.
+    """
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
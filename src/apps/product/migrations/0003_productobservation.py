@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 09:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_alter_product_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('observed_at', models.DateTimeField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('rating_count', models.IntegerField(blank=True, null=True)),
+                ('average_score', models.FloatField(blank=True, null=True)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='observations', to='product.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productobservation',
+            index=models.Index(fields=['product', 'observed_at'], include=('price', 'rating_count', 'average_score'), name='observation_product_time'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 09:46
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run in a transaction; it doesn't block writes to the product table
+    atomic = False
+
+    dependencies = [
+        ('product', '0003_productobservation'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='product_name_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='product_price_id'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['average_score', 'id'], name='product_score_id'),
+        ),
+    ]
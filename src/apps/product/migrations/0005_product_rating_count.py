@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_product_list_indexes'),
+    ]
+
+    operations = [
+        # Nullable, without a default or a CHECK constraint: only a catalog change, no table scan or rewrite
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        # The rating fields are null for a product without reviews; dropping NOT NULL is
+        # only a catalog change too
+        migrations.AlterField(
+            model_name='product',
+            name='rating',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='average_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+BATCH_SIZE = 10000
+
+# The digits of the count `rating` starts with, as parsers._count reads them; longer than 9 digits is not a count
+RATING_COUNT_SQL = """
+UPDATE {table}
+SET rating_count = substring(regexp_replace(split_part(rating, ' ', 1), '\\D', '', 'g') FROM '^\\d{{1,9}}$')::integer
+WHERE id >= %s AND id < %s AND rating_count IS NULL
+"""
+
+
+def backfill_rating_count(apps, schema_editor):
+    """
+    Parse rating_count out of rating for the rows stored before it existed,
+    BATCH_SIZE ids per statement. The migration isn't atomic, so each batch
+    commits on its own and only holds its rows' locks for as long as it
+    runs; rows the application writes meanwhile already have a count and
+    are skipped.
+    """
+    Product = apps.get_model('product', 'Product')
+    ids = Product.objects.aggregate(low=Min('id'), high=Max('id'))
+    if ids['low'] is None:
+        return
+    sql = RATING_COUNT_SQL.format(table=schema_editor.quote_name(Product._meta.db_table))
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(ids['low'], ids['high'] + 1, BATCH_SIZE):
+            cursor.execute(sql, [start, start + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('product', '0005_product_rating_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rating_count, migrations.RunPython.noop, elidable=True),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['rating_count', 'id'], name='product_rating_count_id'),
+        ),
+    ]
@@ -1,4 +1,6 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 
 class TimeStampedModel(models.Model):
     """
@@ -22,8 +24,51 @@ class Product(TimeStampedModel):
     product_id = models.CharField(max_length=100, unique=True)
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    rating = models.CharField(max_length=100)  # Change FloatField to CharField
-    average_score = models.FloatField()
+    # The rating fields are null for a product without reviews
+    rating = models.CharField(max_length=100, null=True, blank=True)  # Change FloatField to CharField
+    # The number of ratings `rating` shows, for sorting and filtering; null until backfilled (migration 0006)
+    rating_count = models.IntegerField(null=True, blank=True)
+    average_score = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Name searches are case-insensitive (`name__icontains`, UPPER(name) LIKE ...), so
+            # the trigram index is on UPPER(name)
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='product_name_trgm'),
+            # Keyset pagination orders by the field, then id
+            models.Index(fields=['price', 'id'], name='product_price_id'),
+            models.Index(fields=['average_score', 'id'], name='product_score_id'),
+            models.Index(fields=['rating_count', 'id'], name='product_rating_count_id'),
+        ]
 
     def __str__(self):
         return f"{self.product_id} - {self.name}"
+
+
+class ProductObservation(models.Model):
+    """
+    A product's scraped values at one point in time, kept as its price and rating history.
+
+    Append-only: a row is written when a scrape finds values that differ from
+    the product's latest observation (see apps/product/history.py), so a
+    product's values are those of its latest observation until the next one.
+    Range queries go through the (product, observed_at) index, which also
+    covers the observed values so they are answered from the index alone.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='observations', db_index=False)
+    observed_at = models.DateTimeField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    rating_count = models.IntegerField(null=True, blank=True)
+    average_score = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['product', 'observed_at'],
+                include=['price', 'rating_count', 'average_score'],
+                name='observation_product_time',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} at {self.observed_at}"
@@ -0,0 +1,246 @@
+"""
+Extract product fields from an Amazon product page.
+
+We only read four elements by id, so building a full BeautifulSoup tree of a
+multi-megabyte page is wasted work. Extractors are pluggable and all return
+the same dict as `parse_soup`; PRODUCT_EXTRACTOR selects the one in use:
+
+    soup     BeautifulSoup with html.parser, the reference implementation
+    lxml     lxml's C parser and XPath lookups by id
+    prescan  finds the id anchors with a string scan and parses only those elements
+"""
+
+import logging
+import re
+
+import lxml.html
+from bs4 import BeautifulSoup  # Import BeautifulSoup for parsing HTML
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_FIELDS = ('name', 'price', 'rating', 'rating_count', 'average_score')
+# A listing nobody has reviewed yet shows no rating or score, the others are null for it
+REQUIRED_FIELDS = ('name', 'price')
+
+AVERAGE_SCORE_CLASS = 'reviewCountTextLinkedHistogram noUnderline'
+
+
+def parse_html(page_source, product_id):
+    """
+    Parse a product page with the configured extractor and return its fields.
+    """
+    return get_extractor().extract(page_source, product_id)
+
+
+def parse_soup(soup, product_id):
+    # Get the product title
+    title_tag = soup.find('span', id='productTitle')
+    name = title_tag.get_text(strip=True) if title_tag else None
+
+    # Get the product price
+    price_tag = soup.find('input', id='twister-plus-price-data-price')
+    price = price_tag['value'] if price_tag and 'value' in price_tag.attrs else None
+
+    # Get the product rating
+    rating_tag = soup.find('span', id='acrCustomerReviewText', class_='a-size-base')
+    rating = rating_tag.get_text(strip=True) if rating_tag else None
+
+    # Get the product average score
+    average_score_tag = soup.find('span', id='acrPopover', class_=AVERAGE_SCORE_CLASS)
+    average_score = average_score_tag['title'] if average_score_tag and 'title' in average_score_tag.attrs else None
+
+    return product_fields(product_id, name, price, rating, average_score)
+
+
+def product_fields(product_id, name, price, rating_text, score_title):
+    """
+    Build the product dict from the raw values found on the page.
+
+    rating_text is e.g. "1,234 ratings" and score_title "4.6 out of 5 stars";
+    None means the element was not found. rating keeps the count as shown
+    ("1,234"), rating_count is its number.
+    """
+    if name is None:
+        logger.error("No title_tag. Failed to fetch product page after CAPTCHA.")
+    if price is None:
+        logger.error("No price_tag. Failed to fetch product page after CAPTCHA.")
+    if rating_text is None or score_title is None:
+        logger.info(f"No ratings on the page of {product_id}, storing it without them.")
+
+    return {
+        "product_id": product_id,
+        "name": name,
+        "price": price,
+        "rating": _first_word(rating_text),
+        "rating_count": _count(rating_text),
+        "average_score": _first_word(score_title)
+    }
+
+
+def _first_word(text):
+    words = text.split() if text else None
+    return words[0] if words else None
+
+
+def _count(text):
+    # Thousands separators are ',' or '.' depending on the marketplace; more
+    # digits than an integer column holds is not a rating count
+    digits = re.sub(r'\D', '', _first_word(text) or '')
+    return int(digits) if 0 < len(digits) <= 9 else None
+
+
+def is_complete(product_data):
+    """
+    True if the page had every field a product needs, REQUIRED_FIELDS.
+    """
+    return bool(product_data) and all(product_data.get(field) is not None for field in REQUIRED_FIELDS)
+
+
+class ProductExtractor:
+    """
+    Base class for product field extractors.
+    """
+    name = None
+
+    def extract(self, page_source, product_id):
+        raise NotImplementedError
+
+
+class SoupExtractor(ProductExtractor):
+    name = 'soup'
+
+    def extract(self, page_source, product_id):
+        soup = BeautifulSoup(page_source, 'html.parser')
+        return parse_soup(soup, product_id)
+
+
+# XPath predicates mirroring the tag/id/class filters used by parse_soup
+TITLE_XPATH = '//span[@id="productTitle"]'
+PRICE_XPATH = '//input[@id="twister-plus-price-data-price"]'
+RATING_XPATH = '//span[@id="acrCustomerReviewText"][contains(concat(" ", normalize-space(@class), " "), " a-size-base ")]'
+AVERAGE_SCORE_XPATH = f'//span[@id="acrPopover"][normalize-space(@class)="{AVERAGE_SCORE_CLASS}"]'
+
+
+def _text(element):
+    # Same as BeautifulSoup's get_text(strip=True)
+    return ''.join(text.strip() for text in element.itertext())
+
+
+def _find(root, xpath):
+    found = root.xpath(xpath)
+    return found[0] if found else None
+
+
+class LxmlExtractor(ProductExtractor):
+    name = 'lxml'
+
+    def extract(self, page_source, product_id):
+        root = _parse_document(page_source)
+        if root is None:
+            return product_fields(product_id, None, None, None, None)
+
+        title_tag = _find(root, TITLE_XPATH)
+        price_tag = _find(root, PRICE_XPATH)
+        rating_tag = _find(root, RATING_XPATH)
+        average_score_tag = _find(root, AVERAGE_SCORE_XPATH)
+
+        return product_fields(
+            product_id,
+            _text(title_tag) if title_tag is not None else None,
+            price_tag.get('value') if price_tag is not None else None,
+            _text(rating_tag) if rating_tag is not None else None,
+            average_score_tag.get('title') if average_score_tag is not None else None,
+        )
+
+
+def _parse_document(page_source):
+    try:
+        return lxml.html.document_fromstring(page_source)
+    except ValueError:
+        # lxml refuses str input carrying an XML encoding declaration
+        return lxml.html.document_fromstring(page_source.encode('utf-8'))
+    except lxml.etree.ParserError:  # empty document
+        return None
+
+
+class PrescanExtractor(ProductExtractor):
+    """
+    Locate each element by its id attribute with a regex scan, then parse
+    just that element with lxml. Nothing else of the page is tree-built.
+    """
+    name = 'prescan'
+
+    def extract(self, page_source, product_id):
+        title_tag = self._find(page_source, 'span', 'productTitle', TITLE_XPATH, with_content=True)
+        price_tag = self._find(page_source, 'input', 'twister-plus-price-data-price', PRICE_XPATH)
+        rating_tag = self._find(page_source, 'span', 'acrCustomerReviewText', RATING_XPATH, with_content=True)
+        average_score_tag = self._find(page_source, 'span', 'acrPopover', AVERAGE_SCORE_XPATH)
+
+        return product_fields(
+            product_id,
+            _text(title_tag) if title_tag is not None else None,
+            price_tag.get('value') if price_tag is not None else None,
+            _text(rating_tag) if rating_tag is not None else None,
+            average_score_tag.get('title') if average_score_tag is not None else None,
+        )
+
+    def _find(self, page_source, tag, element_id, xpath, with_content=False):
+        """
+        Return the first `tag` element with `element_id` that also matches `xpath`.
+
+        With with_content=False only the start tag is parsed, enough to read attributes.
+        """
+        id_pattern = re.compile(r'\sid\s*=\s*["\']?' + re.escape(element_id) + r'["\'\s/>]')
+        for match in id_pattern.finditer(page_source):
+            start = page_source.rfind('<', 0, match.start())
+            end = page_source.find('>', match.end() - 1)
+            if start == -1 or end == -1 or not re.match(rf'<{tag}\s', page_source[start:start + len(tag) + 2]):
+                continue
+            if with_content:
+                end = self._element_end(page_source, tag, end + 1)
+                if end == -1:
+                    continue
+                fragment = page_source[start:end]
+            else:
+                fragment = page_source[start:end + 1]
+                if tag != 'input':
+                    fragment += f'</{tag}>'
+            try:
+                element = lxml.html.fragment_fromstring(fragment, create_parent='div')
+            except lxml.etree.ParserError:
+                continue
+            found = element.xpath('.' + xpath[1:])
+            if found:
+                return found[0]
+        return None
+
+    def _element_end(self, page_source, tag, position):
+        """
+        Index just past the closing tag matching an open `tag` whose content starts at `position`.
+        """
+        open_pattern = re.compile(rf'<{tag}[\s>]|</{tag}\s*>', re.IGNORECASE)
+        depth = 1
+        for match in open_pattern.finditer(page_source, position):
+            depth += -1 if match.group().startswith('</') else 1
+            if depth == 0:
+                return match.end()
+        return -1
+
+
+EXTRACTORS = {extractor.name: extractor for extractor in (SoupExtractor, LxmlExtractor, PrescanExtractor)}
+
+_extractors = {}
+
+
+def get_extractor(name=None):
+    """
+    Return the extractor named `name`, or the one configured by PRODUCT_EXTRACTOR.
+    """
+    name = name or settings.PRODUCT_EXTRACTOR
+    if name not in _extractors:
+        try:
+            _extractors[name] = EXTRACTORS[name]()
+        except KeyError:
+            raise ValueError(f"Unknown product extractor {name!r}, expected one of {sorted(EXTRACTORS)}")
+    return _extractors[name]
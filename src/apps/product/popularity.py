@@ -0,0 +1,87 @@
+"""
+How often each product is requested, to refresh the popular ones first.
+
+Hits are counted in process and flushed to Redis every
+PRODUCT_POPULARITY_FLUSH_INTERVAL seconds in one pipeline of ZINCRBYs, so a
+lookup never waits on the write. Counts go to hourly sorted sets
+(product_popularity:<hour>) that expire after PRODUCT_POPULARITY_WINDOW
+hours; popularity is the sum over the window.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'product_popularity'
+
+
+def bucket_key(hour):
+    return f"{KEY_PREFIX}:{hour}"
+
+
+class PopularityTracker:
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def hit(self, *product_ids):
+        with self._lock:
+            self._counts.update(product_ids)
+            due = time.monotonic() - self._last_flush >= settings.PRODUCT_POPULARITY_FLUSH_INTERVAL
+            if due:
+                self._last_flush = time.monotonic()
+        if due:
+            threading.Thread(target=self.flush, name='product-popularity-flush', daemon=True).start()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        if not counts:
+            return
+        try:
+            connection = get_redis_connection('default')
+        except NotImplementedError:
+            # Not a Redis cache, popularity is not tracked
+            return
+        key = bucket_key(int(time.time() // 3600))
+        try:
+            pipeline = connection.pipeline(transaction=False)
+            for product_id, count in counts.items():
+                pipeline.zincrby(key, count, product_id)
+            pipeline.expire(key, settings.PRODUCT_POPULARITY_WINDOW * 3600)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Dropped {sum(counts.values())} product hits, writing them to Redis failed: {e}")
+
+    def top(self, count):
+        """
+        Return [(product_id, hits)] for the `count` most requested products in the window.
+        """
+        connection = get_redis_connection('default')
+        hour = int(time.time() // 3600)
+        keys = [bucket_key(hour - n) for n in range(settings.PRODUCT_POPULARITY_WINDOW)]
+        total_key = f"{KEY_PREFIX}:total:{hour}"
+        pipeline = connection.pipeline()
+        pipeline.zunionstore(total_key, keys)
+        pipeline.zrevrange(total_key, 0, count - 1, withscores=True)
+        pipeline.delete(total_key)
+        _, top, _ = pipeline.execute()
+        return [(product_id.decode(), hits) for product_id, hits in top]
+
+
+tracker = PopularityTracker()
+
+
+def hit(*product_ids):
+    """
+    Count a request for each of product_ids.
+    """
+    tracker.hit(*product_ids)
@@ -0,0 +1,492 @@
+"""
+Product entries in the Redis cache, with a soft and a hard TTL.
+
+Redis drops an entry at its hard TTL. Before that, an entry whose product was
+scraped more than PRODUCT_CACHE_SOFT_TTL ago is still served but reported as
+stale, so the caller can answer immediately and refresh it in the background.
+
+Hot entries are also kept in a small in-process LRU (the L1) in front of
+Redis. When a Product is saved, its Redis entry is deleted and an
+invalidation is published over Redis pub/sub, so every worker process drops
+its L1 copy; PRODUCT_L1_CACHE_TTL bounds how long a missed message can
+leave a stale copy behind.
+
+Each entry also holds the success response body rendered once, when the
+product is cached, its ETag and when the product was last scraped, so the
+product view can answer a cache hit with those bytes as they are and answer
+conditional requests (see get_rendered). Only the body is stored in Redis;
+the product data is parsed back from it when a caller needs it.
+
+Product ids whose scrape found nothing usable are negatively cached for a
+short while with the reason (not found, incomplete, CAPTCHA failed), so
+repeated requests for a dead ASIN don't each start a browser session.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import redis.asyncio
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django_redis import get_redis_connection
+from django_redis.cache import RedisCache
+from rest_framework.renderers import JSONRenderer
+
+from apps.product.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'product_cache_invalidate'
+
+HIT = 'hit'
+STALE = 'stale'
+MISS = 'miss'
+
+# Why a product_id is negatively cached
+NOT_FOUND = 'not_found'
+INCOMPLETE = 'incomplete'
+CAPTCHA_FAILED = 'captcha_failed'
+
+cache_requests_total = Counter(
+    'product_cache_requests_total',
+    "Product cache lookups by result (hit, stale, miss)",
+    ['result'],
+)
+negative_cache_hits_total = Counter(
+    'product_negative_cache_hits_total',
+    "Lookups answered from the negative cache, by reason",
+    ['reason'],
+)
+cache_layer_requests_total = Counter(
+    'product_cache_layer_requests_total',
+    "Product cache lookups per layer (l1, redis) and result (hit, miss)",
+    ['layer', 'result'],
+)
+
+
+class LocalCache:
+    """
+    Thread-safe LRU of at most max_size entries, each kept for ttl seconds.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if time.monotonic() >= expires:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local = None
+_local_lock = threading.Lock()
+
+
+def local_cache():
+    """
+    The process-wide L1, or None when PRODUCT_L1_CACHE_SIZE is 0.
+
+    The first call also starts the thread that listens for invalidations.
+    """
+    global _local
+    if _local is None and settings.PRODUCT_L1_CACHE_SIZE:
+        with _local_lock:
+            if _local is None:
+                _local = LocalCache(settings.PRODUCT_L1_CACHE_SIZE, settings.PRODUCT_L1_CACHE_TTL)
+                threading.Thread(target=_listen_for_invalidations, name='product-cache-invalidation', daemon=True).start()
+    return _local
+
+
+def _listen_for_invalidations():
+    while True:
+        try:
+            pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+        except NotImplementedError:
+            # Not a Redis cache (e.g. local development with LocMemCache), there are no other workers to hear from
+            return
+        try:
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything could have changed while we weren't subscribed
+            _local.clear()
+            for message in pubsub.listen():
+                _local.delete(message['data'].decode())
+        except Exception as e:
+            logger.warning(f"Lost product cache invalidation channel, reconnecting: {e}")
+            _local.clear()
+            time.sleep(1)
+        finally:
+            pubsub.close()
+
+
+# Part of the key, bumped when the cached response body changes shape (v2 added
+# rating_count), so entries rendered before are left to expire instead of served
+BODY_VERSION = 2
+
+
+def product_cache_key(product_id):
+    return f"product_{product_id}_v{BODY_VERSION}"
+
+
+def refresh_key(product_id):
+    return f"product_refresh_{product_id}"
+
+
+def negative_key(product_id):
+    return f"product_missing_{product_id}"
+
+
+def render_body(data):
+    """
+    The product view's success response body for product data, as DRF renders it.
+    """
+    return JSONRenderer().render({"status": "success", "data": data})
+
+
+def etag(body):
+    return '"{}"'.format(hashlib.blake2b(body, digest_size=8).hexdigest())
+
+
+def _entry(data, updated_at=None):
+    """
+    Wrap product data with its rendered response, last modification and soft
+    expiry; updated_at is when it was scraped (default now).
+    """
+    updated_at = updated_at.timestamp() if updated_at else time.time()
+    body = render_body(data)
+    return {
+        'data': data,
+        'body': body,
+        'etag': etag(body),
+        'last_modified': updated_at,
+        'soft_expires': updated_at + settings.PRODUCT_CACHE_SOFT_TTL,
+    }
+
+
+def _data(entry):
+    if 'data' not in entry:
+        # Read from Redis, which only stores the body; parsed once per L1 copy
+        entry['data'] = json.loads(entry['body'])['data']
+    return entry['data']
+
+
+def _unwrap(entry):
+    if not entry:
+        return None, MISS
+    return _data(entry), HIT if time.time() < entry['soft_expires'] else STALE
+
+
+def _get_entry(key):
+    local = local_cache()
+    if local is not None:
+        entry = local.get(key)
+        cache_layer_requests_total.inc(layer='l1', result='hit' if entry is not None else 'miss')
+        if entry is not None:
+            return entry
+
+    entry = cache.get(key)
+    cache_layer_requests_total.inc(layer='redis', result='hit' if entry is not None else 'miss')
+    if entry is not None and local is not None:
+        local.set(key, entry)
+    return entry
+
+
+def get(product_id):
+    """
+    Return (product_data, result) where result is HIT, STALE or MISS.
+    """
+    product_data, result = _unwrap(_get_entry(product_cache_key(product_id)))
+    cache_requests_total.inc(result=result)
+    return product_data, result
+
+
+def _rendered(entry, count):
+    if not entry:
+        return None, MISS
+    result = HIT if time.time() < entry['soft_expires'] else STALE
+    if count:
+        cache_requests_total.inc(result=result)
+    return entry, result
+
+
+def get_rendered(product_id, count=True):
+    """
+    Return (entry, result) of a cached product for the response fast path;
+    entry holds 'body', 'etag', 'last_modified' and 'soft_expires'. On a
+    miss entry is None and nothing is counted: the caller takes the full
+    path, which looks the product up again.
+
+    Without count, a hit isn't counted either, for re-reading an entry the
+    caller's lookup just cached.
+    """
+    return _rendered(_get_entry(product_cache_key(product_id)), count)
+
+
+def get_many(product_ids):
+    """
+    Look up many products in one round-trip; returns {product_id: (product_data, result)} for found ones.
+    """
+    local = local_cache()
+    entries = {}
+    remote_keys = []
+    for product_id in product_ids:
+        key = product_cache_key(product_id)
+        entry = local.get(key) if local is not None else None
+        if local is not None:
+            cache_layer_requests_total.inc(layer='l1', result='hit' if entry is not None else 'miss')
+        if entry is not None:
+            entries[key] = entry
+        else:
+            remote_keys.append(key)
+
+    if remote_keys:
+        remote = cache.get_many(remote_keys)
+        for key in remote_keys:
+            cache_layer_requests_total.inc(layer='redis', result='hit' if key in remote else 'miss')
+        for key, entry in remote.items():
+            entries[key] = entry
+            if local is not None:
+                local.set(key, entry)
+
+    found = {}
+    for product_id in product_ids:
+        product_data, result = _unwrap(entries.get(product_cache_key(product_id)))
+        cache_requests_total.inc(result=result)
+        if result != MISS:
+            found[product_id] = (product_data, result)
+    return found
+
+
+def set(product_id, product_data, updated_at=None):
+    key, entry = product_cache_key(product_id), _entry(product_data, updated_at)
+    cache.set(key, entry, timeout=settings.PRODUCT_CACHE_HARD_TTL)
+    local = local_cache()
+    if local is not None:
+        local.set(key, entry)
+
+
+def set_many(products, invalidate=False):
+    """
+    Cache many products in one round-trip; products is {product_id: (product_data, updated_at)}.
+
+    With invalidate, other worker processes drop their L1 copies, for
+    products that changed without a post_save signal (bulk updates).
+    """
+    entries = {
+        product_cache_key(product_id): _entry(data, updated_at)
+        for product_id, (data, updated_at) in products.items()
+    }
+    cache.set_many(entries, timeout=settings.PRODUCT_CACHE_HARD_TTL)
+    local = local_cache()
+    if local is not None:
+        for key, entry in entries.items():
+            local.set(key, entry)
+    if invalidate and entries:
+        publish_invalidation(*entries)
+
+
+def delete(product_id):
+    """
+    Drop a product, and any negative entry for it, from Redis and from the L1
+    of every worker process.
+    """
+    key = product_cache_key(product_id)
+    cache.delete_many([key, negative_key(product_id)])
+    local = local_cache()
+    if local is not None:
+        local.delete(key)
+    publish_invalidation(key)
+
+
+def publish_invalidation(*keys):
+    """
+    Tell every worker process to drop these keys from its L1.
+    """
+    try:
+        connection = get_redis_connection('default')
+    except NotImplementedError:
+        return
+    pipeline = connection.pipeline(transaction=False)
+    for key in keys:
+        pipeline.publish(INVALIDATION_CHANNEL, key)
+    pipeline.execute()
+
+
+def claim_refresh(product_id):
+    """
+    True for the one caller (across workers) that should refresh a stale entry.
+
+    The claim expires on its own, so a failed refresh is retried after
+    PRODUCT_CACHE_REFRESH_TIMEOUT rather than on every stale hit.
+    """
+    return cache.add(refresh_key(product_id), 1, timeout=settings.PRODUCT_CACHE_REFRESH_TIMEOUT)
+
+
+def release_refresh(product_id):
+    """
+    Give up a claim_refresh that won't be acted on, so another caller can take it.
+    """
+    cache.delete(refresh_key(product_id))
+
+
+def _negative_ttl(reason):
+    # A failed CAPTCHA says nothing about the product, retry it sooner
+    if reason == CAPTCHA_FAILED:
+        return settings.PRODUCT_NEGATIVE_CACHE_CAPTCHA_TTL
+    return settings.PRODUCT_NEGATIVE_CACHE_TTL
+
+
+def get_negative(product_id):
+    """
+    Return why product_id was recently found not worth scraping, or None.
+    """
+    reason = cache.get(negative_key(product_id))
+    if reason is not None:
+        negative_cache_hits_total.inc(reason=reason)
+    return reason
+
+
+def get_negative_many(product_ids):
+    """
+    Return {product_id: reason} for the negatively cached ones, in one round-trip.
+    """
+    keys = {negative_key(product_id): product_id for product_id in product_ids}
+    found = {keys[key]: reason for key, reason in cache.get_many(list(keys)).items()}
+    for reason in found.values():
+        negative_cache_hits_total.inc(reason=reason)
+    return found
+
+
+def set_negative(product_id, reason):
+    """
+    Remember for a short while that scraping product_id failed for `reason`.
+    """
+    cache.set(negative_key(product_id), reason, timeout=_negative_ttl(reason))
+
+
+def delete_negative_many(product_ids):
+    cache.delete_many([negative_key(product_id) for product_id in product_ids])
+
+
+# redis.asyncio connections belong to the event loop that opened them
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _async_client():
+    """
+    An asyncio Redis client for the running loop, or None if the cache isn't django_redis.
+    """
+    # `cache` is a proxy, the backend is what it forwards to
+    if not isinstance(caches[DEFAULT_CACHE_ALIAS], RedisCache):
+        return None
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = redis.asyncio.from_url(settings.CACHES['default']['LOCATION'])
+    return _async_clients[loop]
+
+
+async def _aget_entry(key):
+    local = local_cache()
+    if local is not None:
+        entry = local.get(key)
+        cache_layer_requests_total.inc(layer='l1', result='hit' if entry is not None else 'miss')
+        if entry is not None:
+            return entry
+
+    client = _async_client()
+    if client is None:
+        entry = await cache.aget(key)
+    else:
+        # Same key and value encoding as django_redis, so both clients share entries
+        value = await client.get(cache.client.make_key(key))
+        entry = cache.client.decode(value) if value is not None else None
+    cache_layer_requests_total.inc(layer='redis', result='hit' if entry is not None else 'miss')
+    if entry is not None and local is not None:
+        local.set(key, entry)
+    return entry
+
+
+async def aget(product_id):
+    """
+    Async get(), without blocking the event loop on Redis.
+    """
+    product_data, result = _unwrap(await _aget_entry(product_cache_key(product_id)))
+    cache_requests_total.inc(result=result)
+    return product_data, result
+
+
+async def aget_rendered(product_id, count=True):
+    """
+    Async get_rendered().
+    """
+    return _rendered(await _aget_entry(product_cache_key(product_id)), count)
+
+
+async def aset(product_id, product_data, updated_at=None):
+    key, entry = product_cache_key(product_id), _entry(product_data, updated_at)
+    client = _async_client()
+    if client is None:
+        await cache.aset(key, entry, timeout=settings.PRODUCT_CACHE_HARD_TTL)
+    else:
+        await client.set(cache.client.make_key(key), cache.client.encode(entry), ex=settings.PRODUCT_CACHE_HARD_TTL)
+    local = local_cache()
+    if local is not None:
+        local.set(key, entry)
+
+
+async def aclaim_refresh(product_id):
+    """
+    Async claim_refresh().
+    """
+    client = _async_client()
+    if client is None:
+        return await cache.aadd(refresh_key(product_id), 1, timeout=settings.PRODUCT_CACHE_REFRESH_TIMEOUT)
+    return bool(await client.set(
+        cache.client.make_key(refresh_key(product_id)), cache.client.encode(1),
+        nx=True, ex=settings.PRODUCT_CACHE_REFRESH_TIMEOUT,
+    ))
+
+
+async def aget_negative(product_id):
+    """
+    Async get_negative().
+    """
+    client = _async_client()
+    if client is None:
+        reason = await cache.aget(negative_key(product_id))
+    else:
+        value = await client.get(cache.client.make_key(negative_key(product_id)))
+        reason = cache.client.decode(value) if value is not None else None
+    if reason is not None:
+        negative_cache_hits_total.inc(reason=reason)
+    return reason
@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.product import product_cache
+from apps.product.models import Product
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    """
+    Drop the cached copies of a product once its change is committed, so no
+    worker keeps serving the old values from its L1 or from Redis.
+    """
+    transaction.on_commit(lambda: product_cache.delete(instance.product_id))
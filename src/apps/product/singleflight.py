@@ -0,0 +1,97 @@
+"""
+Single-flight execution: concurrent callers asking for the same key share
+one execution instead of each running it.
+
+Within a process, followers wait on the leader's result. Across processes
+(runserver threads, WSGI workers) the leader also holds a Redis lock, so a
+leader in another worker waits for it and then runs `fn` itself; `fn` is
+expected to re-check the cache/database before doing the expensive work.
+"""
+
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import LockError
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlightTimeout(Exception):
+    """
+    Raised when the result for a key was not ready within the wait timeout.
+    """
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls per key, in-process and across workers.
+    """
+
+    def __init__(self, name, wait_timeout=None, lock_timeout=None):
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self.lock_timeout = lock_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Run `fn()` once for all concurrent callers of `key` and return its result.
+
+        Exceptions raised by `fn` are re-raised in every waiting caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            if not call.done.wait(self._wait_timeout()):
+                raise SingleFlightTimeout(f"Timed out waiting for {self.name} of {key}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_locked(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run_locked(self, key, fn):
+        # Only Redis-backed caches (django_redis) provide a distributed lock
+        if not hasattr(cache, 'lock'):
+            return fn()
+
+        lock = cache.lock(f"{self.name}_lock_{key}", timeout=self._lock_timeout())
+        if not lock.acquire(blocking=True, blocking_timeout=self._wait_timeout()):
+            raise SingleFlightTimeout(f"Timed out waiting for {self.name} lock of {key}")
+        try:
+            return fn()
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                # The lock expired while fn was running, someone else may hold it now
+                logger.warning(f"{self.name} lock for {key} expired before release")
+
+    def _wait_timeout(self):
+        return self.wait_timeout if self.wait_timeout is not None else settings.SCRAPE_WAIT_TIMEOUT
+
+    def _lock_timeout(self):
+        return self.lock_timeout if self.lock_timeout is not None else settings.SCRAPE_LOCK_TIMEOUT
@@ -0,0 +1,242 @@
+"""
+Throttling of outbound requests to Amazon.
+
+Two limits apply to every page fetch, in every tier:
+
+- A token bucket in Redis caps the request rate of all workers together at
+  OUTBOUND_RATE per second, with bursts of up to OUTBOUND_BURST.
+- An AIMD controller caps the concurrent fetches of this process. A CAPTCHA
+  halves the limit (at most once per OUTBOUND_BACKOFF_INTERVAL), each page
+  fetched without one raises it by 1/limit, so it grows by about one per
+  round of successful fetches, between OUTBOUND_CONCURRENCY_MIN and _MAX.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from apps.product.metrics import Counter, Gauge
+from apps.product.timing import span
+
+logger = logging.getLogger(__name__)
+
+rate_limit_waits_total = Counter(
+    'outbound_rate_limit_waits_total',
+    "Outbound fetches that had to wait for a rate limit token",
+)
+rate_limit_wait_seconds_total = Counter(
+    'outbound_rate_limit_wait_seconds_total',
+    "Time spent waiting for rate limit tokens",
+)
+concurrency_limit = Gauge(
+    'outbound_concurrency_limit',
+    "Current AIMD limit on concurrent outbound fetches in this process",
+)
+in_flight = Gauge(
+    'outbound_in_flight',
+    "Outbound fetches running in this process",
+)
+concurrency_changes_total = Counter(
+    'outbound_concurrency_changes_total',
+    "AIMD decisions on the outbound concurrency limit (increase, decrease)",
+    ['decision'],
+)
+
+
+class ThrottleTimeout(Exception):
+    """
+    No outbound slot or rate limit token was available within the wait timeout.
+    """
+
+
+# Refill the bucket for the time since the last call, then take a token or
+# return how long until one is available. Redis' clock is used so workers on
+# different hosts agree. Returned as a string, Lua numbers would be truncated.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or burst
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all workers through Redis, or local to this
+    process when the cache is not Redis.
+    """
+
+    def __init__(self, name, rate, burst):
+        self.key = f"rate_limit:{name}"
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        try:
+            self._script = get_redis_connection('default').register_script(TOKEN_BUCKET_SCRIPT)
+        except NotImplementedError:
+            self._script = None
+
+    def acquire(self, timeout):
+        """
+        Take a token, waiting up to timeout seconds for one; raises ThrottleTimeout.
+        """
+        deadline = time.monotonic() + timeout
+        waited = 0
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                if waited:
+                    rate_limit_waits_total.inc()
+                    rate_limit_wait_seconds_total.inc(waited)
+                return
+            if time.monotonic() + wait > deadline:
+                raise ThrottleTimeout(f"No rate limit token within {timeout}s")
+            time.sleep(wait)
+            waited += wait
+
+    def _take(self):
+        """
+        Take a token and return 0, or return the seconds until one is available.
+        """
+        if self._script is not None:
+            try:
+                return float(self._script(keys=[self.key], args=[self.rate, self.burst]))
+            except Exception as e:
+                # Keep limiting this process rather than stopping all fetches while Redis is away
+                logger.warning(f"Rate limiting in process, Redis token bucket failed: {e}")
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Concurrency limit adjusted by additive increase, multiplicative decrease.
+    """
+
+    def __init__(self, min_limit=1, max_limit=8, initial=None, decrease_factor=0.5, backoff_interval=10):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.backoff_interval = backoff_interval
+        self.limit = float(initial if initial is not None else max_limit)
+        self.in_flight = 0
+        self._last_decrease = float('-inf')
+        self._condition = threading.Condition()
+        concurrency_limit.set(int(self.limit))
+
+    def acquire(self, timeout):
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                raise ThrottleTimeout(f"No outbound slot within {timeout}s (limit {int(self.limit)})")
+            self.in_flight += 1
+            in_flight.inc()
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            in_flight.dec()
+            self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            if self.limit >= self.max_limit:
+                return
+            before = int(self.limit)
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if int(self.limit) > before:
+                concurrency_changes_total.inc(decision='increase')
+                concurrency_limit.set(int(self.limit))
+                self._condition.notify_all()
+
+    def on_captcha(self):
+        with self._condition:
+            now = time.monotonic()
+            # The fetches already in flight will hit the same CAPTCHA wave, back off once for them
+            if now - self._last_decrease < self.backoff_interval or self.limit <= self.min_limit:
+                return
+            self._last_decrease = now
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            concurrency_changes_total.inc(decision='decrease')
+            concurrency_limit.set(int(self.limit))
+            logger.info(f"CAPTCHA seen, outbound concurrency limit lowered to {int(self.limit)}")
+
+
+class OutboundThrottle:
+    """
+    Rate limit and concurrency limit for fetches from Amazon.
+    """
+
+    def __init__(self, rate_limiter, concurrency_limiter, wait_timeout=30):
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.wait_timeout = wait_timeout
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold an outbound slot for one page fetch.
+        """
+        started = time.monotonic()
+        with span('throttle'):
+            self.concurrency_limiter.acquire(self.wait_timeout)
+        try:
+            with span('throttle'):
+                self.rate_limiter.acquire(max(0, self.wait_timeout - (time.monotonic() - started)))
+            yield
+        finally:
+            self.concurrency_limiter.release()
+
+    def success(self):
+        self.concurrency_limiter.on_success()
+
+    def captcha(self):
+        self.concurrency_limiter.on_captcha()
+
+
+_throttle = None
+_throttle_lock = threading.Lock()
+
+
+def get_outbound_throttle():
+    """
+    Return the process-wide throttle configured from settings.
+    """
+    global _throttle
+    if _throttle is None:
+        with _throttle_lock:
+            if _throttle is None:
+                _throttle = OutboundThrottle(
+                    RateLimiter('amazon', settings.OUTBOUND_RATE, settings.OUTBOUND_BURST),
+                    AdaptiveConcurrencyLimiter(
+                        min_limit=settings.OUTBOUND_CONCURRENCY_MIN,
+                        max_limit=settings.OUTBOUND_CONCURRENCY_MAX,
+                        backoff_interval=settings.OUTBOUND_BACKOFF_INTERVAL,
+                    ),
+                    wait_timeout=settings.OUTBOUND_WAIT_TIMEOUT,
+                )
+    return _throttle
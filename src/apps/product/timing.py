@@ -0,0 +1,98 @@
+"""
+Timing spans for the stages of a product lookup.
+
+`span(stage)` times a block, or a function when used as a decorator. Every
+duration is observed in the product_stage_duration_seconds histogram and
+added to the timings of the request being served, which
+ServerTimingMiddleware returns in a Server-Timing header.
+
+Stages: cache, db, db_connect, scrape (including waiting for a concurrent scrape),
+throttle, fetch_http, fetch_selenium, webdriver_borrow, webdriver_session,
+navigation, captcha and parse. Spans nest, e.g. captcha is part of a fetch.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from apps.product.metrics import Histogram
+
+stage_duration_seconds = Histogram(
+    'product_stage_duration_seconds',
+    "Time spent in each stage of product lookups",
+    ['stage'],
+)
+request_duration_seconds = Histogram(
+    'http_request_duration_seconds',
+    "Time to respond to HTTP requests, by URL name",
+    ['view'],
+)
+
+# {stage: seconds} of the request being served, None outside of one
+_timings = ContextVar('stage_timings', default=None)
+
+
+@contextmanager
+def span(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_duration_seconds.observe(elapsed, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0) + elapsed
+
+
+def server_timing(timings, total):
+    """
+    Format {stage: seconds} and the request's total as a Server-Timing header value.
+    """
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(entries)
+
+
+class ServerTimingMiddleware:
+    """
+    Collect the spans of each request, observe its duration and, with
+    SERVER_TIMING_HEADER, report the spans in a Server-Timing header.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _timings.set({})
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            return self.finish(request, response, _timings.get(), time.perf_counter() - started)
+        finally:
+            _timings.reset(token)
+
+    async def __acall__(self, request):
+        token = _timings.set({})
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            return self.finish(request, response, _timings.get(), time.perf_counter() - started)
+        finally:
+            _timings.reset(token)
+
+    def finish(self, request, response, timings, total):
+        match = request.resolver_match
+        request_duration_seconds.observe(total, view=match.url_name if match and match.url_name else 'other')
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = server_timing(timings, total)
+        return response
@@ -0,0 +1,303 @@
+"""
+Process-wide pool of reusable Selenium Remote sessions.
+
+Starting a session against the selenium container costs seconds, so drivers
+are borrowed from this pool and handed back after each page instead of being
+created and quit per request.
+"""
+
+import os
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options  # Import Options for configuring Chrome options
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+
+from apps.product.timing import span
+
+logger = logging.getLogger(__name__)
+
+
+class DriverPoolTimeout(Exception):
+    """
+    Raised when no driver could be borrowed within the borrow timeout.
+    """
+
+
+# Subresources no product field comes from. Matched by Chrome against the
+# full URL, `*` is a wildcard. The CAPTCHA image is downloaded separately
+# (see captcha.download_image), so blocking images does not affect solving.
+BLOCKED_URLS = [
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.mp4', '*.webm', '*.m3u8',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*fls-na.amazon.com*', '*unagi.amazon.com*', '*/uedata*', '*/rd/uedata*',
+    '*amazon-adsystem.com*', '*doubleclick.net*', '*google-analytics.com*',
+    '*googletagmanager.com*', '*facebook.net*',
+]
+
+
+def create_webdriver(page_load_strategy=None, block_resources=None):
+    """
+    Open a new Remote Chrome session against the selenium container.
+
+    The session loads pages with SELENIUM_PAGE_LOAD_STRATEGY and, with
+    SELENIUM_BLOCK_RESOURCES, without images and with BLOCKED_URLS (plus
+    SELENIUM_EXTRA_BLOCKED_URLS) blocked through the DevTools protocol.
+    """
+    selenium_host = os.getenv('SELENIUM_HOST', 'selenium')
+    selenium_port = os.getenv('SELENIUM_PORT', '4444')
+    selenium_url = f'http://{selenium_host}:{selenium_port}/wd/hub'
+    if page_load_strategy is None:
+        page_load_strategy = settings.SELENIUM_PAGE_LOAD_STRATEGY
+    if block_resources is None:
+        block_resources = settings.SELENIUM_BLOCK_RESOURCES
+
+    options = Options()
+    options.headless = True  # Run Chrome in headless mode
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    # eager returns once the HTML is parsed, none right after navigation starts
+    options.page_load_strategy = page_load_strategy
+    if block_resources:
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+
+    # Chromium's connection knows the vendor commands, executeCdpCommand among them
+    driver = webdriver.Remote(
+        command_executor=ChromiumRemoteConnection(
+            selenium_url, vendor_prefix='goog', browser_name='chrome', keep_alive=True,
+        ),
+        options=options
+    )
+    if block_resources:
+        block_urls(driver, BLOCKED_URLS + settings.SELENIUM_EXTRA_BLOCKED_URLS)
+    return driver
+
+
+def block_urls(driver, patterns):
+    """
+    Make the driver's browser fail requests to URLs matching patterns.
+    """
+    try:
+        driver.execute('executeCdpCommand', {'cmd': 'Network.enable', 'params': {}})
+        driver.execute('executeCdpCommand', {'cmd': 'Network.setBlockedURLs', 'params': {'urls': patterns}})
+    except WebDriverException as e:
+        # Images are still off through the preferences, the pages just load slower
+        logger.warning(f"Could not block URLs through DevTools: {e}")
+
+
+class PooledDriver:
+    """
+    A driver owned by the pool, with the bookkeeping needed to recycle it.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.created_at = time.monotonic()
+        self.pages = 0
+        self.broken = False
+
+    def age(self):
+        return time.monotonic() - self.created_at
+
+
+class WebDriverPool:
+    """
+    Bounded pool of WebDriver sessions.
+
+    At most `size` sessions exist at once. A driver is recycled (quit and
+    replaced on next borrow) after `max_pages` page loads, after `max_age`
+    seconds, when it fails its health check, or when the caller reports it
+    broken by raising a WebDriverException while holding it. Starting a
+    session gives up after `session_timeout` seconds (0 waits for as long as
+    the grid takes), as the grid queues requests while all its slots are busy.
+    """
+
+    def __init__(self, factory=create_webdriver, size=2, max_pages=50, max_age=30 * 60,
+                 borrow_timeout=30, return_timeout=5, page_load_timeout=30, session_timeout=30):
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.max_age = max_age
+        self.borrow_timeout = borrow_timeout
+        self.return_timeout = return_timeout
+        self.page_load_timeout = page_load_timeout
+        self.session_timeout = session_timeout
+
+        self._idle = queue.LifoQueue()  # most recently used first, keeps warm sessions warm
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def acquire(self, timeout=None):
+        """
+        Borrow a driver, waiting up to `timeout` seconds for a free slot.
+        """
+        if self._closed:
+            raise RuntimeError("WebDriver pool is closed")
+
+        timeout = self.borrow_timeout if timeout is None else timeout
+        with span('webdriver_borrow'):
+            acquired = self._slots.acquire(timeout=timeout)
+        if not acquired:
+            raise DriverPoolTimeout(f"No WebDriver available after {timeout}s")
+
+        try:
+            while True:
+                try:
+                    pooled = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if self._is_reusable(pooled) and self._is_healthy(pooled):
+                    return pooled
+                self._discard(pooled)
+
+            logger.info("Starting new WebDriver session")
+            with span('webdriver_session'):
+                driver = self._start_session()
+                driver.set_page_load_timeout(self.page_load_timeout)
+            return PooledDriver(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, pooled):
+        """
+        Return a borrowed driver to the pool, or quit it if it should be recycled.
+        """
+        try:
+            if self._closed or pooled.broken or not self._is_reusable(pooled) or not self._reset(pooled):
+                self._discard(pooled)
+            else:
+                self._idle.put(pooled)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """
+        Borrow a driver for the duration of a `with` block.
+        """
+        pooled = self.acquire(timeout=timeout)
+        try:
+            yield pooled.driver
+        except TimeoutException:
+            # A slow page or an unmet wait condition, the session itself is fine
+            raise
+        except WebDriverException:
+            # The session may be dead (crashed browser, expired session on the grid)
+            pooled.broken = True
+            raise
+        finally:
+            pooled.pages += 1
+            self.release(pooled)
+
+    def close(self):
+        """
+        Quit every idle driver; drivers still borrowed are quit when returned.
+        """
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def _start_session(self):
+        """
+        Call the factory, waiting at most session_timeout seconds for the session.
+
+        The factory runs in its own thread, so a session that arrives after the
+        borrower gave up can still be quit instead of staying open on the grid.
+        """
+        if not self.session_timeout:
+            return self.factory()
+
+        future = Future()
+
+        def start():
+            try:
+                future.set_result(self.factory())
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=start, name='webdriver-session-start', daemon=True).start()
+        try:
+            return future.result(timeout=self.session_timeout)
+        except FutureTimeoutError:
+            # Runs at once if the session arrived in the meantime
+            future.add_done_callback(self._quit_late_session)
+            raise DriverPoolTimeout(f"No WebDriver session started after {self.session_timeout}s")
+
+    def _quit_late_session(self, future):
+        if future.exception() is None:
+            self._discard(PooledDriver(future.result()))
+
+    def _is_reusable(self, pooled):
+        if self.max_pages and pooled.pages >= self.max_pages:
+            return False
+        if self.max_age and pooled.age() >= self.max_age:
+            return False
+        return True
+
+    def _is_healthy(self, pooled):
+        try:
+            pooled.driver.current_url  # cheap round-trip to the session
+            return True
+        except Exception as e:
+            logger.warning(f"Dropping unhealthy WebDriver session: {e}")
+            return False
+
+    def _reset(self, pooled):
+        """
+        Park the driver on a blank page so the next borrower starts clean.
+        """
+        try:
+            pooled.driver.set_page_load_timeout(self.return_timeout)
+            pooled.driver.get('about:blank')
+            pooled.driver.set_page_load_timeout(self.page_load_timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to reset WebDriver session: {e}")
+            return False
+
+    def _discard(self, pooled):
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.warning(f"Failed to quit WebDriver session: {e}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    """
+    Return the process-wide pool, creating it from settings on first use.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = WebDriverPool(
+                    size=settings.SELENIUM_POOL_SIZE,
+                    max_pages=settings.SELENIUM_POOL_MAX_PAGES,
+                    max_age=settings.SELENIUM_POOL_MAX_AGE,
+                    borrow_timeout=settings.SELENIUM_POOL_BORROW_TIMEOUT,
+                    return_timeout=settings.SELENIUM_POOL_RETURN_TIMEOUT,
+                    page_load_timeout=settings.SELENIUM_PAGE_LOAD_TIMEOUT,
+                    session_timeout=settings.SELENIUM_SESSION_TIMEOUT,
+                )
+                atexit.register(_pool.close)
+    return _pool
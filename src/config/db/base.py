@@ -0,0 +1,28 @@
+"""
+The PostgreSQL backend, reporting the connections it opens.
+
+Each connection opened is counted in db_connections_opened_total and timed
+as the db_connect stage (see apps/product/timing.py), so it shows in the
+Server-Timing header of the request that paid for it. With persistent
+connections (CONN_MAX_AGE) the count should stay far below the number of
+requests served.
+"""
+
+from django.db.backends.postgresql import base
+
+from apps.product.metrics import Counter
+from apps.product.timing import span
+
+connections_opened_total = Counter(
+    'db_connections_opened_total',
+    "Database connections opened, by alias",
+    ['alias'],
+)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def connect(self):
+        with span('db_connect'):
+            super().connect()
+        connections_opened_total.inc(alias=self.alias)
@@ -0,0 +1,64 @@
+"""
+Gunicorn configuration, used with `gunicorn -c config/gunicorn.conf.py` from src/.
+
+Every setting is read from the environment (or src/config/.env, as the
+Django settings are):
+
+    GUNICORN_WORKER_CLASS   sync (default), gthread, or uvicorn for the ASGI
+                            application (uvicorn.workers.UvicornWorker)
+    GUNICORN_WORKERS        worker processes, default 2 * CPUs + 1
+    GUNICORN_THREADS        threads per gthread worker, default 4
+    GUNICORN_BIND           default 0.0.0.0:8000
+    GUNICORN_KEEPALIVE      seconds to hold an idle keep-alive connection, default 5
+    GUNICORN_TIMEOUT        seconds before a silent worker is killed and replaced, default 120
+    GUNICORN_GRACEFUL_TIMEOUT  seconds a worker gets to finish its requests on
+                            restart (SIGHUP) or shutdown, default 30
+    GUNICORN_MAX_REQUESTS   restart a worker after this many requests, default 0 (never)
+    GUNICORN_MAX_REQUESTS_JITTER  up to this many more, so workers don't restart together
+    GUNICORN_RELOAD         restart workers when the code changes, for development
+
+The timeout has to cover a scrape (Selenium and CAPTCHA included) on the
+sync views. Every worker process has its own WebDriver pool, HTTP
+sessions, metrics and database connections: SELENIUM_POOL_SIZE, /metrics
+and DB_CONN_MAX_AGE apply per worker. Uvicorn workers serve config.asgi,
+which neither keeps database connections open (put pgbouncer in front of
+the database instead) nor serves static files: a reverse proxy has to serve
+STATIC_ROOT (src/staticfiles) at STATIC_URL. The selenium service's
+SE_NODE_MAX_SESSIONS (docker-compose.yml) has to cover SELENIUM_POOL_SIZE
+sessions for every worker, the scrape worker and the scheduler.
+"""
+
+import multiprocessing
+from pathlib import Path
+
+import environ
+
+env = environ.Env()
+environ.Env.read_env(Path(__file__).resolve().parent / '.env')
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'uvicorn': 'uvicorn.workers.UvicornWorker',
+}
+
+worker_class = WORKER_CLASSES[env('GUNICORN_WORKER_CLASS', default='sync')]
+wsgi_app = 'config.asgi:application' if worker_class.startswith('uvicorn') else 'config.wsgi:application'
+workers = env.int('GUNICORN_WORKERS', default=2 * multiprocessing.cpu_count() + 1)
+threads = env.int('GUNICORN_THREADS', default=4) if worker_class == 'gthread' else 1
+bind = env('GUNICORN_BIND', default='0.0.0.0:8000')
+keepalive = env.int('GUNICORN_KEEPALIVE', default=5)
+timeout = env.int('GUNICORN_TIMEOUT', default=120)
+graceful_timeout = env.int('GUNICORN_GRACEFUL_TIMEOUT', default=30)
+max_requests = env.int('GUNICORN_MAX_REQUESTS', default=0)
+max_requests_jitter = env.int('GUNICORN_MAX_REQUESTS_JITTER', default=0)
+reload = env.bool('GUNICORN_RELOAD', default=False)
+
+# Load the application in each worker after the fork, so nothing that runs a thread
+# (the cache invalidation listener, popularity flusher, WebDriver pool) is set up
+# in the master, where a fork would leave it without its thread
+preload_app = False
+accesslog = '-'
+errorlog = '-'
+# Request time in microseconds (%(D)s) after the usual combined log line
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s'
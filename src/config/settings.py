@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres', # trigram index on product names
     
     # Third-party apps
     'rest_framework', # DRF
@@ -58,7 +59,11 @@ INSTALLED_APPS = [
     
 ]
 
+# Set by config/asgi.py, when served by an ASGI server (gunicorn's uvicorn workers)
+ASGI = env.bool('DJANGO_ASGI', default=False)
+
 MIDDLEWARE = [
+    'apps.product.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,6 +72,11 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+if not ASGI:
+    # Serves STATIC_ROOT from the application server, compressed and cached for good. It is
+    # sync-only, so under ASGI it would run every request in a thread: there STATIC_ROOT is
+    # left to the reverse proxy in front
+    MIDDLEWARE.insert(2, 'whitenoise.middleware.WhiteNoiseMiddleware')
 
 ROOT_URLCONF = 'config.urls'
 
@@ -98,12 +108,23 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # django.db.backends.postgresql, timing the connections it opens (see config/db/base.py)
+        'ENGINE': 'config.db',
         'NAME': env('POSTGRES_DB'),
         'USER': env('POSTGRES_USER'),
         'PASSWORD': env('POSTGRES_PASSWORD'),
-        'HOST': 'db',
-        'PORT': '5432',
+        # `pgbouncer` to go through the pooler service (docker compose --profile pgbouncer)
+        'HOST': env('POSTGRES_HOST', default='db'),
+        'PORT': env('POSTGRES_PORT', default='5432'),
+        # Keep each thread's connection open between requests for this many seconds (0: one per
+        # request). Persistent connections don't suit ASGI, where sync code runs on threads the
+        # request's end doesn't close them on: there it is always 0, use pgbouncer instead
+        'CONN_MAX_AGE': 0 if ASGI else env.int('DB_CONN_MAX_AGE', default=60),
+        # Check a persistent connection is still up before the first query of a request
+        'CONN_HEALTH_CHECKS': env.bool('DB_CONN_HEALTH_CHECKS', default=True),
+        # Behind a transaction-pooling pgbouncer a server-side cursor can't outlive its
+        # transaction's server connection
+        'DISABLE_SERVER_SIDE_CURSORS': env.bool('DB_PGBOUNCER', default=False),
     }
 }
 
@@ -125,9 +146,93 @@ CACHES = {
         'LOCATION': env('REDIS_URL'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            # Product entries in a compact binary format, everything else pickled (see apps/product/codec.py)
+            'SERIALIZER': 'apps.product.codec.CacheSerializer',
         }
     }
 }
+# Selenium WebDriver pool (see apps/product/webdriver_pool.py)
+SELENIUM_POOL_SIZE = env.int('SELENIUM_POOL_SIZE', default=2)  # max concurrent sessions per process
+SELENIUM_POOL_MAX_PAGES = env.int('SELENIUM_POOL_MAX_PAGES', default=50)  # recycle a session after N pages
+SELENIUM_POOL_MAX_AGE = env.int('SELENIUM_POOL_MAX_AGE', default=60*30)  # recycle a session after N seconds
+SELENIUM_POOL_BORROW_TIMEOUT = env.float('SELENIUM_POOL_BORROW_TIMEOUT', default=30)  # wait for a free session
+SELENIUM_POOL_RETURN_TIMEOUT = env.float('SELENIUM_POOL_RETURN_TIMEOUT', default=5)  # reset a session on return
+SELENIUM_SESSION_TIMEOUT = env.float('SELENIUM_SESSION_TIMEOUT', default=30)  # start a session (0: no limit)
+SELENIUM_PAGE_LOAD_TIMEOUT = env.float('SELENIUM_PAGE_LOAD_TIMEOUT', default=30)
+SELENIUM_PAGE_LOAD_STRATEGY = env('SELENIUM_PAGE_LOAD_STRATEGY', default='eager')  # normal, eager or none
+SELENIUM_CONTENT_WAIT_TIMEOUT = env.float('SELENIUM_CONTENT_WAIT_TIMEOUT', default=10)  # wait for productTitle (eager/none)
+SELENIUM_BLOCK_RESOURCES = env.bool('SELENIUM_BLOCK_RESOURCES', default=True)  # no images, media, fonts, trackers
+SELENIUM_EXTRA_BLOCKED_URLS = json.loads(env('SELENIUM_EXTRA_BLOCKED_URLS', default='[]'))  # more URL patterns to block
+
+# Product page fetching (see apps/product/fetchers.py)
+AMAZON_BASE_URL = env('AMAZON_BASE_URL', default='https://www.amazon.com')
+SCRAPE_HTTP_TIER = env.bool('SCRAPE_HTTP_TIER', default=True)  # try plain HTTP before Selenium
+HTTP_FETCH_POOL_SIZE = env.int('HTTP_FETCH_POOL_SIZE', default=10)  # keep-alive connections per host
+HTTP_FETCH_TIMEOUT = env.float('HTTP_FETCH_TIMEOUT', default=10)
+HTTP_FETCH_USER_AGENT = env(
+    'HTTP_FETCH_USER_AGENT',
+    default='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36'
+)
+PRODUCT_EXTRACTOR = env('PRODUCT_EXTRACTOR', default='lxml')  # soup, lxml or prescan (see apps/product/parsers.py)
+
+# CAPTCHA solving (see apps/product/captcha.py)
+CAPTCHA_SOLVER = env('CAPTCHA_SOLVER', default='amazoncaptcha')  # amazoncaptcha, 2captcha or stub
+TWOCAPTCHA_API_KEY = env('TWOCAPTCHA_API_KEY', default='')
+CAPTCHA_SOLUTION_TTL = env.int('CAPTCHA_SOLUTION_TTL', default=60*60*24*7)  # solutions cached by image hash
+HTTP_SOLVE_CAPTCHA = env.bool('HTTP_SOLVE_CAPTCHA', default=True)  # solve in the HTTP tier before escalating to Selenium
+AMAZON_COOKIES_TTL = env.int('AMAZON_COOKIES_TTL', default=60*60*6)  # post-CAPTCHA cookies shared between sessions
+
+# Outbound request throttling (see apps/product/throttling.py)
+OUTBOUND_RATE = env.float('OUTBOUND_RATE', default=1.0)  # page fetches per second across all workers
+OUTBOUND_BURST = env.int('OUTBOUND_BURST', default=5)
+OUTBOUND_CONCURRENCY_MIN = env.int('OUTBOUND_CONCURRENCY_MIN', default=1)  # AIMD bounds, per process
+OUTBOUND_CONCURRENCY_MAX = env.int('OUTBOUND_CONCURRENCY_MAX', default=8)
+OUTBOUND_BACKOFF_INTERVAL = env.int('OUTBOUND_BACKOFF_INTERVAL', default=10)  # halve the limit at most this often
+OUTBOUND_WAIT_TIMEOUT = env.int('OUTBOUND_WAIT_TIMEOUT', default=30)  # answer 503 after waiting this long for a slot
+
+# Concurrent misses on the same product_id share one scrape (see apps/product/singleflight.py)
+SCRAPE_WAIT_TIMEOUT = env.float('SCRAPE_WAIT_TIMEOUT', default=60)  # how long other callers wait for the result
+SCRAPE_LOCK_TIMEOUT = env.float('SCRAPE_LOCK_TIMEOUT', default=120)  # Redis lock TTL, bounds a crashed leader
+
+# Product cache entries are served fresh until the soft TTL, then served stale while a
+# background re-scrape refreshes them, and dropped by Redis at the hard TTL (see apps/product/product_cache.py)
+PRODUCT_CACHE_SOFT_TTL = env.int('PRODUCT_CACHE_SOFT_TTL', default=60*60)
+PRODUCT_CACHE_HARD_TTL = env.int('PRODUCT_CACHE_HARD_TTL', default=60*60*12)
+PRODUCT_CACHE_REFRESH_WORKERS = env.int('PRODUCT_CACHE_REFRESH_WORKERS', default=2)  # refresh threads per process
+PRODUCT_CACHE_REFRESH_TIMEOUT = env.int('PRODUCT_CACHE_REFRESH_TIMEOUT', default=60*5)  # retry a failed refresh after
+PRODUCT_L1_CACHE_SIZE = env.int('PRODUCT_L1_CACHE_SIZE', default=1000)  # in-process entries per worker, 0 disables
+PRODUCT_L1_CACHE_TTL = env.int('PRODUCT_L1_CACHE_TTL', default=30)  # upper bound on a missed invalidation
+PRODUCT_NEGATIVE_CACHE_TTL = env.int('PRODUCT_NEGATIVE_CACHE_TTL', default=60*15)  # don't re-scrape missing/incomplete products for
+PRODUCT_NEGATIVE_CACHE_CAPTCHA_TTL = env.int('PRODUCT_NEGATIVE_CACHE_CAPTCHA_TTL', default=60)  # nor a failed CAPTCHA
+
+# Background scrape jobs (see apps/product/jobs.py, run workers with `manage.py run_scrape_workers`)
+PRODUCT_ASYNC_SCRAPE = env.bool('PRODUCT_ASYNC_SCRAPE', default=False)  # answer misses with 202 + job id
+SCRAPE_WORKERS = env.int('SCRAPE_WORKERS', default=4)  # jobs run concurrently per worker process
+SCRAPE_JOB_TIMEOUT = env.int('SCRAPE_JOB_TIMEOUT', default=60*10)  # unfinished jobs expire after this
+SCRAPE_JOB_RESULT_TTL = env.int('SCRAPE_JOB_RESULT_TTL', default=60*60)  # finished jobs can be polled this long
+
+# Batch lookup endpoint
+PRODUCT_BATCH_MAX_SIZE = env.int('PRODUCT_BATCH_MAX_SIZE', default=100)  # product_ids per request
+PRODUCT_BATCH_SCRAPE_WORKERS = env.int('PRODUCT_BATCH_SCRAPE_WORKERS', default=4)  # concurrent scrapes per request
+
+# Background refresh of stored products (see apps/product/management/commands/refresh_products.py)
+PRODUCT_REFRESH_BUDGET = env.int('PRODUCT_REFRESH_BUDGET', default=30)  # scrapes per minute across schedulers
+PRODUCT_REFRESH_MIN_AGE = env.int('PRODUCT_REFRESH_MIN_AGE', default=PRODUCT_CACHE_SOFT_TTL)  # seconds since the last scrape
+PRODUCT_REFRESH_BACKOFF = env.int('PRODUCT_REFRESH_BACKOFF', default=60*30)  # skip a product whose refresh failed for
+PRODUCT_POPULARITY_WINDOW = env.int('PRODUCT_POPULARITY_WINDOW', default=24)  # hours of request counts
+PRODUCT_POPULARITY_FLUSH_INTERVAL = env.int('PRODUCT_POPULARITY_FLUSH_INTERVAL', default=5)  # seconds between writes to Redis
+
+# Product list endpoint (keyset pagination, see apps/product/api/v1/pagination.py)
+PRODUCT_LIST_PAGE_SIZE = env.int('PRODUCT_LIST_PAGE_SIZE', default=50)
+PRODUCT_LIST_MAX_PAGE_SIZE = env.int('PRODUCT_LIST_MAX_PAGE_SIZE', default=200)  # largest ?page_size=
+
+# Price and rating history endpoint (see apps/product/history.py)
+PRODUCT_HISTORY_DEFAULT_RANGE = env.int('PRODUCT_HISTORY_DEFAULT_RANGE', default=60*60*24*30)  # seconds before `until` without `since`
+PRODUCT_HISTORY_MAX_POINTS = env.int('PRODUCT_HISTORY_MAX_POINTS', default=1000)  # buckets per response
+
+# Per-stage timings of each request in a Server-Timing header (see apps/product/timing.py)
+SERVER_TIMING_HEADER = env.bool('SERVER_TIMING_HEADER', default=True)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -164,6 +269,20 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Collected with `manage.py collectstatic` (the Dockerfile does) for WhiteNoise to serve, or
+# the reverse proxy under ASGI
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Content-hashed names, pre-compressed copies (gzip, brotli when installed)
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
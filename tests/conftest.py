@@ -0,0 +1,32 @@
+import pytest
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    """
+    Swap the Redis cache for an in-memory one so a test doesn't need a Redis server.
+    """
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    from django.core.cache import cache
+    from apps.product import product_cache
+    cache.clear()
+    # Start each test with an empty in-process L1 as well
+    product_cache._local = None
+    yield cache
+    cache.clear()
+    product_cache._local = None
+
+
+@pytest.fixture(autouse=True)
+def static_storage(settings):
+    """
+    Serve static files by their plain names, the manifest only exists after collectstatic.
+    """
+    settings.STORAGES = {
+        **settings.STORAGES,
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }
@@ -0,0 +1,98 @@
+import requests
+
+from apps.product.captcha import CachingSolver, SessionCookies, StubSolver, captcha_form, image_hash
+from apps.product.fetchers import HttpFetcher
+from tests.test_fetchers import PRODUCT_PAGE
+
+CAPTCHA_PAGE = '''
+<html><body>
+<form method="get" action="/errors/validateCaptcha" name="">
+  <input type=hidden name="amzn" value="abc123" /><input type=hidden name="amzn-r" value="/dp/B09B8V1LZ3" />
+  <div class="a-row a-text-center"><img src="https://images-na.ssl-images-amazon.com/captcha/x/Captcha_abc.jpg"></div>
+  <input id="captchacharacters" name="field-keywords" type="text">
+  <span class="a-button-text"><button type="submit">Continue shopping</button></span>
+</form>
+</body></html>
+'''
+
+IMAGE = b'captcha image'
+
+
+class FakeResponse:
+    def __init__(self, text='', content=b'', url='https://www.amazon.com/dp/B09B8V1LZ3', status_code=200):
+        self.text = text
+        self.content = content
+        self.url = url
+        self.status_code = status_code
+        self.ok = status_code < 400
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    """
+    Shows the CAPTCHA until the right answer was submitted, then sets a cookie.
+    """
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.requests = []
+
+    def get(self, url, timeout=None, params=None):
+        self.requests.append((url, params))
+        if url.endswith('.jpg'):
+            return FakeResponse(content=IMAGE)
+        if url.endswith('/errors/validateCaptcha'):
+            if params['field-keywords'] != self.answer:
+                return FakeResponse(CAPTCHA_PAGE)
+            self.cookies.set('session-token', 'trusted', domain='.amazon.com', path='/')
+        if 'session-token' in self.cookies:
+            return FakeResponse(PRODUCT_PAGE)
+        return FakeResponse(CAPTCHA_PAGE)
+
+
+def test_captcha_form():
+    action, fields, image_url = captcha_form(CAPTCHA_PAGE)
+    assert action == '/errors/validateCaptcha'
+    assert fields == {'amzn': 'abc123', 'amzn-r': '/dp/B09B8V1LZ3'}
+    assert image_url.endswith('Captcha_abc.jpg')
+    assert captcha_form(PRODUCT_PAGE) is None
+
+
+def test_solutions_are_cached_until_rejected(locmem_cache):
+    stub = StubSolver(answers={image_hash(IMAGE): 'KXMHPE'})
+    solver = CachingSolver(stub)
+    assert solver.solve(IMAGE) == 'KXMHPE'
+    assert solver.solve(IMAGE) == 'KXMHPE'
+    assert stub.calls == 1
+
+    solver.reject(IMAGE)
+    solver.solve(IMAGE)
+    assert stub.calls == 2
+
+
+def test_http_tier_solves_captcha_and_shares_cookies(locmem_cache):
+    cookies = SessionCookies()
+    fetcher = HttpFetcher(solver=CachingSolver(StubSolver(default='KXMHPE')), cookies=cookies)
+    fetcher.session = FakeSession('KXMHPE')
+
+    assert fetcher.fetch('B09B8V1LZ3') == PRODUCT_PAGE
+    assert fetcher.session.requests[-1] == (
+        'https://www.amazon.com/errors/validateCaptcha',
+        {'amzn': 'abc123', 'amzn-r': '/dp/B09B8V1LZ3', 'field-keywords': 'KXMHPE'},
+    )
+    assert [cookie['name'] for cookie in cookies.load()['cookies']] == ['session-token']
+
+    # Another worker's session starts with the trusted cookies and needs no solve
+    other = HttpFetcher(solver=StubSolver(), cookies=cookies)
+    other.session = FakeSession('KXMHPE')
+    assert other.fetch('B09B8V1LZ3') == PRODUCT_PAGE
+    assert len(other.session.requests) == 1
+
+
+def test_rejected_solution_falls_back_to_the_captcha_page(locmem_cache):
+    fetcher = HttpFetcher(solver=CachingSolver(StubSolver(default='WRONG')), cookies=SessionCookies())
+    fetcher.session = FakeSession('KXMHPE')
+    assert fetcher.fetch('B09B8V1LZ3') == CAPTCHA_PAGE
@@ -0,0 +1,57 @@
+import pickle
+
+from rest_framework.utils.serializer_helpers import ReturnDict
+
+from apps.product import codec, product_cache
+from apps.product.codec import CacheSerializer
+
+
+def product_entry(name="Echo Dot (5th Gen)"):
+    data = ReturnDict({
+        'product_id': 'B09B8V1LZ3',
+        'name': name,
+        'price': '49.99',
+        'rating': '1,234',
+        'average_score': 4.7,
+    }, serializer=None)
+    return product_cache._entry(data)
+
+
+def stored(entry):
+    return {key: value for key, value in entry.items() if key != 'data'}
+
+
+def test_product_entries_round_trip_in_binary():
+    serializer = CacheSerializer({})
+    entry = product_entry("Écho Dot — 5th Gen")
+    encoded = serializer.dumps(entry)
+
+    assert encoded[0] == codec.VERSION
+    assert len(encoded) < len(pickle.dumps(entry))
+    decoded = serializer.loads(encoded)
+    assert decoded == stored(entry)
+    assert product_cache._unwrap(decoded) == (entry['data'], product_cache.HIT)
+
+
+def test_long_entries_are_compressed():
+    serializer = CacheSerializer({})
+    entry = product_entry("Sheet Set " * 60)
+    encoded = serializer.dumps(entry)
+
+    assert encoded[1] & codec.COMPRESSED
+    assert serializer.loads(encoded) == stored(entry)
+
+
+def test_other_values_are_pickled():
+    serializer = CacheSerializer({})
+    incomplete = {'data': {'product_id': 'B09B8V1LZ3', 'name': None}, 'soft_expires': 1.0}
+    for value in ('not_found', {'version': 1.0, 'cookies': []}, incomplete, [1, 2]):
+        encoded = serializer.dumps(value)
+        assert encoded[:1] == b'\x80'
+        assert serializer.loads(encoded) == value
+
+
+def test_unknown_version_is_a_miss():
+    encoded = bytearray(CacheSerializer({}).dumps(product_entry()))
+    encoded[0] = codec.VERSION + 1
+    assert CacheSerializer({}).loads(bytes(encoded)) is None
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import pytest
+
+from apps.product.parsers import EXTRACTORS, get_extractor, product_fields
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+EXPECTED = {
+    'product_id': 'B0CHX5ZQ9X',
+    'name': 'OtterBox iPhone 15 Pro MAX (Only) Commuter Series Case - CRISP DENIM (Blue), slim & tough, '
+            'pocket-friendly, with port protection',
+    'price': '38.54',
+    'rating': '354',
+    'rating_count': 354,
+    'average_score': '4.6',
+}
+
+
+@pytest.mark.parametrize('name', sorted(EXTRACTORS))
+def test_extractors_read_product_page(name):
+    page = (FIXTURES / 'product_page.html').read_text()
+    assert get_extractor(name).extract(page, 'B0CHX5ZQ9X') == EXPECTED
+
+
+@pytest.mark.parametrize('name', sorted(EXTRACTORS))
+@pytest.mark.parametrize('page', [
+    '',
+    '<html><body><form method="get" action="/errors/validateCaptcha"></form></body></html>',
+    # Elements present but not matching the tag/class filters
+    '<div id="productTitle">x</div><span id="acrPopover" class="other" title="4.6 out of 5 stars"></span>'
+    '<span id="acrCustomerReviewText" class="a-size-large">9 ratings</span>',
+])
+def test_extractors_agree_on_pages_without_product(name, page):
+    assert get_extractor(name).extract(page, 'B0CHX5ZQ9X') == get_extractor('soup').extract(page, 'B0CHX5ZQ9X')
+
+
+@pytest.mark.parametrize('text, count', [
+    ('1,234 ratings', 1234),
+    ('1.234 Sternebewertungen', 1234),
+    ('1 rating', 1),
+    ('ratings', None),
+    (None, None),
+])
+def test_rating_count_is_parsed(text, count):
+    assert product_fields('B0CHX5ZQ9X', 'Case', '38.54', text, '4.6 out of 5 stars')['rating_count'] == count
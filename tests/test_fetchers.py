@@ -0,0 +1,104 @@
+import requests
+
+from apps.product.fetchers import TieredFetcher, ProductNotFound, captchas_total, escalations_total, is_captcha_page
+
+PRODUCT_PAGE = '''
+<html><body>
+<span id="productTitle" class="a-size-large product-title-word-break"> Echo Dot (5th Gen) </span>
+<input type="hidden" id="twister-plus-price-data-price" value="49.99" />
+<span id="acrPopover" class="reviewCountTextLinkedHistogram noUnderline" title="4.7 out of 5 stars"></span>
+<span id="acrCustomerReviewText" class="a-size-base">1,234 ratings</span>
+</body></html>
+'''
+
+CAPTCHA_PAGE = '<html><form method="get" action="/errors/validateCaptcha"></form></html>'
+
+
+class FakeTier:
+    def __init__(self, tier, page=None, error=None):
+        self.tier = tier
+        self.page = page
+        self.error = error
+        self.calls = 0
+
+    def fetch(self, product_id):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.page
+
+
+def test_complete_http_page_is_not_escalated():
+    http, selenium = FakeTier('http', PRODUCT_PAGE), FakeTier('selenium', PRODUCT_PAGE)
+    product = TieredFetcher([http, selenium]).fetch_product('B09B8V1LZ3')
+    assert product == {
+        'product_id': 'B09B8V1LZ3',
+        'name': 'Echo Dot (5th Gen)',
+        'price': '49.99',
+        'rating': '1,234',
+        'rating_count': 1234,
+        'average_score': '4.7',
+    }
+    assert selenium.calls == 0
+
+
+def test_captcha_page_escalates_to_selenium():
+    before = escalations_total.value(reason='captcha')
+    http, selenium = FakeTier('http', CAPTCHA_PAGE), FakeTier('selenium', PRODUCT_PAGE)
+    product = TieredFetcher([http, selenium]).fetch_product('B09B8V1LZ3')
+    assert product['name'] == 'Echo Dot (5th Gen)'
+    assert selenium.calls == 1
+    assert escalations_total.value(reason='captcha') == before + 1
+
+
+def test_product_page_mentioning_captcha_is_not_a_captcha_page():
+    page = PRODUCT_PAGE.replace('</body>', '''
+<div class="captcha-free-checkout"></div>
+<script>window.ue && ue.count("captchaShown", 0);</script>
+<span class="review-text">No captcha nonsense when I set it up.</span>
+</body>''')
+    escalated, captchas = escalations_total.value(reason='captcha'), captchas_total.value(tier='http')
+    http, selenium = FakeTier('http', page), FakeTier('selenium', PRODUCT_PAGE)
+
+    assert TieredFetcher([http, selenium]).fetch_product('B09B8V1LZ3')['name'] == 'Echo Dot (5th Gen)'
+    assert selenium.calls == 0
+    assert escalations_total.value(reason='captcha') == escalated
+    assert captchas_total.value(tier='http') == captchas
+    assert not is_captcha_page(page)
+    assert is_captcha_page(CAPTCHA_PAGE)
+    assert is_captcha_page('<input autocomplete="off" id="captchacharacters" name="field-keywords">')
+
+def test_page_without_reviews_is_complete():
+    # A new listing: no rating count and no average score on the page
+    page = '''
+<html><body>
+<span id="productTitle" class="a-size-large product-title-word-break"> Echo Pop </span>
+<input type="hidden" id="twister-plus-price-data-price" value="39.99" />
+</body></html>
+'''
+    escalated = escalations_total.value(reason='incomplete')
+    http, selenium = FakeTier('http', page), FakeTier('selenium', PRODUCT_PAGE)
+
+    product = TieredFetcher([http, selenium]).fetch_product('B09ZX1MS7H')
+    assert product == {
+        'product_id': 'B09ZX1MS7H',
+        'name': 'Echo Pop',
+        'price': '39.99',
+        'rating': None,
+        'rating_count': None,
+        'average_score': None,
+    }
+    assert selenium.calls == 0
+    assert escalations_total.value(reason='incomplete') == escalated
+
+def test_incomplete_and_failed_http_fetches_escalate():
+    for http in (FakeTier('http', '<html></html>'), FakeTier('http', error=requests.ConnectionError())):
+        selenium = FakeTier('selenium', PRODUCT_PAGE)
+        assert TieredFetcher([http, selenium]).fetch_product('B09B8V1LZ3')['price'] == '49.99'
+        assert selenium.calls == 1
+
+
+def test_not_found_is_not_escalated():
+    http, selenium = FakeTier('http', error=ProductNotFound()), FakeTier('selenium', PRODUCT_PAGE)
+    assert TieredFetcher([http, selenium]).fetch_product('B09B8V1LZ3') is None
+    assert selenium.calls == 0
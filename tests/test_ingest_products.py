@@ -0,0 +1,40 @@
+import pytest
+from django.core.management import call_command
+
+from apps.product import product_cache
+from apps.product.models import Product
+
+PRODUCTS = {
+    'B0CHX5ZQ9X': {'product_id': 'B0CHX5ZQ9X', 'name': 'Case', 'price': '38.54', 'rating': '354', 'rating_count': 354, 'average_score': '4.6'},
+    'B0CHX5ZQ9Y': {'product_id': 'B0CHX5ZQ9Y', 'name': 'Cable', 'price': '9.99', 'rating': '12', 'rating_count': 12, 'average_score': '4.1'},
+}
+
+
+class FakeFetcher:
+    def __init__(self):
+        self.fetched = []
+
+    def fetch_product(self, product_id):
+        self.fetched.append(product_id)
+        return PRODUCTS.get(product_id)
+
+
+@pytest.mark.django_db
+def test_ingest_stores_caches_and_resumes(locmem_cache, monkeypatch, tmp_path):
+    fetcher = FakeFetcher()
+    monkeypatch.setattr('apps.product.management.commands.ingest_products.get_fetcher', lambda: fetcher)
+    source = tmp_path / 'asins.csv'
+    source.write_text('asin,note\nB0CHX5ZQ9X,a\nB0AAAAAAAA,gone\nB0CHX5ZQ9X,dup\n')
+
+    call_command('ingest_products', str(source), batch_size=1)
+
+    assert Product.objects.get(product_id='B0CHX5ZQ9X').name == 'Case'
+    assert product_cache.get('B0CHX5ZQ9X')[1] == product_cache.HIT
+    assert product_cache.get_negative('B0AAAAAAAA') == product_cache.NOT_FOUND
+    assert sorted(fetcher.fetched) == ['B0AAAAAAAA', 'B0CHX5ZQ9X']
+
+    # A rerun with more ASINs only fetches the new one
+    source.write_text(source.read_text() + 'B0CHX5ZQ9Y\n')
+    call_command('ingest_products', str(source))
+    assert fetcher.fetched[2:] == ['B0CHX5ZQ9Y']
+    assert Product.objects.count() == 2
@@ -0,0 +1,122 @@
+import threading
+
+import fakeredis
+import pytest
+from rest_framework.test import APIRequestFactory
+
+from apps.product import jobs
+from apps.product.api.v1.views import ProductDetailAPIView, ScrapeJobAPIView
+from apps.product.jobs import ScrapeJobQueue, job_key, product_job_key
+from apps.product.lookup import ProductLookup, ProductLookupError
+from apps.product.management.commands.run_scrape_workers import Command
+
+PRODUCT = {'product_id': 'B0CHX5ZQ9X', 'name': 'Case', 'price': '38.54', 'rating': '354', 'average_score': 4.6}
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    """
+    An in-memory Redis for the job queue.
+    """
+    connection = fakeredis.FakeRedis()
+    monkeypatch.setattr(jobs, 'get_redis_connection', lambda alias: connection)
+    return connection
+
+
+def test_enqueue_deduplicates_unfinished_jobs(redis):
+    queue = ScrapeJobQueue()
+    job_id, created = queue.enqueue('B0CHX5ZQ9X')
+    assert created
+    assert queue.enqueue('B0CHX5ZQ9X') == (job_id, False)
+    assert queue.enqueue('B0AAAAAAAA')[1]
+
+    assert redis.llen(jobs.QUEUE_KEY) == 2
+    assert queue.get(job_id)['state'] == jobs.QUEUED
+
+
+def test_pop_complete_and_fail(redis, settings):
+    queue = ScrapeJobQueue()
+    job_id, _ = queue.enqueue('B0CHX5ZQ9X')
+
+    assert queue.pop(timeout=1) == (job_id, 'B0CHX5ZQ9X')
+    assert queue.get(job_id)['state'] == jobs.RUNNING
+    assert 0 < redis.ttl(job_key(job_id)) <= settings.SCRAPE_JOB_TIMEOUT
+
+    queue.complete(job_id, 'B0CHX5ZQ9X', PRODUCT, 201)
+    job = queue.get(job_id)
+    assert (job['state'], job['status_code'], job['result']) == (jobs.DONE, 201, PRODUCT)
+    assert 0 < redis.ttl(job_key(job_id)) <= settings.SCRAPE_JOB_RESULT_TTL
+    # The next miss gets a fresh job
+    assert not redis.exists(product_job_key('B0CHX5ZQ9X'))
+
+    failed_id, _ = queue.enqueue('B0CHX5ZQ9X')
+    assert failed_id != job_id
+    queue.pop(timeout=1)
+    queue.fail(failed_id, 'B0CHX5ZQ9X', "Product not found", 404)
+    job = queue.get(failed_id)
+    assert (job['state'], job['status_code'], job['result']) == (jobs.FAILED, 404, "Product not found")
+
+
+def test_expired_job_is_not_resurrected(redis):
+    queue = ScrapeJobQueue()
+    job_id, _ = queue.enqueue('B0CHX5ZQ9X')
+    redis.delete(job_key(job_id))
+
+    assert queue.pop(timeout=1) is None
+    assert not redis.exists(job_key(job_id))
+    assert queue.get(job_id) is None
+
+
+def test_miss_is_answered_with_a_job_to_poll(redis, locmem_cache, monkeypatch):
+    monkeypatch.setattr(ProductLookup, 'check_database', lambda self, product_id: None)
+    monkeypatch.setattr(ProductDetailAPIView, 'filter_queryset', lambda self, queryset: queryset)
+
+    request = APIRequestFactory().get('/api/v1/product/', {'product_id': 'B0CHX5ZQ9X'}, HTTP_PREFER='respond-async')
+    response = ProductDetailAPIView.as_view()(request)
+
+    assert response.status_code == 202
+    job_id = response.data['job_id']
+    assert response['Location'] == f'http://testserver/api/v1/product/jobs/{job_id}/'
+    assert response.data['status_url'] == response['Location']
+    assert ScrapeJobQueue().get(job_id)['product_id'] == 'B0CHX5ZQ9X'
+
+
+def test_job_status(redis):
+    queue = ScrapeJobQueue()
+    job_id, _ = queue.enqueue('B0CHX5ZQ9X')
+
+    def poll(job_id):
+        request = APIRequestFactory().get(f'/api/v1/product/jobs/{job_id}/')
+        return ScrapeJobAPIView.as_view()(request, job_id=job_id)
+
+    response = poll(job_id)
+    assert (response.status_code, response.data['state']) == (202, jobs.QUEUED)
+
+    queue.pop(timeout=1)
+    queue.complete(job_id, 'B0CHX5ZQ9X', PRODUCT, 201)
+    response = poll(job_id)
+    assert (response.status_code, response.data['data']) == (201, PRODUCT)
+
+    assert poll('unknown').status_code == 404
+
+
+def test_scrape_workers_run_queued_jobs(redis, monkeypatch):
+    queue = ScrapeJobQueue()
+    found_id, _ = queue.enqueue('B0CHX5ZQ9X')
+    missing_id, _ = queue.enqueue('B0AAAAAAAA')
+    command = Command()
+    command.stopping = threading.Event()
+
+    def scrape_product(self, product_id):
+        if product_id == 'B0AAAAAAAA':
+            # The last job, let the worker loop end
+            command.stopping.set()
+            raise ProductLookupError("Product not found", 404)
+        return PRODUCT, 201
+
+    monkeypatch.setattr(ProductLookup, 'scrape_product', scrape_product)
+    command.work()
+
+    assert queue.get(found_id)['state'] == jobs.DONE
+    assert queue.get(found_id)['result'] == PRODUCT
+    assert (queue.get(missing_id)['state'], queue.get(missing_id)['status_code']) == (jobs.FAILED, 404)
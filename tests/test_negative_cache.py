@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+from rest_framework.test import APIRequestFactory
+
+from apps.product import product_cache
+from apps.product.api.v1.views import ProductDetailAPIView
+from apps.product.fetchers import CaptchaFailed
+from apps.product.lookup import ProductLookup, ProductLookupError
+
+
+@pytest.fixture
+def scrapes(locmem_cache, monkeypatch):
+    """
+    Product lookups with no database, recording every scrape.
+    """
+    scraped = []
+    monkeypatch.setattr(ProductLookup, 'check_database', lambda self, product_id: None)
+    monkeypatch.setattr(ProductLookup, 'scrape_amazon_product', lambda self, product_id: scraped.append(product_id))
+    return scraped
+
+
+def test_missing_product_is_not_scraped_again(scrapes):
+    for cached in (False, True):
+        with pytest.raises(ProductLookupError) as error:
+            ProductLookup().lookup_product('B0AAAAAAAA')
+        assert (error.value.status_code, error.value.reason, error.value.cached) == (404, 'not_found', cached)
+    assert scrapes == ['B0AAAAAAAA']
+
+
+class WorkerLock:
+    """
+    Stands in for scrape_flight across workers: no shared result, callers
+    take the lock in turn once all of them have missed.
+    """
+
+    def __init__(self, workers):
+        self.missed = threading.Barrier(workers)
+        self.lock = threading.Lock()
+
+    def do(self, key, fn):
+        self.missed.wait(5)
+        with self.lock:
+            return fn()
+
+
+def test_concurrent_misses_in_other_workers_are_not_scraped_again(scrapes, monkeypatch):
+    monkeypatch.setattr('apps.product.lookup.scrape_flight', WorkerLock(3))
+    errors = []
+
+    def lookup():
+        try:
+            ProductLookup().lookup_product('B0AAAAAAAA')
+        except ProductLookupError as e:
+            errors.append((e.status_code, e.cached))
+
+    threads = [threading.Thread(target=lookup) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert scrapes == ['B0AAAAAAAA']
+    assert sorted(errors) == [(404, False), (404, True), (404, True)]
+
+
+def test_incomplete_product_is_negatively_cached(scrapes, monkeypatch):
+    incomplete = {'product_id': 'B0AAAAAAAA', 'name': None, 'price': None, 'rating': None, 'average_score': None}
+    monkeypatch.setattr(ProductLookup, 'scrape_amazon_product', lambda self, product_id: incomplete)
+    with pytest.raises(ProductLookupError):
+        ProductLookup().lookup_product('B0AAAAAAAA')
+    assert product_cache.get_negative('B0AAAAAAAA') == product_cache.INCOMPLETE
+
+
+def test_failed_captcha_has_its_own_ttl(scrapes, monkeypatch, settings):
+    ttls = []
+    monkeypatch.setattr(product_cache.cache, 'set', lambda key, value, timeout: ttls.append(timeout))
+
+    def fail(self, product_id):
+        raise CaptchaFailed(product_id)
+
+    monkeypatch.setattr(ProductLookup, 'scrape_amazon_product', fail)
+    with pytest.raises(ProductLookupError) as error:
+        ProductLookup().lookup_product('B0AAAAAAAA')
+    assert error.value.status_code == 503
+    assert ttls == [settings.PRODUCT_NEGATIVE_CACHE_CAPTCHA_TTL]
+
+
+def test_delete_clears_negative_entry(locmem_cache):
+    product_cache.set_negative('B0AAAAAAAA', product_cache.NOT_FOUND)
+    product_cache.delete('B0AAAAAAAA')
+    assert product_cache.get_negative('B0AAAAAAAA') is None
+
+
+def test_reason_is_in_response_headers(scrapes, monkeypatch):
+    monkeypatch.setattr(ProductDetailAPIView, 'filter_queryset', lambda self, queryset: queryset)
+    product_cache.set_negative('B0AAAAAAAA', product_cache.NOT_FOUND)
+
+    request = APIRequestFactory().get('/api/v1/product/', {'product_id': 'B0AAAAAAAA'})
+    response = ProductDetailAPIView.as_view()(request)
+
+    assert response.status_code == 404
+    assert response['X-Product-Error'] == 'not_found'
+    assert response['X-Negative-Cache'] == 'hit'
+    assert scrapes == []
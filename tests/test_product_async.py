@@ -0,0 +1,92 @@
+import asyncio
+import json
+import threading
+
+import fakeredis
+from django.core.cache import cache
+from django.test import AsyncRequestFactory
+from django_redis.cache import RedisCache
+
+from apps.product import product_cache
+from apps.product.api.v1.views import ProductAsyncView
+from apps.product.lookup import ProductLookup
+
+PRODUCT = {'product_id': 'B0CHX5ZQ9X', 'name': 'Case', 'price': '38.54', 'rating': '354', 'average_score': 4.6}
+
+
+def get_product(product_id):
+    request = AsyncRequestFactory().get('/api/v1/product/async/', {'product_id': product_id})
+    return asyncio.run(ProductAsyncView.as_view()(request))
+
+
+def test_cached_product(locmem_cache):
+    product_cache.set('B0CHX5ZQ9X', PRODUCT)
+    response = get_product('B0CHX5ZQ9X')
+    assert response.status_code == 200
+    assert json.loads(response.content) == {'status': 'success', 'data': PRODUCT}
+
+
+def test_invalid_product_id(locmem_cache):
+    response = get_product('not-an-asin')
+    assert response.status_code == 400
+    assert 'product_id' in json.loads(response.content)
+
+
+def test_concurrent_lookups_share_one_scrape(locmem_cache, monkeypatch):
+    scrapes = []
+    release = threading.Event()
+
+    async def not_in_database(self, product_id):
+        return None
+
+    def scrape_product(self, product_id):
+        scrapes.append(product_id)
+        release.wait(5)
+        return PRODUCT, 201
+
+    monkeypatch.setattr(ProductLookup, 'acheck_database', not_in_database)
+    monkeypatch.setattr(ProductLookup, 'scrape_product', scrape_product)
+    monkeypatch.setattr('apps.product.lookup.connection.close', lambda: None)
+
+    async def lookups():
+        pending = [asyncio.ensure_future(ProductLookup().alookup_product('B0CHX5ZQ9X')) for _ in range(20)]
+        await asyncio.sleep(0.1)
+        release.set()
+        return await asyncio.gather(*pending)
+
+    assert asyncio.run(lookups()) == [(PRODUCT, 201)] * 20
+    assert scrapes == ['B0CHX5ZQ9X']
+
+
+def test_redis_cache_is_read_with_the_asyncio_client(monkeypatch, settings):
+    settings.PRODUCT_L1_CACHE_SIZE = 0
+    monkeypatch.setattr(product_cache, '_local', None)
+    clients = []
+
+    def from_url(url):
+        clients.append(fakeredis.FakeAsyncRedis())
+        return clients[-1]
+
+    def sync_fallback(*args, **kwargs):
+        raise AssertionError("went through the cache backend's thread")
+
+    monkeypatch.setattr(product_cache.redis.asyncio, 'from_url', from_url)
+    for name in ('aget', 'aset', 'aadd'):
+        monkeypatch.setattr(RedisCache, name, sync_fallback)
+
+    async def lookups():
+        await product_cache.aset('B0CHX5ZQ9X', PRODUCT)
+        stored = await clients[0].exists(cache.client.make_key(product_cache.product_cache_key('B0CHX5ZQ9X')))
+        return (
+            stored,
+            await product_cache.aget('B0CHX5ZQ9X'),
+            await product_cache.aget_negative('B0CHX5ZQ9X'),
+            [await product_cache.aclaim_refresh('B0CHX5ZQ9X') for _ in range(2)],
+        )
+
+    stored, cached, negative, claims = asyncio.run(lookups())
+    assert stored
+    assert cached == (PRODUCT, product_cache.HIT)
+    assert negative is None
+    assert claims == [True, False]
+    assert len(clients) == 1
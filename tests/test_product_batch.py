@@ -0,0 +1,48 @@
+from rest_framework.test import APIRequestFactory
+
+from apps.product.api.v1.views import ProductBatchAPIView
+from apps.product import product_cache
+
+PRODUCT = {
+    'product_id': 'B0CHX5ZQ9X',
+    'name': 'OtterBox iPhone 15 Pro MAX Commuter Series Case',
+    'price': '38.54',
+    'rating': '354',
+    'average_score': 4.6,
+}
+
+
+def post_batch(product_ids):
+    request = APIRequestFactory().post('/api/v1/product/batch/', {'product_ids': product_ids}, format='json')
+    response = ProductBatchAPIView.as_view()(request)
+    response.render()
+    return response
+
+
+def test_batch_returns_a_result_per_product(locmem_cache):
+    product_cache.set('B0CHX5ZQ9X', PRODUCT)
+
+    response = post_batch(['B0CHX5ZQ9X', 'not-an-asin', 'B0CHX5ZQ9X'])
+
+    assert response.status_code == 200
+    results = response.data['data']
+    assert list(results) == ['B0CHX5ZQ9X', 'not-an-asin']
+    assert results['B0CHX5ZQ9X'] == {'status': 'success', 'code': 200, 'data': PRODUCT}
+    assert results['not-an-asin']['status'] == 'error'
+    assert results['not-an-asin']['code'] == 400
+
+
+def test_batch_size_is_limited(locmem_cache):
+    response = post_batch([f'B0000000{n:02d}' for n in range(101)])
+    assert response.status_code == 400
+    assert post_batch([]).status_code == 400
+
+
+def test_batch_skips_negatively_cached_products(locmem_cache):
+    product_cache.set_negative('B0AAAAAAAA', product_cache.NOT_FOUND)
+
+    response = post_batch(['B0AAAAAAAA'])
+
+    assert response.data['data']['B0AAAAAAAA'] == {
+        'status': 'error', 'code': 404, 'message': 'Product not found', 'reason': 'not_found', 'negative_cache': 'hit',
+    }
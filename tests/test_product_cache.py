@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from apps.product import product_cache
+from apps.product.lookup import ProductLookup
+
+PRODUCT = {'product_id': 'B0CHX5ZQ9X', 'name': 'Case', 'price': '38.54', 'rating': '354', 'average_score': 4.6}
+
+
+def test_fresh_entry_is_a_hit(locmem_cache):
+    product_cache.set('B0CHX5ZQ9X', PRODUCT)
+    assert product_cache.get('B0CHX5ZQ9X') == (PRODUCT, product_cache.HIT)
+    assert product_cache.get('B0AAAAAAAA') == (None, product_cache.MISS)
+
+
+def test_entry_past_soft_ttl_is_stale(locmem_cache, settings):
+    scraped_at = timezone.now() - timedelta(seconds=settings.PRODUCT_CACHE_SOFT_TTL + 1)
+    product_cache.set('B0CHX5ZQ9X', PRODUCT, scraped_at)
+    assert product_cache.get('B0CHX5ZQ9X') == (PRODUCT, product_cache.STALE)
+
+
+class ImmediateExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+def test_stale_hit_triggers_one_refresh(locmem_cache, settings, monkeypatch):
+    refreshed = []
+    monkeypatch.setattr('apps.product.lookup.get_refresh_executor', ImmediateExecutor)
+    monkeypatch.setattr(ProductLookup, 'refresh_product', lambda self, product_id: refreshed.append(product_id))
+    scraped_at = timezone.now() - timedelta(seconds=settings.PRODUCT_CACHE_SOFT_TTL + 1)
+    product_cache.set('B0CHX5ZQ9X', PRODUCT, scraped_at)
+
+    lookup = ProductLookup()
+    assert lookup.check_cache('B0CHX5ZQ9X') == PRODUCT
+    assert lookup.check_cache('B0CHX5ZQ9X') == PRODUCT
+    assert refreshed == ['B0CHX5ZQ9X']
+
+
+def test_local_cache_evicts_least_recently_used():
+    local = product_cache.LocalCache(max_size=2, ttl=60)
+    local.set('a', 1)
+    local.set('b', 2)
+    assert local.get('a') == 1
+    local.set('c', 3)
+    assert (local.get('a'), local.get('b'), local.get('c')) == (1, None, 3)
+
+
+def test_local_cache_entries_expire(monkeypatch):
+    local = product_cache.LocalCache(max_size=2, ttl=30)
+    local.set('a', 1)
+    monkeypatch.setattr(product_cache.time, 'monotonic', lambda: float('inf'))
+    assert local.get('a') is None
+
+
+def test_hit_is_served_from_l1(locmem_cache):
+    product_cache.set('B0CHX5ZQ9X', PRODUCT)
+    # Gone from the shared cache, still in this process
+    locmem_cache.clear()
+    assert product_cache.get('B0CHX5ZQ9X') == (PRODUCT, product_cache.HIT)
+    assert product_cache.get_many(['B0CHX5ZQ9X']) == {'B0CHX5ZQ9X': (PRODUCT, product_cache.HIT)}
+
+
+def test_delete_clears_both_layers(locmem_cache):
+    product_cache.set('B0CHX5ZQ9X', PRODUCT)
+    product_cache.delete('B0CHX5ZQ9X')
+    assert product_cache.get('B0CHX5ZQ9X') == (None, product_cache.MISS)
+
+
+def test_l1_can_be_disabled(locmem_cache, settings):
+    settings.PRODUCT_L1_CACHE_SIZE = 0
+    product_cache.set('B0CHX5ZQ9X', PRODUCT)
+    locmem_cache.clear()
+    assert product_cache.get('B0CHX5ZQ9X') == (None, product_cache.MISS)
@@ -0,0 +1,101 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from django.test import RequestFactory
+from django.utils.http import http_date
+
+from apps.product import product_cache
+from apps.product.api.v1.views import ProductDetailAPIView
+from apps.product.lookup import ProductLookup
+
+PRODUCT = {'product_id': 'B0CHX5ZQ9X', 'name': 'Case', 'price': '38.54', 'rating': '354', 'average_score': 4.6}
+
+
+def get_product(product_id, **headers):
+    request = RequestFactory().get('/api/v1/product/', {'product_id': product_id}, **headers)
+    response = ProductDetailAPIView.as_view()(request)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def test_cache_hit_is_answered_with_the_cached_body(locmem_cache):
+    product_cache.set('B0CHX5ZQ9X', PRODUCT)
+
+    response = get_product('B0CHX5ZQ9X')
+
+    # Not a DRF Response: negotiation and rendering were skipped
+    assert not hasattr(response, 'data')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/json'
+    assert json.loads(response.content) == {'status': 'success', 'data': PRODUCT}
+    assert response['ETag'] == product_cache.etag(response.content)
+
+
+def test_if_none_match_gets_not_modified(locmem_cache):
+    product_cache.set('B0CHX5ZQ9X', PRODUCT)
+    etag = get_product('B0CHX5ZQ9X')['ETag']
+
+    response = get_product('B0CHX5ZQ9X', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response.content == b''
+    assert get_product('B0CHX5ZQ9X', HTTP_IF_NONE_MATCH='"other"').status_code == 200
+
+
+def test_browsable_api_and_invalid_ids_take_the_full_path(locmem_cache):
+    product_cache.set('B0CHX5ZQ9X', PRODUCT)
+
+    response = get_product('B0CHX5ZQ9X', HTTP_ACCEPT='text/html')
+    assert response.data == {'status': 'success', 'data': PRODUCT}
+    assert response['Content-Type'].startswith('text/html')
+
+    response = get_product('not-an-asin')
+    assert response.status_code == 400
+    assert hasattr(response, 'data')
+
+
+def test_cache_headers_follow_the_cache_ttls(locmem_cache, settings):
+    settings.PRODUCT_CACHE_SOFT_TTL = 3600
+    settings.PRODUCT_CACHE_HARD_TTL = 4 * 3600
+    scraped = datetime.now(timezone.utc) - timedelta(minutes=20)
+    product_cache.set('B0CHX5ZQ9X', PRODUCT, scraped)
+
+    response = get_product('B0CHX5ZQ9X')
+    assert response['Last-Modified'] == http_date(scraped.timestamp())
+    directives = dict(directive.partition('=')[::2] for directive in response['Cache-Control'].split(', '))
+    assert 'public' in directives
+    assert 2390 <= int(directives['max-age']) <= 2400
+    assert directives['stale-while-revalidate'] == '10800'
+
+    # Past the soft TTL it is stale: revalidate, or serve stale while doing so
+    product_cache.set('B0CHX5ZQ9X', PRODUCT, scraped - timedelta(hours=2))
+    locmem_cache.add(product_cache.refresh_key('B0CHX5ZQ9X'), 1)  # don't start a refresh
+    assert 'max-age=0' in get_product('B0CHX5ZQ9X')['Cache-Control']
+
+
+def test_if_modified_since_gets_not_modified(locmem_cache):
+    scraped = datetime.now(timezone.utc) - timedelta(minutes=20)
+    product_cache.set('B0CHX5ZQ9X', PRODUCT, scraped)
+
+    response = get_product('B0CHX5ZQ9X', HTTP_IF_MODIFIED_SINCE=http_date(scraped.timestamp()))
+    assert response.status_code == 304
+    assert response['Cache-Control'].startswith('public')
+    assert get_product('B0CHX5ZQ9X', HTTP_IF_MODIFIED_SINCE=http_date(scraped.timestamp() - 60)).status_code == 200
+
+
+def test_looked_up_products_get_the_same_validators(locmem_cache, monkeypatch):
+    def scrape_product(self, product_id):
+        product_cache.set(product_id, PRODUCT)
+        return PRODUCT, 201
+
+    monkeypatch.setattr(ProductLookup, 'check_database', lambda self, product_id: None)
+    monkeypatch.setattr(ProductLookup, 'scrape_product', scrape_product)
+
+    scraped = get_product('B0CHX5ZQ9X')
+    assert scraped.status_code == 201
+    assert json.loads(scraped.content) == {'status': 'success', 'data': PRODUCT}
+
+    cached = get_product('B0CHX5ZQ9X')
+    assert cached.status_code == 200
+    assert cached['ETag'] == scraped['ETag']
+    assert cached['Last-Modified'] == scraped['Last-Modified']
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.test import RequestFactory
+
+from apps.product import history
+from apps.product.api.v1.serializers import ProductHistoryQuerySerializer
+from apps.product.api.v1.views import ProductHistoryAPIView
+from apps.product.models import Product, ProductObservation
+
+START = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def query(**params):
+    serializer = ProductHistoryQuerySerializer(data={'product_id': 'B0CHX5ZQ9X', **params})
+    return serializer.validated_data if serializer.is_valid() else serializer.errors
+
+
+def test_history_query_defaults_to_max_points_over_the_default_range(settings):
+    settings.PRODUCT_HISTORY_DEFAULT_RANGE = 60 * 60 * 24
+    settings.PRODUCT_HISTORY_MAX_POINTS = 100
+
+    params = query(until='2024-06-02T00:00:00Z')
+    assert params['since'] == START
+    assert params['bucket'] == timedelta(seconds=864)
+
+
+def test_history_query_limits_the_buckets(settings):
+    settings.PRODUCT_HISTORY_MAX_POINTS = 24
+    day = {'since': '2024-06-01T00:00:00Z', 'until': '2024-06-02T00:00:00Z'}
+
+    assert query(**day, bucket='3600')['bucket'] == timedelta(hours=1)
+    assert 'bucket' in query(**day, bucket='60')
+    assert 'since' in query(since=day['until'], until=day['since'])
+    assert 'product_id' in query(product_id='not-an-asin')
+
+
+@pytest.mark.django_db
+def test_only_changes_are_recorded_and_downsampled():
+    product = Product.objects.create(
+        product_id='B0CHX5ZQ9X', name='Case', price='38.54', rating='354', rating_count=354, average_score=4.6,
+    )
+    scrapes = [
+        (START - timedelta(hours=1), '38.54', 354),  # in effect when the range starts
+        (START + timedelta(minutes=10), '38.54', 354),
+        (START + timedelta(minutes=20), '36.00', 354),
+        (START + timedelta(minutes=40), '39.99', 361),
+        (START + timedelta(minutes=70), '37.50', 362),
+    ]
+    for observed_at, price, rating_count in scrapes:
+        product.price, product.rating_count, product.last_updated = price, rating_count, observed_at
+        history.record([product])
+
+    assert ProductObservation.objects.count() == 4
+
+    points = history.series(product, START, START + timedelta(hours=2), timedelta(hours=1))
+    assert [(point['time'], point['observations'], point['price']) for point in points] == [
+        (START, 3, {'min': '36.00', 'max': '39.99', 'last': '39.99'}),
+        (START + timedelta(hours=1), 1, {'min': '37.50', 'max': '37.50', 'last': '37.50'}),
+    ]
+    assert points[0]['rating_count'] == {'min': 354, 'max': 361, 'last': 361}
+    assert points[1]['rating_count'] == {'min': 362, 'max': 362, 'last': 362}
+    assert points[0]['average_score'] == {'min': 4.6, 'max': 4.6, 'last': 4.6}
+
+
+@pytest.mark.django_db
+def test_history_of_an_unknown_product_is_not_found():
+    request = RequestFactory().get('/api/v1/product/history/', {'product_id': 'B0CHX5ZQ9X'})
+    response = ProductHistoryAPIView.as_view()(request)
+    assert response.status_code == 404
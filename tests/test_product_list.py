@@ -0,0 +1,79 @@
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from django.test import RequestFactory
+
+from apps.product.api.v1.views import ProductListAPIView
+from apps.product.models import Product
+
+
+def list_products(**params):
+    response = ProductListAPIView.as_view()(RequestFactory().get('/api/v1/products/', params))
+    return response.status_code, response.data
+
+
+def next_cursor(body):
+    return parse_qs(urlparse(body['data']['next']).query)['cursor'][0]
+
+
+def read_all(**params):
+    """
+    Follow the next links from the first page; returns the product_ids in order.
+    """
+    product_ids = []
+    while True:
+        status_code, body = list_products(**params)
+        assert status_code == 200
+        product_ids += [product['product_id'] for product in body['data']['results']]
+        if body['data']['next'] is None:
+            return product_ids
+        params['cursor'] = next_cursor(body)
+
+
+@pytest.fixture
+def products():
+    # Prices repeat, so pages have to break ties by id
+    return Product.objects.bulk_create([
+        Product(product_id=f'B0{n:08d}', name=f'Cable {n}' if n % 3 else f'Case {n}',
+                price=f'{10 + n % 4}.99', rating=str(n), average_score=3 + n % 5 / 2)
+        for n in range(23)
+    ])
+
+
+@pytest.mark.django_db
+def test_keyset_pages_cover_every_product_once(products):
+    by_price = sorted(products, key=lambda product: (product.price, product.pk))
+    assert read_all(ordering='price', page_size='5') == [product.product_id for product in by_price]
+    assert read_all(ordering='-price', page_size='4') == [product.product_id for product in reversed(by_price)]
+    assert read_all() == [product.product_id for product in reversed(products)]
+
+
+@pytest.mark.django_db
+def test_products_are_filtered(products):
+    cases = read_all(name='case', min_price='11', max_price='12.99', min_score='4')
+    assert cases == [
+        product.product_id for product in reversed(products)
+        if product.name.startswith('Case') and 11 <= float(product.price) <= 12.99 and product.average_score >= 4
+    ]
+    assert cases
+
+
+@pytest.mark.django_db
+def test_bad_cursor_or_ordering(products):
+    status_code, body = list_products(ordering='price', page_size='5')
+    cursor = next_cursor(body)
+    assert list_products(ordering='-price', cursor=cursor)[0] == 404
+    assert list_products(cursor='not-a-cursor')[0] == 404
+    assert list_products(ordering='name')[0] == 400
+
+
+@pytest.mark.django_db
+def test_ordering_by_rating_count_skips_products_without_one(products):
+    counted = products[:7]
+    for product in counted:
+        product.rating_count = int(product.rating) % 3
+    Product.objects.bulk_update(counted, ['rating_count'])
+
+    by_count = sorted(counted, key=lambda product: (product.rating_count, product.pk), reverse=True)
+    assert read_all(ordering='-rating_count', page_size='2') == [product.product_id for product in by_count]
+    assert read_all(min_ratings='2') == [product.product_id for product in reversed(counted) if product.rating_count >= 2]
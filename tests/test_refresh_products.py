@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from apps.product import popularity, product_cache
+from apps.product.management.commands.refresh_products import Command
+from apps.product.models import Product
+
+
+class FakePipeline:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def zincrby(self, key, amount, member):
+        self.calls.append((member, amount))
+
+    def expire(self, key, seconds):
+        pass
+
+    def execute(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self):
+        self.calls = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.calls)
+
+
+def test_hits_are_flushed_in_one_pipeline(monkeypatch, settings):
+    redis = FakeRedis()
+    monkeypatch.setattr(popularity, 'get_redis_connection', lambda alias: redis)
+    tracker = popularity.PopularityTracker()
+    tracker.hit('B0CHX5ZQ9X')
+    tracker.hit('B0CHX5ZQ9X', 'B0CHX5ZQ9Y')
+    assert redis.calls == []
+
+    tracker.flush()
+    assert sorted(redis.calls) == [('B0CHX5ZQ9X', 2), ('B0CHX5ZQ9Y', 1)]
+
+
+@pytest.mark.django_db
+def test_refresh_writes_only_changed_products(locmem_cache, monkeypatch, settings):
+    scraped = {
+        'B0CHX5ZQ9X': {'product_id': 'B0CHX5ZQ9X', 'name': 'Case', 'price': '36.00', 'rating': '360', 'rating_count': 360, 'average_score': '4.6'},
+        'B0CHX5ZQ9Y': {'product_id': 'B0CHX5ZQ9Y', 'name': 'Cable', 'price': '9.99', 'rating': '12', 'rating_count': 12, 'average_score': '4.1'},
+    }
+    monkeypatch.setattr(
+        'apps.product.management.commands.refresh_products.get_fetcher',
+        lambda: type('Fetcher', (), {'fetch_product': staticmethod(scraped.get)}),
+    )
+    Product.objects.create(product_id='B0CHX5ZQ9X', name='Case', price='38.54', rating='354', rating_count=354, average_score=4.6)
+    Product.objects.create(product_id='B0CHX5ZQ9Y', name='Cable', price='9.99', rating='12', rating_count=12, average_score=4.1)
+    Product.objects.create(product_id='B0CHX5ZQ9Z', name='Fresh', price='1.00', rating='1', average_score=5)
+    long_ago = timezone.now() - timedelta(seconds=settings.PRODUCT_REFRESH_MIN_AGE + 60)
+    Product.objects.exclude(product_id='B0CHX5ZQ9Z').update(last_updated=long_ago)
+
+    updates = []
+    bulk_update = Product.objects.bulk_update
+    monkeypatch.setattr(Product.objects, 'bulk_update', lambda objs, fields: updates.extend(objs) or bulk_update(objs, fields))
+    call_command('refresh_products', once=True)
+
+    assert [product.product_id for product in updates] == ['B0CHX5ZQ9X']
+    assert Product.objects.filter(last_updated__lt=timezone.now() - timedelta(seconds=60)).count() == 0
+    assert product_cache.get('B0CHX5ZQ9X') == (
+        {'product_id': 'B0CHX5ZQ9X', 'name': 'Case', 'price': '36.00', 'rating': '360', 'rating_count': 360, 'average_score': 4.6},
+        product_cache.HIT,
+    )
+    assert product_cache.get('B0CHX5ZQ9Z') == (None, product_cache.MISS)
+
+
+@pytest.mark.django_db
+def test_failing_products_back_off_and_leave_the_budget_to_others(locmem_cache, monkeypatch, settings):
+    long_ago = timezone.now() - timedelta(seconds=settings.PRODUCT_REFRESH_MIN_AGE + 60)
+    product_ids = ['B0CHX5ZQ9A', 'B0CHX5ZQ9B', 'B0CHX5ZQ9C', 'B0CHX5ZQ9D', 'B0CHX5ZQ9E']
+    for age, product_id in enumerate(product_ids):
+        Product.objects.create(product_id=product_id, name='Case', price='38.54', rating='354', rating_count=354, average_score=4.6)
+        # The first is the stalest
+        Product.objects.filter(product_id=product_id).update(last_updated=long_ago - timedelta(minutes=len(product_ids) - age))
+
+    fetched = []
+
+    def fetch_product(product_id):
+        fetched.append(product_id)
+        if product_id in ('B0CHX5ZQ9A', 'B0CHX5ZQ9C'):
+            return None
+        return {'product_id': product_id, 'name': 'Case', 'price': '38.54', 'rating': '354', 'rating_count': 354, 'average_score': '4.6'}
+
+    monkeypatch.setattr(
+        'apps.product.management.commands.refresh_products.get_fetcher',
+        lambda: type('Fetcher', (), {'fetch_product': staticmethod(fetch_product)}),
+    )
+    charged = []
+    monkeypatch.setattr(
+        'apps.product.management.commands.refresh_products.claim_budget',
+        lambda count, budget: charged.append(count) or count,
+    )
+    # A stale cache hit is already refreshing B0CHX5ZQ9B
+    assert product_cache.claim_refresh('B0CHX5ZQ9B')
+
+    command = Command()
+    command.refresh_round(budget=2, min_age=settings.PRODUCT_REFRESH_MIN_AGE, concurrency=1)
+    assert fetched == ['B0CHX5ZQ9A', 'B0CHX5ZQ9C']
+
+    # The failures stay the stalest but are skipped until their backoff expires
+    command.refresh_round(budget=2, min_age=settings.PRODUCT_REFRESH_MIN_AGE, concurrency=1)
+    assert fetched == ['B0CHX5ZQ9A', 'B0CHX5ZQ9C', 'B0CHX5ZQ9D', 'B0CHX5ZQ9E']
+    assert charged == [2, 2]
+    assert Product.objects.get(product_id='B0CHX5ZQ9A').last_updated < long_ago
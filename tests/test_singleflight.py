@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+from apps.product.singleflight import SingleFlight, SingleFlightTimeout
+
+
+def run_concurrently(count, target):
+    results = []
+    errors = []
+
+    def worker():
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_calls_share_one_execution(locmem_cache):
+    flight = SingleFlight('test', wait_timeout=5, lock_timeout=5)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'result'
+
+    results, errors = run_concurrently(5, lambda: flight.do('B08N5WRWNW', fn))
+    assert errors == []
+    assert results == ['result'] * 5
+    assert len(calls) == 1
+
+
+def test_errors_are_shared_with_waiting_callers(locmem_cache):
+    flight = SingleFlight('test', wait_timeout=5, lock_timeout=5)
+
+    def fn():
+        time.sleep(0.1)
+        raise ValueError("scrape failed")
+
+    results, errors = run_concurrently(3, lambda: flight.do('B08N5WRWNW', fn))
+    assert results == []
+    assert len(errors) == 3
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_followers_time_out(locmem_cache):
+    flight = SingleFlight('test', wait_timeout=0.05, lock_timeout=5)
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.3)
+        return 'slow'
+
+    leader = threading.Thread(target=lambda: flight.do('B08N5WRWNW', slow))
+    leader.start()
+    started.wait()
+    with pytest.raises(SingleFlightTimeout):
+        flight.do('B08N5WRWNW', lambda: 'other')
+    leader.join()
+    # once the leader is done the key can be run again
+    assert flight.do('B08N5WRWNW', lambda: 'again') == 'again'
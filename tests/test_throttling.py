@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+from apps.product.fetchers import TieredFetcher
+from apps.product.throttling import AdaptiveConcurrencyLimiter, OutboundThrottle, RateLimiter, ThrottleTimeout
+from tests.test_fetchers import CAPTCHA_PAGE, PRODUCT_PAGE, FakeTier
+
+
+def test_token_bucket_allows_burst_then_waits(locmem_cache):
+    limiter = RateLimiter('test', rate=1000, burst=2)
+    assert limiter._take() == 0
+    assert limiter._take() == 0
+    assert 0 < limiter._take() <= 0.001
+    limiter.acquire(timeout=1)
+
+    slow = RateLimiter('slow', rate=0.1, burst=1)
+    slow.acquire(timeout=0)
+    with pytest.raises(ThrottleTimeout):
+        slow.acquire(timeout=1)
+
+
+def test_captcha_halves_limit_once_per_interval():
+    limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=8, backoff_interval=60)
+    limiter.on_captcha()
+    limiter.on_captcha()
+    assert limiter.limit == 4
+    # About one more slot per `limit` successes
+    for _ in range(5):
+        limiter.on_success()
+    assert int(limiter.limit) == 5
+
+
+def test_slots_are_bounded_by_limit():
+    limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=1)
+    limiter.acquire(timeout=0)
+    with pytest.raises(ThrottleTimeout):
+        limiter.acquire(timeout=0.01)
+    threading.Timer(0.05, limiter.release).start()
+    limiter.acquire(timeout=1)
+
+
+class RecordingLimiter(AdaptiveConcurrencyLimiter):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def on_success(self):
+        self.events.append('success')
+
+    def on_captcha(self):
+        self.events.append('captcha')
+
+
+def test_fetcher_reports_successes(locmem_cache):
+    limiter = RecordingLimiter()
+    throttle = OutboundThrottle(RateLimiter('test', rate=1000, burst=10), limiter)
+    fetcher = TieredFetcher([FakeTier('http', CAPTCHA_PAGE), FakeTier('selenium', PRODUCT_PAGE)], throttle=throttle)
+    assert fetcher.fetch_product('B09B8V1LZ3')['price'] == '49.99'
+    assert limiter.events == ['success']
+    assert limiter.in_flight == 0
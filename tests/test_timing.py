@@ -0,0 +1,68 @@
+import asyncio
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from apps.product.metrics import Histogram, render
+from apps.product.timing import ServerTimingMiddleware, span, stage_duration_seconds
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('test_histogram_seconds', "Test histogram", ['stage'], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, stage='parse')
+
+    assert histogram.value(stage='parse') == 3
+    assert histogram.sum(stage='parse') == 5.55
+    output = render()
+    assert 'test_histogram_seconds_bucket{stage="parse",le="0.1"} 1' in output
+    assert 'test_histogram_seconds_bucket{stage="parse",le="1"} 2' in output
+    assert 'test_histogram_seconds_bucket{stage="parse",le="+Inf"} 3' in output
+    assert 'test_histogram_seconds_count{stage="parse"} 3' in output
+
+
+def test_spans_are_reported_in_server_timing(settings):
+    settings.SERVER_TIMING_HEADER = True
+    observed = stage_duration_seconds.value(stage='db')
+
+    def view(request):
+        with span('db'):
+            pass
+        with span('db'):
+            pass
+        with span('cache'):
+            pass
+        return HttpResponse()
+
+    response = ServerTimingMiddleware(view)(RequestFactory().get('/api/v1/product/'))
+
+    entries = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+    assert entries == ['db', 'cache', 'total']
+    assert stage_duration_seconds.value(stage='db') == observed + 2
+
+
+def test_async_requests_get_their_own_timings(settings):
+    settings.SERVER_TIMING_HEADER = True
+
+    async def view(request):
+        with span(request.GET['stage']):
+            await asyncio.sleep(0.01)
+        return HttpResponse()
+
+    middleware = ServerTimingMiddleware(view)
+
+    async def run():
+        return await asyncio.gather(
+            middleware(RequestFactory().get('/', {'stage': 'fetch_http'})),
+            middleware(RequestFactory().get('/', {'stage': 'parse'})),
+        )
+
+    first, second = asyncio.run(run())
+    assert first['Server-Timing'].startswith('fetch_http;dur=')
+    assert second['Server-Timing'].startswith('parse;dur=')
+
+
+def test_server_timing_header_can_be_disabled(settings):
+    settings.SERVER_TIMING_HEADER = False
+    response = ServerTimingMiddleware(lambda request: HttpResponse())(RequestFactory().get('/'))
+    assert 'Server-Timing' not in response
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+from apps.product import webdriver_pool
+from apps.product.webdriver_pool import WebDriverPool, DriverPoolTimeout, create_webdriver
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quit_called = False
+        self.alive = True
+
+    @property
+    def current_url(self):
+        if not self.alive:
+            raise WebDriverException("session deleted")
+        return 'about:blank'
+
+    def set_page_load_timeout(self, timeout):
+        pass
+
+    def get(self, url):
+        if not self.alive:
+            raise WebDriverException("session deleted")
+
+    def quit(self):
+        self.quit_called = True
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def factory():
+        driver = FakeDriver()
+        created.append(driver)
+        return driver
+
+    return WebDriverPool(factory=factory, **kwargs), created
+
+
+def test_driver_is_reused():
+    pool, created = make_pool(size=1)
+    with pool.driver() as first:
+        pass
+    with pool.driver() as second:
+        pass
+    assert first is second
+    assert len(created) == 1
+
+
+def test_driver_recycled_after_max_pages():
+    pool, created = make_pool(size=1, max_pages=2)
+    for _ in range(3):
+        with pool.driver():
+            pass
+    assert len(created) == 2
+    assert created[0].quit_called
+
+
+def test_broken_driver_is_discarded():
+    pool, created = make_pool(size=1)
+    with pytest.raises(WebDriverException):
+        with pool.driver():
+            raise WebDriverException("chrome not reachable")
+    assert created[0].quit_called
+    with pool.driver() as driver:
+        assert driver is created[1]
+
+
+def test_unhealthy_idle_driver_is_replaced():
+    pool, created = make_pool(size=1)
+    with pool.driver():
+        pass
+    created[0].alive = False
+    with pool.driver() as driver:
+        assert driver is created[1]
+
+
+def test_borrow_timeout():
+    pool, _ = make_pool(size=1)
+    pool.acquire()
+    with pytest.raises(DriverPoolTimeout):
+        pool.acquire(timeout=0.01)
+
+
+def test_session_start_timeout():
+    started = threading.Event()
+    late = FakeDriver()
+
+    def slow_factory():
+        # A grid with no free slot queues the new session request
+        started.wait(1)
+        return late
+
+    pool = WebDriverPool(factory=slow_factory, size=1, session_timeout=0.05)
+    with pytest.raises(DriverPoolTimeout):
+        pool.acquire()
+    started.set()
+    for _ in range(100):
+        if late.quit_called:
+            break
+        time.sleep(0.01)
+    assert late.quit_called
+    # The slot was given back
+    pool.factory = FakeDriver
+    with pool.driver():
+        pass
+
+
+class FakeRemote(FakeDriver):
+    def __init__(self, command_executor, options):
+        super().__init__()
+        self.options = options
+        self.commands = []
+
+    def execute(self, command, params):
+        self.commands.append((params['cmd'], params['params']))
+
+
+def test_fetch_profile(monkeypatch, settings):
+    settings.SELENIUM_EXTRA_BLOCKED_URLS = ['*widgets.example.com*']
+    monkeypatch.setattr(webdriver_pool.webdriver, 'Remote', FakeRemote)
+
+    driver = create_webdriver(page_load_strategy='eager', block_resources=True)
+    assert driver.options.page_load_strategy == 'eager'
+    assert driver.options.experimental_options['prefs']['profile.managed_default_content_settings.images'] == 2
+    (_, _), (command, params) = driver.commands
+    assert command == 'Network.setBlockedURLs'
+    assert '*.woff2' in params['urls'] and '*widgets.example.com*' in params['urls']
+
+    driver = create_webdriver(page_load_strategy='normal', block_resources=False)
+    assert driver.options.page_load_strategy == 'normal'
+    assert not driver.commands